@@ -1,6 +1,5 @@
 import logging
 from charset_normalizer import from_bytes
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
@@ -12,12 +11,13 @@ from django.core.exceptions import ValidationError
 from accounts.forms import CustomPasswordChangeForm, ForgotPasswordForm, ForgotPasswordResetForm, PasswordResetCodeForm, PasswordResetConfirmForm
 from catalog.models import CinemaUser, UserSubscription
 from cinemaapp import services
+from cinemaapp import identity
+from cinemaapp import outbox
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm, SetPasswordForm
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 import re
 
@@ -240,6 +240,9 @@ def profile(request):
                         VALUES (%s, %s, %s, TRUE)
                         ON CONFLICT (login) DO NOTHING
                     """, [new_login, new_email, password_hash])
+
+        if new_login != old_login:
+            identity.invalidate(user, request.session)
         
         messages.success(request, "Профиль обновлён.")
         return redirect("profile")
@@ -306,13 +309,11 @@ def password_change(request):
                     'ip_address': request.META.get('REMOTE_ADDR', 'неизвестен')
                 })
                 
-                send_mail(
+                outbox.enqueue(
                     subject,
                     message,
-                    settings.DEFAULT_FROM_EMAIL,
                     [request.user.email],
-                    html_message=message,
-                    fail_silently=True
+                    html=message,
                 )
                 
                 messages.success(request, 
@@ -354,13 +355,11 @@ def password_reset_request(request):
         })
         
         try:
-            send_mail(
+            outbox.enqueue(
                 subject,
                 message,
-                settings.DEFAULT_FROM_EMAIL,
                 [email],
-                html_message=message,
-                fail_silently=False
+                html=message,
             )
             
             request.session['reset_code_sent'] = True
@@ -501,13 +500,11 @@ def password_reset_confirm(request):
                     'ip_address': request.META.get('REMOTE_ADDR', 'неизвестен')
                 })
                 
-                send_mail(
+                outbox.enqueue(
                     subject,
                     message,
-                    settings.DEFAULT_FROM_EMAIL,
                     [email],
-                    html_message=message,
-                    fail_silently=True
+                    html=message,
                 )
                 
             except Exception as e:
@@ -559,13 +556,11 @@ def account_delete_request(request):
         })
         
         try:
-            send_mail(
+            outbox.enqueue(
                 subject,
                 message,
-                settings.DEFAULT_FROM_EMAIL,
                 [request.user.email],
-                html_message=message,
-                fail_silently=False
+                html=message,
             )
             messages.success(request, 
                 f'Ссылка для подтверждения удаления аккаунта отправлена на {request.user.email}. '
@@ -615,9 +610,13 @@ def account_delete_confirm(request, uidb64, token):
         user_email = user.email
         username = user.username
         
+        cinema_user_id = identity.resolve(user, create=False)
         with connection.cursor() as cur:
+            if cinema_user_id:
+                services._remove_user_ratings(cur, cinema_user_id)
             cur.execute("DELETE FROM cinema.users WHERE login = %s", [username])
-        
+
+        identity.invalidate(user)
         user.delete()
         
         if request.user.is_authenticated and request.user.id == int(uid):
@@ -631,13 +630,11 @@ def account_delete_confirm(request, uidb64, token):
                 'deleted_at': timezone.now()
             })
             
-            send_mail(
+            outbox.enqueue(
                 subject,
                 message,
-                settings.DEFAULT_FROM_EMAIL,
                 [user_email],
-                html_message=message,
-                fail_silently=True
+                html=message,
             )
             
             messages.success(request, 
@@ -687,13 +684,11 @@ def forgot_password_request(request):
                 })
                 
                 try:
-                    send_mail(
+                    outbox.enqueue(
                         subject,
                         message,
-                        settings.DEFAULT_FROM_EMAIL,
                         [email],
-                        html_message=message,
-                        fail_silently=False
+                        html=message,
                     )
                 
                     messages.success(request, 
@@ -791,13 +786,11 @@ def forgot_password_reset(request, token):
                     'ip_address': request.META.get('REMOTE_ADDR', 'неизвестен')
                 })
                 
-                send_mail(
+                outbox.enqueue(
                     subject,
                     message,
-                    settings.DEFAULT_FROM_EMAIL,
                     [user.email],
-                    html_message=message,
-                    fail_silently=True
+                    html=message,
                 )
                 
             except Exception as e:
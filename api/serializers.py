@@ -54,6 +54,9 @@ class ProgressPostSerializer(serializers.Serializer):
     duration = serializers.IntegerField(required=False, allow_null=True)
     completed = serializers.BooleanField(required=False, default=False)
 
+class ProgressBatchEventSerializer(ProgressPostSerializer):
+    content_id = serializers.UUIDField()
+
 class PurchaseCreateSerializer(serializers.Serializer):
     content_id = serializers.UUIDField()
 
@@ -8,7 +8,9 @@ from .views import (
     PaymentViewSet,
     FavoriteViewSet,
     home_data,
-    search_content
+    search_content,
+    search_suggest,
+    progress_batch,
 )
 
 router = DefaultRouter()
@@ -26,4 +28,6 @@ urlpatterns = [
     path("me/<str:detail_type>/", MeDetailsView.as_view(), name="me-details"),
     path("home/", home_data, name="home-data"),
     path("search/", search_content, name="search-content"),
+    path("search/suggest/", search_suggest, name="search-suggest"),
+    path("progress/batch/", progress_batch, name="progress-batch"),
 ]
\ No newline at end of file
@@ -1,3 +1,5 @@
+import json
+import uuid
 from django.contrib.auth.decorators import login_required
 from cinemaapp import models
 from cinemaapp.models import Content
@@ -7,16 +9,24 @@ from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
 from django.db import connection
+from django.db.models import Case, IntegerField, When
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from cinemaapp.models import Content
 from cinemaapp import services
+from cinemaapp import search as content_search
+from cinemaapp import suggest as title_suggest
+from cinemaapp import entitlements
+from cinemaapp import series as series_cache
+from cinemaapp import progress as progress_buffer
+from cinemaapp import subscriptions
 from catalog.models import SubscriptionPlan, UserSubscription, Payment
 from .serializers import (
     ContentSerializer, RateSerializer,
-    ProgressGetSerializer, ProgressPostSerializer,
+    ProgressGetSerializer, ProgressPostSerializer, ProgressBatchEventSerializer,
     PurchaseCreateSerializer,
 )
 from .permissions import IsAdmin, IsSupport, IsAnalyst, ReadOnly
@@ -26,63 +36,43 @@ from .permissions import IsAdmin, IsSupport, IsAnalyst, ReadOnly
 @permission_classes([AllowAny])
 def home_data(request):
     """API для данных главной страницы"""
-    from cinemaapp import services
+    from cinemaapp.home import get_home_snapshot, content_items
 
-    movies = services.list_content("movies", limit=20)
-    series = services.list_content("series", limit=20)
+    snapshot = get_home_snapshot()
 
     continue_items = []
     if request.user.is_authenticated:
         continue_items = services.get_continue_watch_for_user(request.user, limit=20)
+        continue_items = content_items(services._load_media_for_content(continue_items))
 
-    genre_sections_raw = []
-    if hasattr(services, "build_genre_sections"):
-        genre_sections_raw = services.build_genre_sections(limit_per_genre=20)
-    else:
-
-        try:
-            genre_sections_raw = []
-        except:
-            pass
-
-    all_ids = []
-    for c in movies: all_ids.append(c.id)
-    for c in series: all_ids.append(c.id)
-    for c in continue_items: all_ids.append(c.id)
-    for section in genre_sections_raw:
-        for c in section.get("items", []):
-            all_ids.append(c.id)
-    
-    ratings = services.rating_map(all_ids) if all_ids else {}
-
-    def serialize_content(c):
-        backdrop_url = ""
-        if getattr(c, "cover_image_wide", None):
-            backdrop_url = c.cover_image_wide.url if hasattr(c.cover_image_wide, 'url') else ""
-        elif getattr(c, "cover_image", None):
-            backdrop_url = c.cover_image.url if hasattr(c.cover_image, 'url') else ""
-        
+    def serialize_content(it):
         return {
-            "id": str(c.id),
-            "title": c.title,
-            "type": c.type,
-            "poster_url": c.cover_image.url if c.cover_image and hasattr(c.cover_image, 'url') else "",
-            "backdrop_url": backdrop_url,
-            "release_year": c.release_year,
-            "is_free": c.is_free,
-            "rating": float(ratings.get(c.id, 0.0) or 0.0)
+            "id": str(it["id"]),
+            "title": it["title"],
+            "type": it["type"],
+            "poster_url": it["poster_url"],
+            "backdrop_url": it["backdrop_url"],
+            "release_year": it["release_year"],
+            "is_free": it["is_free"],
+            "rating": it["rating"]
         }
+
+    def serialize_resume(it):
+        data = serialize_content(it)
+        resume = it.get("resume") or {}
+        data["resume"] = {k: v for k, v in resume.items() if k != "watched_at"}
+        return data
     
     response_data = {
-        "movies": [serialize_content(c) for c in movies],
-        "series": [serialize_content(c) for c in series],
-        "continue_watch": [serialize_content(c) for c in continue_items] if request.user.is_authenticated else [],
+        "movies": [serialize_content(it) for it in snapshot.movies],
+        "series": [serialize_content(it) for it in snapshot.series],
+        "continue_watch": [serialize_resume(it) for it in continue_items],
         "genre_sections": [
             {
-                "title": section.get("title", "Жанр"),
-                "items": [serialize_content(c) for c in section.get("items", [])]
+                "title": section["title"],
+                "items": [serialize_content(it) for it in section["items"]]
             }
-            for section in genre_sections_raw
+            for section in snapshot.genre_sections
         ]
     }
     
@@ -95,7 +85,6 @@ def search_content(request):
     """API для поиска контента"""
     from cinemaapp import services
     from cinemaapp.models import Content
-    from django.db.models import Q
     import uuid
     
     query = request.GET.get('q', '').strip()
@@ -104,35 +93,17 @@ def search_content(request):
     if not query:
         return Response({"ok": True, "query": "", "results": []})
     
-    qs = Content.objects.all().select_related('cover_image', 'cover_image_wide')
-    
-
     try:
 
         content_id = uuid.UUID(query)
-        qs = qs.filter(id=content_id)
-    except (ValueError, AttributeError):
-
-        qs = qs.filter(
-            Q(title__icontains=query) | 
-            Q(description__icontains=query)
-        )
-    
-    if content_type:
-        qs = qs.filter(type=content_type)
-    
-    results = qs.distinct()[:50]
-    
-    if not results and len(query) >= 8:
-        qs = Content.objects.filter(
-            Q(title__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(id__icontains=query)
-        )
+        qs = Content.objects.filter(id=content_id).select_related('cover_image', 'cover_image_wide')
         if content_type:
             qs = qs.filter(type=content_type)
-        results = qs.distinct()[:50]
+        results = list(qs[:50])
+    except (ValueError, AttributeError):
 
+        results = content_search.search_content(query, content_type or None, limit=50)
+    
     content_ids = [c.id for c in results]
     ratings = services.rating_map(content_ids) if content_ids else {}
     
@@ -185,6 +156,72 @@ def search_content(request):
         "count": len(results)
     })
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_suggest(request):
+    """Автодополнение названий из индекса в памяти"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 20))
+    except ValueError:
+        limit = 10
+
+    return Response({
+        "ok": True,
+        "query": query,
+        "results": title_suggest.suggest(query, limit=limit),
+    })
+
+PROGRESS_BATCH_LIMIT = 200
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def progress_batch(request):
+    """
+    Пачка событий прогресса: [{content_id, sn, en, position, duration, completed}, ...].
+    Принимает JSON (массив или {"events": [...]}) и form-data от navigator.sendBeacon
+    (поле events — JSON-строка). Всё пишется одной транзакцией.
+    """
+    events = request.data
+    if not isinstance(events, (list, dict)):
+        return Response({"ok": False, "error": "body must be a list or an object"}, status=400)
+    if isinstance(events, dict):
+        events = events.get("events")
+        if isinstance(events, str):
+            try:
+                events = json.loads(events)
+            except ValueError:
+                return Response({"ok": False, "error": "events is not valid JSON"}, status=400)
+    if not isinstance(events, list):
+        return Response({"ok": False, "error": "events must be a list"}, status=400)
+    if len(events) > PROGRESS_BATCH_LIMIT:
+        return Response({"ok": False, "error": f"too many events (max {PROGRESS_BATCH_LIMIT})"}, status=400)
+
+    ser = ProgressBatchEventSerializer(data=events, many=True)
+    ser.is_valid(raise_exception=True)
+    items = ser.validated_data
+
+    known = set(Content.objects
+                .filter(id__in={v["content_id"] for v in items})
+                .values_list("id", flat=True))
+    cinema_user_id = services._ensure_cinema_user(request.user)
+    batch = [
+        progress_buffer.make_heartbeat(
+            cinema_user_id, v["content_id"], v["position"], v.get("duration"),
+            v.get("sn", 0), v.get("en", 0), v.get("completed", False),
+        )
+        for v in items if v["content_id"] in known
+    ]
+    failed = []
+    saved = progress_buffer.write_batch(batch, failed)
+
+    return Response({"ok": True, "saved": saved, "rejected": len(items) - len(batch) + len(failed)})
+
+
+CAN_WATCH_BULK_LIMIT = 500
+
+
 class ContentViewSet(mixins.ListModelMixin,
                      mixins.RetrieveModelMixin,
                      viewsets.GenericViewSet):
@@ -196,17 +233,58 @@ class ContentViewSet(mixins.ListModelMixin,
         qs = super().get_queryset()
         q = self.request.query_params.get("q")
         ctype = self.request.query_params.get("type")
-        if q:
-            qs = qs.filter(title__icontains=q)
         if ctype:
             qs = qs.filter(type=ctype)
-        return qs.order_by("-release_year", "title")
+        if not q:
+            return qs.order_by("-release_year", "title")
+
+        # поиск: не больше SEARCH_API_LIMIT результатов в порядке релевантности search_ids
+        ids = content_search.search_ids(q, content_type=ctype,
+                                        limit=getattr(settings, "SEARCH_API_LIMIT", 200))
+        if not ids:
+            return qs.none()
+        rank = Case(*[When(id=pk, then=pos) for pos, pk in enumerate(ids)],
+                    output_field=IntegerField())
+        return qs.filter(id__in=ids).order_by(rank)
 
     @action(detail=True, methods=["get"], permission_classes=[AllowAny])
     def can_watch(self, request, pk=None):
         c = self.get_object()
-        can = services.can_watch(request.user, c) if request.user.is_authenticated else bool(c.is_free)
-        return Response({"ok": True, "can_watch": bool(can)})
+        can = entitlements.for_request(request).can_watch(c)
+        return Response({"ok": True, "can_watch": can})
+
+    @action(detail=False, methods=["post"], url_path="can-watch", permission_classes=[AllowAny])
+    def can_watch_bulk(self, request):
+        """
+        POST {"ids": [...]} -> {"items": {id: {"can_watch", "access_mode"}}}.
+        Число запросов не зависит от количества ID.
+        """
+        raw_ids = request.data.get("ids")
+        if not isinstance(raw_ids, list):
+            return Response({"ok": False, "error": "ids must be a list"}, status=400)
+        if len(raw_ids) > CAN_WATCH_BULK_LIMIT:
+            return Response(
+                {"ok": False, "error": f"too many ids (max {CAN_WATCH_BULK_LIMIT})"},
+                status=400,
+            )
+
+        ids = set()
+        for raw in raw_ids:
+            try:
+                ids.add(uuid.UUID(str(raw)))
+            except (TypeError, ValueError):
+                return Response({"ok": False, "error": f"invalid id: {raw}"}, status=400)
+
+        contents = Content.objects.filter(id__in=ids).only("id", "is_free", "price")
+        ctx = entitlements.for_request(request)
+        items = {
+            str(c.id): {
+                "can_watch": ctx.can_watch(c),
+                "access_mode": entitlements.access_mode(c),
+            }
+            for c in contents
+        }
+        return Response({"ok": True, "items": items})
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def rate(self, request, pk=None):
@@ -236,10 +314,11 @@ class ContentViewSet(mixins.ListModelMixin,
             data = services.get_progress(request.user, pk, sn, en)
             return Response({"ok": True, **data})
 
+        content = self.get_object()
         ser = ProgressPostSerializer(data=request.data); ser.is_valid(raise_exception=True)
         v = ser.validated_data
         services.save_progress(
-            request.user, pk, v["position"], v.get("duration"),
+            request.user, content.id, v["position"], v.get("duration"),
             v.get("sn", 0), v.get("en", 0), v.get("completed", False)
         )
         return Response({"ok": True}, status=status.HTTP_200_OK)
@@ -248,7 +327,7 @@ class ContentViewSet(mixins.ListModelMixin,
     def source(self, request, pk=None):
         """Единая точка получения источника видео (movie/series). Возвращает kind + url."""
         c = self.get_object()
-        if not services.can_watch(request.user, c) and not c.is_free:
+        if not entitlements.for_request(request).can_watch(c):
             return Response({"ok": False, "reason": "forbidden"}, status=403)
 
         if c.type == "movie":
@@ -273,7 +352,7 @@ class ContentViewSet(mixins.ListModelMixin,
         sn_i = _to_int(sn, 1)
         en_i = _to_int(en, 1)
 
-        if not (c.is_free or services.can_watch(request.user, c)):
+        if not entitlements.for_request(request).can_watch(c):
             return Response({"ok": False, "detail": "forbidden"}, status=403)
 
         data = services.episode_source(c, sn_i, en_i)
@@ -287,7 +366,7 @@ class ContentViewSet(mixins.ListModelMixin,
         Формат: {"ok": True, "seasons":[{"number":1,"title":"Сезон 1","episodes":[{"number":1,"title":"Серия 1"}, ...]}]}
         """
         c = self.get_object()
-        data = services.series_tree(c)
+        data = series_cache.get_tree(c, can_watch=entitlements.for_request(request).can_watch(c))
         return Response({"ok": True, "seasons": data})
 
 class PurchaseViewSet(mixins.ListModelMixin,
@@ -320,7 +399,6 @@ class SubscriptionViewSet(viewsets.ViewSet):
     def list(self, request):
         """Получить информацию о подписках пользователя"""
         from cinemaapp import services
-        from django.db.models import Sum
 
         try:
             from catalog.models import CinemaUser
@@ -332,36 +410,23 @@ class SubscriptionViewSet(viewsets.ViewSet):
             )
 
         active_sub = None
-        active_subs = UserSubscription.objects.filter(
-            user=cinema_user,
-            status='active',
-            expires_at__gte=timezone.now()
-        ).select_related('plan').order_by('-started_at')
-        
-        if active_subs.exists():
-            active_sub = active_subs.first()
-        
-  
-        all_subs = UserSubscription.objects.filter(
+        now = timezone.now()
+        all_subs = list(UserSubscription.objects.filter(
             user=cinema_user
-        ).select_related('plan').order_by('-started_at')
+        ).with_lifecycle(now).order_by('-started_at'))
+
+        # та же выборка, что раньше отдельным запросом: status='active' и expires_at >= now
+        active_sub = next(
+            (sub for sub in all_subs
+             if sub.status == 'active' and sub.expires_at is not None and sub.expires_at >= now),
+            None,
+        )
         
 
         plans = SubscriptionPlan.objects.filter(is_active=True).order_by('price')
         
 
-        total_count = UserSubscription.objects.filter(user=cinema_user).count()
-        active_count = UserSubscription.objects.filter(
-            user=cinema_user,
-            status='active',
-            expires_at__gte=timezone.now()
-        ).count()
-
-
-        total_spent_result = UserSubscription.objects.filter(
-            user=cinema_user
-        ).aggregate(total=Sum('plan__price'))
-        total_spent = float(total_spent_result['total'] or 0)
+        summary = subscriptions.summary(cinema_user.id)
 
         def serialize_subscription(sub):
             return {
@@ -398,9 +463,9 @@ class SubscriptionViewSet(viewsets.ViewSet):
                 for plan in plans
             ],
             "stats": {
-                "total_count": total_count,
-                "active_count": active_count,
-                "total_spent": total_spent
+                **summary.as_dict(),
+                "active_count": summary.unexpired_count,
+                "total_spent": float(summary.total_spent_on_subscriptions),
             }
         })
     
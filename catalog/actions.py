@@ -1,19 +1,17 @@
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponseBadRequest
-from django.db import connection
+from django.db import connection, transaction
+from cinemaapp import identity
 
 @login_required
 def toggle_favorite(request, content_id):
-    login = request.user.username
     cid = str(content_id)
+    cinema_user_id = identity.resolve(request.user, request.session, create=False)
+    if cinema_user_id is None:
+        return HttpResponseBadRequest("Пользователь не найден в cinema.users")
+    user_uuid = str(cinema_user_id)
 
     with connection.cursor() as cur:
-        cur.execute("SELECT id FROM cinema.users WHERE login=%s", [login])
-        row = cur.fetchone()
-        if not row:
-            return HttpResponseBadRequest("Пользователь не найден в cinema.users")
-        user_uuid = str(row[0])
-
         cur.execute("""
             WITH ins AS (
                 INSERT INTO cinema.favorites(user_id, content_id)
@@ -39,28 +37,30 @@ def toggle_favorite(request, content_id):
 
 @login_required
 def add_review(request, content_id):
+    from cinemaapp.services import _apply_rating_delta, _write_review
+
     rating = int(request.POST.get("rating","0"))
     comment = request.POST.get("comment","").strip()
     if rating < 1 or rating > 5:
         return HttpResponseBadRequest("rating 1..5")
-    with connection.cursor() as cur:
-        cur.execute("""
-            INSERT INTO cinema.content_reviews(user_id, content_id, rating, comment)
-            VALUES ((SELECT id FROM cinema.users WHERE login=%s), %s, %s, %s)
-            ON CONFLICT (user_id, content_id) DO UPDATE SET rating=EXCLUDED.rating, comment=EXCLUDED.comment
-        """, [request.user.username, str(content_id), rating, comment])
+    cinema_user_id = identity.resolve(request.user, request.session, create=False)
+    if cinema_user_id is None:
+        return HttpResponseBadRequest("Пользователь не найден")
+    user_uuid = str(cinema_user_id)
+
+    with transaction.atomic(), connection.cursor() as cur:
+        old_rating = _write_review(cur, user_uuid, content_id, rating, comment)
+        _apply_rating_delta(cur, content_id, old_rating, rating)
     return JsonResponse({"ok": True})
 
 @login_required
 def favorite_status(request, content_id):
-    login = request.user.username
     cid = str(content_id)
+    cinema_user_id = identity.resolve(request.user, request.session, create=False)
+    if cinema_user_id is None:
+        return HttpResponseBadRequest("Пользователь не найден")
+    user_uuid = str(cinema_user_id)
     with connection.cursor() as cur:
-        cur.execute("SELECT id FROM cinema.users WHERE login=%s", [login])
-        row = cur.fetchone()
-        if not row:
-            return HttpResponseBadRequest("Пользователь не найден")
-        user_uuid = str(row[0])
         cur.execute("""
             SELECT EXISTS(
               SELECT 1 FROM cinema.favorites
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_alter_subscriptionplan_table_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS cinema.content_rating_stats (
+                    content_id   uuid PRIMARY KEY REFERENCES cinema.content(id) ON DELETE CASCADE,
+                    rating_sum   bigint        NOT NULL DEFAULT 0,
+                    rating_count integer       NOT NULL DEFAULT 0,
+                    avg_rating   numeric(4, 2) NOT NULL DEFAULT 0,
+                    updated_at   timestamptz   NOT NULL DEFAULT now()
+                );
+
+                INSERT INTO cinema.content_rating_stats
+                    (content_id, rating_sum, rating_count, avg_rating, updated_at)
+                SELECT content_id, SUM(rating), COUNT(*), ROUND(AVG(rating)::numeric, 2), now()
+                FROM cinema.content_reviews
+                GROUP BY content_id
+                ON CONFLICT (content_id) DO NOTHING;
+            """,
+            reverse_sql="DROP TABLE IF EXISTS cinema.content_rating_stats;",
+        ),
+    ]
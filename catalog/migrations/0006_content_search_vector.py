@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_content_rating_stats'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE cinema.content
+                    ADD COLUMN IF NOT EXISTS search_vector tsvector
+                    GENERATED ALWAYS AS (
+                        setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') ||
+                        setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') ||
+                        setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'B') ||
+                        setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'B')
+                    ) STORED;
+
+                CREATE INDEX IF NOT EXISTS content_search_vector_gin
+                    ON cinema.content USING GIN (search_vector);
+            """,
+            reverse_sql="""
+                DROP INDEX IF EXISTS cinema.content_search_vector_gin;
+                ALTER TABLE cinema.content DROP COLUMN IF EXISTS search_vector;
+            """,
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_content_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+                CREATE INDEX IF NOT EXISTS content_title_trgm
+                    ON cinema.content USING GIN (title gin_trgm_ops);
+
+                CREATE INDEX IF NOT EXISTS episodes_title_trgm
+                    ON cinema.episodes USING GIN (title gin_trgm_ops);
+            """,
+            reverse_sql="""
+                DROP INDEX IF EXISTS cinema.episodes_title_trgm;
+                DROP INDEX IF EXISTS cinema.content_title_trgm;
+            """,
+        ),
+    ]
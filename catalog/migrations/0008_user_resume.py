@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_trigram_title_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS cinema.user_resume (
+                    user_id          uuid NOT NULL REFERENCES cinema.users(id) ON DELETE CASCADE,
+                    content_id       uuid NOT NULL REFERENCES cinema.content(id) ON DELETE CASCADE,
+                    episode_id       uuid REFERENCES cinema.episodes(id) ON DELETE SET NULL,
+                    sn               integer NOT NULL DEFAULT 0,
+                    en               integer NOT NULL DEFAULT 0,
+                    position_sec     integer NOT NULL DEFAULT 0,
+                    duration_sec     integer,
+                    progress_pct     numeric(5,2),
+                    next_episode_id  uuid REFERENCES cinema.episodes(id) ON DELETE SET NULL,
+                    next_sn          integer,
+                    next_en          integer,
+                    watched_at       timestamptz NOT NULL DEFAULT now(),
+                    PRIMARY KEY (user_id, content_id)
+                );
+
+                CREATE INDEX IF NOT EXISTS user_resume_user_watched_idx
+                    ON cinema.user_resume (user_id, watched_at DESC);
+
+                INSERT INTO cinema.user_resume
+                    (user_id, content_id, episode_id, sn, en, position_sec,
+                     duration_sec, progress_pct, watched_at)
+                SELECT DISTINCT ON (wh.user_id, wh.content_id)
+                       wh.user_id, wh.content_id, wh.episode_id,
+                       COALESCE(s.season_num, 0), COALESCE(e.episode_num, 0),
+                       COALESCE(wh.progress_sec, 0), e.duration_sec,
+                       LEAST(100, ROUND(100.0 * wh.progress_sec / NULLIF(e.duration_sec, 0), 2)),
+                       wh.watched_at
+                FROM cinema.watch_history wh
+                LEFT JOIN cinema.episodes e ON e.id = wh.episode_id
+                LEFT JOIN cinema.seasons s ON s.id = e.season_id
+                ORDER BY wh.user_id, wh.content_id, wh.watched_at DESC
+                ON CONFLICT (user_id, content_id) DO NOTHING;
+            """,
+            reverse_sql="DROP TABLE IF EXISTS cinema.user_resume;",
+        ),
+    ]
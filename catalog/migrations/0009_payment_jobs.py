@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_user_resume'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE cinema.payments
+                    ADD COLUMN IF NOT EXISTS idempotency_key      text,
+                    ADD COLUMN IF NOT EXISTS user_id              uuid REFERENCES cinema.users(id) ON DELETE CASCADE,
+                    ADD COLUMN IF NOT EXISTS content_id           uuid REFERENCES cinema.content(id) ON DELETE SET NULL,
+                    ADD COLUMN IF NOT EXISTS plan_id              uuid REFERENCES cinema.subscription_plans(id) ON DELETE SET NULL,
+                    ADD COLUMN IF NOT EXISTS extend_after_current boolean NOT NULL DEFAULT false,
+                    ADD COLUMN IF NOT EXISTS auth_code            text,
+                    ADD COLUMN IF NOT EXISTS error                text,
+                    ADD COLUMN IF NOT EXISTS hint                 text,
+                    ADD COLUMN IF NOT EXISTS updated_at           timestamptz;
+
+                CREATE UNIQUE INDEX IF NOT EXISTS payments_idempotency_key_uq
+                    ON cinema.payments (idempotency_key);
+
+                CREATE INDEX IF NOT EXISTS payments_pending_created_idx
+                    ON cinema.payments (created_at) WHERE status = 'pending';
+            """,
+            reverse_sql="""
+                DROP INDEX IF EXISTS cinema.payments_pending_created_idx;
+                DROP INDEX IF EXISTS cinema.payments_idempotency_key_uq;
+                ALTER TABLE cinema.payments
+                    DROP COLUMN IF EXISTS idempotency_key,
+                    DROP COLUMN IF EXISTS user_id,
+                    DROP COLUMN IF EXISTS content_id,
+                    DROP COLUMN IF EXISTS plan_id,
+                    DROP COLUMN IF EXISTS extend_after_current,
+                    DROP COLUMN IF EXISTS auth_code,
+                    DROP COLUMN IF EXISTS error,
+                    DROP COLUMN IF EXISTS hint,
+                    DROP COLUMN IF EXISTS updated_at;
+            """,
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_payment_jobs'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS cinema.email_outbox (
+                    id               bigserial PRIMARY KEY,
+                    to_addrs         text[] NOT NULL,
+                    subject          text NOT NULL,
+                    body             text NOT NULL,
+                    html             text,
+                    from_email       text,
+                    status           text NOT NULL DEFAULT 'pending'
+                                     CHECK (status IN ('pending', 'sent', 'dead')),
+                    attempts         integer NOT NULL DEFAULT 0,
+                    next_attempt_at  timestamptz NOT NULL DEFAULT now(),
+                    last_error       text,
+                    created_at       timestamptz NOT NULL DEFAULT now(),
+                    sent_at          timestamptz
+                );
+
+                CREATE INDEX IF NOT EXISTS email_outbox_due_idx
+                    ON cinema.email_outbox (next_attempt_at) WHERE status = 'pending';
+            """,
+            reverse_sql="DROP TABLE IF EXISTS cinema.email_outbox;",
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_email_outbox'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE OR REPLACE FUNCTION cinema.subscription_effective_status(
+                    p_status text, p_started_at timestamptz, p_expires_at timestamptz, p_at timestamptz
+                ) RETURNS text LANGUAGE sql IMMUTABLE AS $$
+                    SELECT CASE
+                        WHEN p_status <> 'active' THEN p_status
+                        WHEN p_expires_at IS NOT NULL AND p_expires_at <= p_at THEN 'expired'
+                        WHEN p_started_at > p_at THEN 'pending'
+                        ELSE 'active'
+                    END
+                $$;
+
+                ALTER TABLE cinema.user_subscriptions
+                    ADD COLUMN IF NOT EXISTS effective_status text NOT NULL DEFAULT 'pending';
+
+                UPDATE cinema.user_subscriptions
+                SET effective_status = cinema.subscription_effective_status(status, started_at, expires_at, now());
+
+                CREATE OR REPLACE FUNCTION cinema.user_subscriptions_set_effective_status()
+                RETURNS trigger LANGUAGE plpgsql AS $$
+                BEGIN
+                    NEW.effective_status := cinema.subscription_effective_status(
+                        NEW.status, NEW.started_at, NEW.expires_at, now());
+                    RETURN NEW;
+                END
+                $$;
+
+                DROP TRIGGER IF EXISTS user_subscriptions_effective_status ON cinema.user_subscriptions;
+                CREATE TRIGGER user_subscriptions_effective_status
+                    BEFORE INSERT OR UPDATE OF status, started_at, expires_at
+                    ON cinema.user_subscriptions
+                    FOR EACH ROW EXECUTE FUNCTION cinema.user_subscriptions_set_effective_status();
+
+                CREATE INDEX IF NOT EXISTS user_subscriptions_user_effective_idx
+                    ON cinema.user_subscriptions (user_id, effective_status);
+
+                CREATE INDEX IF NOT EXISTS user_subscriptions_pending_start_idx
+                    ON cinema.user_subscriptions (started_at) WHERE effective_status = 'pending';
+
+                CREATE INDEX IF NOT EXISTS user_subscriptions_live_expires_idx
+                    ON cinema.user_subscriptions (expires_at)
+                    WHERE effective_status IN ('pending', 'active');
+            """,
+            reverse_sql="""
+                DROP TRIGGER IF EXISTS user_subscriptions_effective_status ON cinema.user_subscriptions;
+                DROP FUNCTION IF EXISTS cinema.user_subscriptions_set_effective_status();
+                ALTER TABLE cinema.user_subscriptions DROP COLUMN IF EXISTS effective_status;
+                DROP FUNCTION IF EXISTS cinema.subscription_effective_status(text, timestamptz, timestamptz, timestamptz);
+            """,
+            state_operations=[
+                migrations.AddField(
+                    model_name='usersubscription',
+                    name='effective_status',
+                    field=models.TextField(default='pending', editable=False),
+                ),
+            ],
+        ),
+    ]
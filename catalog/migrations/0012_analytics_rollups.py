@@ -0,0 +1,92 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_subscription_effective_status'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE IF NOT EXISTS cinema.analytics_rollup_state (
+                    name        text PRIMARY KEY,
+                    watermark   date,
+                    updated_at  timestamptz NOT NULL DEFAULT now()
+                );
+
+                -- регистрации по дню users.created_at
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_registrations (
+                    day            date PRIMARY KEY,
+                    registrations  integer NOT NULL
+                );
+
+                -- покупки контента по дню purchased_at (gross — сумма цен контента)
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_purchases (
+                    day        date PRIMARY KEY,
+                    purchases  integer NOT NULL,
+                    gross      numeric(14,2) NOT NULL
+                );
+
+                -- продажи по контенту (популярный контент, жанры)
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_content_sales (
+                    day         date NOT NULL,
+                    content_id  uuid NOT NULL,
+                    purchases   integer NOT NULL,
+                    gross       numeric(14,2) NOT NULL,
+                    PRIMARY KEY (day, content_id)
+                );
+
+                -- платежи по дню paid_at: kind = subscription | purchase | other
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_payments (
+                    day       date NOT NULL,
+                    kind      text NOT NULL,
+                    status    text NOT NULL,
+                    payments  integer NOT NULL,
+                    amount    numeric(14,2) NOT NULL,
+                    PRIMARY KEY (day, kind, status)
+                );
+
+                -- выручка платного контента по дню покупки и статусу платежа ('none' — платежа нет)
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_purchase_revenue (
+                    day             date NOT NULL,
+                    payment_status  text NOT NULL,
+                    rows            integer NOT NULL,
+                    gross           numeric(14,2) NOT NULL,
+                    amount          numeric(14,2) NOT NULL,
+                    PRIMARY KEY (day, payment_status)
+                );
+
+                -- продажи подписок по дню paid_at, плану и статусу платежа
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_subscription_sales (
+                    day            date NOT NULL,
+                    plan_id        uuid NOT NULL,
+                    status         text NOT NULL,
+                    payments       integer NOT NULL,
+                    subscriptions  integer NOT NULL,
+                    amount         numeric(14,2) NOT NULL,
+                    PRIMARY KEY (day, plan_id, status)
+                );
+
+                -- зрители: одна строка на пользователя в день (первый и последний просмотр)
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_viewers (
+                    day          date NOT NULL,
+                    user_id      uuid NOT NULL,
+                    first_watch  timestamptz NOT NULL,
+                    last_watch   timestamptz NOT NULL,
+                    PRIMARY KEY (day, user_id)
+                );
+            """,
+            reverse_sql="""
+                DROP TABLE IF EXISTS cinema.analytics_daily_viewers;
+                DROP TABLE IF EXISTS cinema.analytics_daily_subscription_sales;
+                DROP TABLE IF EXISTS cinema.analytics_daily_purchase_revenue;
+                DROP TABLE IF EXISTS cinema.analytics_daily_payments;
+                DROP TABLE IF EXISTS cinema.analytics_daily_content_sales;
+                DROP TABLE IF EXISTS cinema.analytics_daily_purchases;
+                DROP TABLE IF EXISTS cinema.analytics_daily_registrations;
+                DROP TABLE IF EXISTS cinema.analytics_rollup_state;
+            """,
+        ),
+    ]
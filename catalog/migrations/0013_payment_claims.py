@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                -- аренда pending-платежа воркером: recover() не трогает строку, пока аренда жива
+                ALTER TABLE cinema.payments
+                    ADD COLUMN IF NOT EXISTS claimed_at timestamptz,
+                    ADD COLUMN IF NOT EXISTS claimed_by text;
+            """,
+            reverse_sql="""
+                ALTER TABLE cinema.payments
+                    DROP COLUMN IF EXISTS claimed_at,
+                    DROP COLUMN IF EXISTS claimed_by;
+            """,
+        ),
+    ]
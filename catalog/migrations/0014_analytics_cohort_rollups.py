@@ -0,0 +1,59 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_payment_claims'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                -- конверсия когорты дня регистрации: сколько из зарегистрированных
+                -- когда-либо купили контент / оформили подписку
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_conversion (
+                    day             date PRIMARY KEY,
+                    registered      integer NOT NULL,
+                    bought_content  integer NOT NULL,
+                    subscribed      integer NOT NULL,
+                    converted       integer NOT NULL
+                );
+
+                -- платежи пользователя (ARPU) по дню покупки / начала подписки:
+                -- kind = purchase | subscription, строки только с суммой > 0
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_user_revenue (
+                    day      date NOT NULL,
+                    user_id  uuid NOT NULL,
+                    kind     text NOT NULL,
+                    amount   numeric(14,2) NOT NULL,
+                    PRIMARY KEY (day, user_id, kind)
+                );
+
+                -- география когорты дня регистрации (paying_users — есть покупки)
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_geography (
+                    day           date NOT NULL,
+                    country       text NOT NULL,
+                    city          text NOT NULL DEFAULT '',
+                    users         integer NOT NULL,
+                    paying_users  integer NOT NULL,
+                    PRIMARY KEY (day, country, city)
+                );
+
+                -- платежи по дню paid_at и способу оплаты
+                CREATE TABLE IF NOT EXISTS cinema.analytics_daily_payment_methods (
+                    day             date NOT NULL,
+                    payment_method  text NOT NULL,
+                    payments        integer NOT NULL,
+                    amount          numeric(14,2) NOT NULL,
+                    PRIMARY KEY (day, payment_method)
+                );
+            """,
+            reverse_sql="""
+                DROP TABLE IF EXISTS cinema.analytics_daily_payment_methods;
+                DROP TABLE IF EXISTS cinema.analytics_daily_geography;
+                DROP TABLE IF EXISTS cinema.analytics_daily_user_revenue;
+                DROP TABLE IF EXISTS cinema.analytics_daily_conversion;
+            """,
+        ),
+    ]
@@ -39,6 +39,52 @@ class SubscriptionPlan(models.Model):
     def __str__(self):
         return f"{self.name} - {self.price} руб."
 
+class UserSubscriptionQuerySet(models.QuerySet):
+
+    def with_lifecycle(self, now=None):
+        """
+        План (select_related) и производные поля жизненного цикла одним запросом:
+        lc_is_active, lc_actual_status, lc_days_left, lc_will_be_extended.
+        Одноимённые свойства модели берут значения отсюда, не делая запросов на строку.
+        """
+        from django.db.models import BooleanField, Case, Exists, IntegerField, OuterRef, Q, Value, When
+        from django.db.models.functions import Extract
+
+        now = now or timezone.now()
+        unexpired = Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+        other_live = UserSubscription.objects.filter(
+            Q(unexpired) | Q(started_at__gt=now),
+            user=OuterRef('user'),
+            status='active',
+            effective_status__in=UserSubscription.LIVE_STATUSES,
+        ).exclude(id=OuterRef('id'))
+
+        return self.select_related('plan').annotate(
+            lc_is_active=Case(
+                When(Q(status='active') & (unexpired | Q(started_at__gt=now)), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+            lc_actual_status=Case(
+                When(status='cancelled', then=Value('cancelled')),
+                When(expires_at__gt=now, then=Value('active')),
+                When(expires_at__isnull=False, then=Value('expired')),
+                default='status',
+                output_field=models.TextField(),
+            ),
+            lc_days_left=Case(
+                When(expires_at__gt=now, then=Extract(
+                    models.ExpressionWrapper(models.F('expires_at') - Value(now),
+                                             output_field=models.DurationField()),
+                    'day',
+                )),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            lc_will_be_extended=Exists(other_live),
+        )
+
+
 class UserSubscription(models.Model):
     """Подписка пользователя из cinema.user_subscriptions"""
     id = models.UUIDField(primary_key=True)
@@ -47,6 +93,12 @@ class UserSubscription(models.Model):
     status = models.TextField()
     started_at = models.DateTimeField()
     expires_at = models.DateTimeField(null=True, blank=True)
+    # pending/active/expired/cancelled: ставит триггер в БД, переводы по времени — sweep_subscriptions
+    effective_status = models.TextField(default='pending', editable=False)
+
+    LIVE_STATUSES = ('pending', 'active')
+
+    objects = UserSubscriptionQuerySet.as_manager()
 
     class Meta:
         managed = False
@@ -99,6 +151,9 @@ class UserSubscription(models.Model):
     
     def get_actual_status(self):
         """Возвращает фактический статус с учетом даты"""
+        if hasattr(self, 'lc_actual_status'):
+            return self.lc_actual_status
+
         if self.status == 'cancelled':
             return 'cancelled'
         
@@ -116,6 +171,8 @@ class UserSubscription(models.Model):
     @property
     def is_actually_active(self):
         """Проверяет, активна ли подписка на данный момент"""
+        if hasattr(self, 'lc_is_active'):
+            return self.lc_is_active
         now = timezone.now()
         return (
             self.status == 'active' and 
@@ -131,6 +188,8 @@ class UserSubscription(models.Model):
     @property
     def days_left(self):
         """Количество дней до окончания подписки"""
+        if hasattr(self, 'lc_days_left'):
+            return self.lc_days_left
         if self.expires_at:
             now = timezone.now()
             if self.expires_at > now:
@@ -170,7 +229,8 @@ class UserSubscription(models.Model):
     @property
     def will_be_extended(self):
         """Будет ли продлена текущая подписка"""
-
+        if hasattr(self, 'lc_will_be_extended'):
+            return self.lc_will_be_extended
         return UserSubscription.get_active_subscriptions(self.user).exclude(id=self.id).exists()
     
     @classmethod
@@ -181,7 +241,8 @@ class UserSubscription(models.Model):
         now = timezone.now()
         return cls.objects.filter(
             user=user,
-            status='active'
+            status='active',
+            effective_status__in=cls.LIVE_STATUSES,
         ).filter(
             Q(
  
@@ -213,6 +274,7 @@ class UserSubscription(models.Model):
         return cls.objects.filter(
             user=user,
             status='active',
+            effective_status__in=cls.LIVE_STATUSES,
             started_at__lte=now,
         ).filter(
             Q(expires_at__isnull=True) | Q(expires_at__gt=now)
@@ -227,6 +289,7 @@ class UserSubscription(models.Model):
         return cls.objects.filter(
             user=user,
             status='active',
+            effective_status__in=cls.LIVE_STATUSES,
             started_at__gt=now
         ).order_by('started_at')
     
@@ -239,7 +302,8 @@ class UserSubscription(models.Model):
         now = timezone.now()
         return cls.objects.filter(
             user=user,
-            status='active'
+            status='active',
+            effective_status__in=cls.LIVE_STATUSES,
         ).filter(
             Q(
 
@@ -26,6 +26,8 @@ urlpatterns = [
     path('subscription/<str:plan_code>/process/', views.process_subscription_payment, 
          name='process_subscription_payment'),
     path('purchase/<uuid:pk>/process/', views.process_payment, name='process_payment'),
+    path('payment/<uuid:payment_id>/', views.payment_status, name='payment_status'),
+    path('payment/<uuid:payment_id>/status/', views.payment_status_json, name='payment_status_json'),
 
     # Поисковая строка
     path('search/', views.search, name='search'),
@@ -1,26 +1,190 @@
+import logging
+import threading
+import time
+
 import requests
-import json
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold ошибок подряд) -> open -> (reset_timeout) -> half-open.
+    В half-open пропускается один пробный запрос: успех закрывает, ошибка снова открывает.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def is_available(self) -> bool:
+        """Можно ли сейчас обращаться к сервису (без пробного запроса)."""
+        return self.state != "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class _Metrics:
+    """Задержки по операциям банка: количество, ошибки, сумма и максимум (мс)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops = {}
+
+    def observe(self, op: str, elapsed_ms: float, ok: bool):
+        with self._lock:
+            m = self._ops.setdefault(op, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            m["count"] += 1
+            m["errors"] += 0 if ok else 1
+            m["total_ms"] += elapsed_ms
+            m["max_ms"] = max(m["max_ms"], elapsed_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                op: {**m, "avg_ms": round(m["total_ms"] / m["count"], 1) if m["count"] else 0.0}
+                for op, m in self._ops.items()
+            }
+
+
+class _BankUnavailable(Exception):
+    pass
+
+
+_session_lock = threading.Lock()
+_session = None
+breaker = CircuitBreaker(
+    failure_threshold=getattr(settings, "BANK_BREAKER_FAILURES", 5),
+    reset_timeout=getattr(settings, "BANK_BREAKER_RESET", 30),
+)
+_metrics = _Metrics()
+
+
+def _base_url() -> str:
+    return (getattr(settings, "BANK_SERVICE_URL", None) or "http://localhost:5000").rstrip("/")
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool = getattr(settings, "BANK_POOL_SIZE", 10)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _call(op: str, method: str, path: str, timeout, retries: int = 0, **kwargs):
+    """
+    Запрос к банку через общий keep-alive пул.
+    retries — только для идемпотентных операций; ответы 5xx и сетевые ошибки
+    считаются отказом для circuit breaker.
+    """
+    if not breaker.allow():
+        raise _BankUnavailable()
+
+    settled = False
+    try:
+        session = _get_session()
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = session.request(method, f"{_base_url()}{path}", timeout=timeout, **kwargs)
+                ok = response.status_code < 500
+            except requests.exceptions.RequestException:
+                response, ok = None, False
+            _metrics.observe(op, (time.monotonic() - started) * 1000, ok)
+
+            if ok:
+                breaker.record_success()
+                settled = True
+                return response
+            if attempt >= retries:
+                breaker.record_failure()
+                settled = True
+                if response is None:
+                    raise requests.exceptions.ConnectionError(f"bank {op} failed")
+                return response
+            attempt += 1
+            time.sleep(0.1 * attempt)
+    finally:
+        # любое другое исключение — тоже отказ: иначе пробный запрос half-open «висит» вечно
+        if not settled:
+            breaker.record_failure()
+
+
 class BankService:
     """Клиент для взаимодействия с банковским микросервисом"""
 
-    BASE_URL = "http://localhost:5000/api"
-    
     @staticmethod
     def health_check():
-        """Проверка доступности банковского сервиса"""
+        """
+        Доступен ли банковский сервис — по состоянию circuit breaker,
+        без отдельного HTTP-запроса.
+        """
+        return breaker.is_available()
+
+    @staticmethod
+    def probe():
+        """Явная проверка /health (для админки и диагностики)"""
         try:
-            response = requests.get("http://localhost:5000/health", timeout=3)
-            return response.status_code == 200
-        except:
+            return _call("health", "GET", "/health", timeout=(1, 2), retries=1).status_code == 200
+        except Exception:
             return False
-    
+
+    @staticmethod
+    def metrics():
+        """Состояние circuit breaker и задержки по операциям"""
+        return {"breaker": breaker.state, "operations": _metrics.snapshot()}
+
     @staticmethod
     def check_card(card_data):
         """
         Проверка карты
-        
+
         Args:
             card_data: {
                 'card_number': '4242424242424242',
@@ -28,23 +192,19 @@ class BankService:
                 'expiry_year': 25,  # Можно в формате 25 или 2025
                 'cvc': '123'
             }
-        
+
         Returns:
             {
                 'success': True/False,
                 'error': 'Сообщение об ошибке',
-                'hint': 'Подсказка', 
+                'hint': 'Подсказка',
                 'card': {...}  # При успехе
             }
         """
         try:
-            response = requests.post(
-                f"{BankService.BASE_URL}/check",
-                json=card_data,
-                timeout=5
-            )
+            response = _call("check", "POST", "/api/check", timeout=(2, 5), retries=2, json=card_data)
             return response.json()
-        except requests.exceptions.ConnectionError:
+        except (_BankUnavailable, requests.exceptions.ConnectionError):
             return {
                 'success': False,
                 'error': 'Банковский сервис недоступен'
@@ -54,12 +214,12 @@ class BankService:
                 'success': False,
                 'error': f'Ошибка проверки: {str(e)}'
             }
-    
+
     @staticmethod
     def process_payment(payment_data):
         """
-        Обработка платежа
-        
+        Обработка платежа. Не повторяется автоматически — списание не идемпотентно.
+
         Args:
             payment_data: {
                 'card_number': '4242424242424242',
@@ -68,7 +228,7 @@ class BankService:
                 'cvc': '123',
                 'amount': 1000.0
             }
-        
+
         Returns:
             {
                 'success': True/False,
@@ -79,17 +239,13 @@ class BankService:
             }
         """
         try:
-            response = requests.post(
-                f"{BankService.BASE_URL}/pay",
-                json=payment_data,
-                timeout=10
-            )
+            response = _call("pay", "POST", "/api/pay", timeout=(2, getattr(settings, "BANK_SERVICE_TIMEOUT", 30)),
+                             json=payment_data)
             result = response.json()
-
-            print(f"[BankService] Payment result: {result}")
-            
+            logger.info("Bank payment result: success=%s txn=%s",
+                        result.get('success'), result.get('transaction_id'))
             return result
-        except requests.exceptions.ConnectionError:
+        except (_BankUnavailable, requests.exceptions.ConnectionError):
             return {
                 'success': False,
                 'error': 'Банковский сервис недоступен'
@@ -99,26 +255,25 @@ class BankService:
                 'success': False,
                 'error': f'Ошибка оплаты: {str(e)}'
             }
-    
+
     @staticmethod
     def reset_balances():
         """Сбросить балансы тестовых карт"""
         try:
-            response = requests.post(f"{BankService.BASE_URL}/reset", timeout=5)
-            return response.json()
-        except:
+            return _call("reset", "POST", "/api/reset", timeout=(2, 5)).json()
+        except Exception:
             return {'success': False}
-    
+
     @staticmethod
     def get_test_cards():
         """Получить список тестовых карт"""
         try:
-            response = requests.get(f"{BankService.BASE_URL}/cards", timeout=3)
+            response = _call("cards", "GET", "/api/cards", timeout=(1, 3), retries=2)
             if response.status_code == 200:
                 return response.json()
-        except:
+        except Exception:
             pass
         return {
             'success': False,
             'cards': []
-        }
\ No newline at end of file
+        }
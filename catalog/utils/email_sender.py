@@ -5,6 +5,8 @@ from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 import logging
 
+from cinemaapp import outbox
+
 logger = logging.getLogger(__name__)
 
 def send_purchase_confirmation(cinema_user, content, purchase):
@@ -38,9 +40,9 @@ def send_purchase_confirmation(cinema_user, content, purchase):
             to=[user_email],
         )
         email.attach_alternative(html_content, "text/html")
-        email.send()
+        outbox.enqueue_message(email)
         
-        logger.info(f"Email о покупке отправлен пользователю {cinema_user.login} ({user_email}) для контента {content.title}")
+        logger.info(f"Email о покупке поставлен в очередь для {cinema_user.login} ({user_email}) для контента {content.title}")
         return True
         
     except Exception as e:
@@ -80,9 +82,9 @@ def send_subscription_confirmation(cinema_user, subscription, plan):
             to=[user_email],
         )
         email.attach_alternative(html_content, "text/html")
-        email.send()
+        outbox.enqueue_message(email)
         
-        logger.info(f"Email о подписке отправлен пользователю {cinema_user.login} ({user_email}) для плана {plan.name}")
+        logger.info(f"Email о подписке поставлен в очередь для {cinema_user.login} ({user_email}) для плана {plan.name}")
         return True
         
     except Exception as e:
@@ -125,9 +127,9 @@ def send_payment_receipt(cinema_user, payment, purchase=None, subscription=None)
             to=[user_email],
         )
         email.attach_alternative(html_content, "text/html")
-        email.send()
+        outbox.enqueue_message(email)
         
-        logger.info(f"Чек об оплате отправлен пользователю {cinema_user.login} ({user_email})")
+        logger.info(f"Чек об оплате поставлен в очередь для {cinema_user.login} ({user_email})")
         return True
         
     except Exception as e:
@@ -209,9 +211,9 @@ def send_combined_email(cinema_user, payment, purchase=None, subscription=None):
             to=[user_email],
         )
         email.attach_alternative(combined_html, "text/html")
-        email.send()
+        outbox.enqueue_message(email)
         
-        logger.info(f"Объединенное письмо отправлено пользователю {cinema_user.login} ({user_email})")
+        logger.info(f"Объединенное письмо поставлено в очередь для {cinema_user.login} ({user_email})")
         return True
         
     except Exception as e:
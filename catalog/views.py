@@ -8,6 +8,9 @@ from django.http import HttpResponse
 from uuid import UUID
 from catalog.utils.bank_service import BankService
 from cinemaapp import services
+from cinemaapp import entitlements
+from cinemaapp import series as series_cache
+from cinemaapp import identity, payments, subscriptions
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponse, Http404, HttpResponseBadRequest
 from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
@@ -17,7 +20,7 @@ from cinemaapp.models import Content
 from django.contrib import messages
 from django.db.models import Q
 from datetime import timedelta
-from .models import SubscriptionPlan, UserSubscription, Purchase, CinemaUser, Payment
+from .models import SubscriptionPlan, UserSubscription, Purchase, CinemaUser
 from cinemaapp.models import Content
 from cinemaapp import services
 import re
@@ -57,167 +60,44 @@ def safe_reverse(name, *args, **kwargs) -> str:
         return "/"
 
 def main(request):
+    from cinemaapp.home import get_home_snapshot, content_items
 
-    movies = services.list_content("movies", limit=20)
-    series = services.list_content("series", limit=20)
-    all_items = services.list_content("all", limit=20)
-
-    try:
-        hero_qs = list(all_items[:5])
-    except Exception:
-        hero_qs = []
+    snapshot = get_home_snapshot()
 
+    continue_items = []
     if request.user.is_authenticated:
-        if hasattr(services, "get_continue_watch_for_user"):
-            continue_items = services.get_continue_watch_for_user(request.user, limit=20)
-        else:
-            continue_items = []
-    else:
-        continue_items = []
-
-
-    if continue_items and hasattr(services, 'load_content_with_media'):
-        continue_items = services.load_content_with_media(continue_items)
-    elif continue_items and hasattr(services, '_load_media_for_content'):
-        continue_items = services._load_media_for_content(continue_items)
-
-    genre_sections_raw = []
-    if hasattr(services, "build_genre_sections"):
-        try:
-            genre_sections_raw = services.build_genre_sections(limit_per_genre=20)
-        except Exception as e:
-            print(f"Error in build_genre_sections: {e}")
-
-            if movies:
-                genre_sections_raw.append({"title": "Фильмы", "items": movies[:10]})
-            if series:
-                genre_sections_raw.append({"title": "Сериалы", "items": series[:10]})
-    else:
-
-        if movies:
-            genre_sections_raw.append({"title": "Фильмы", "items": movies[:10]})
-        if series:
-            genre_sections_raw.append({"title": "Сериалы", "items": series[:10]})
-
-    if genre_sections_raw:
+        continue_items = services.get_continue_watch_for_user(request.user, limit=20)
+        continue_items = content_items(services._load_media_for_content(continue_items))
 
-        all_genre_content = []
-        for section in genre_sections_raw:
-            all_genre_content.extend(section.get("items", []))
-        
-
-        if hasattr(services, 'load_content_with_media'):
-            all_genre_content = services.load_content_with_media(all_genre_content)
-        elif hasattr(services, '_load_media_for_content'):
-            all_genre_content = services._load_media_for_content(all_genre_content)
-        
-
-        idx = 0
-        for section in genre_sections_raw:
-            items = section.get("items", [])
-            if items:
-
-                section["items"] = all_genre_content[idx:idx + len(items)]
-                idx += len(items)
-
-    from django.db import connection
-
-    all_content_ids = []
-    for lst in [movies, series, hero_qs, continue_items]:
-        if lst:
-            for c in lst:
-                if hasattr(c, 'id'):
-                    all_content_ids.append(c.id)
-
-    for section in genre_sections_raw:
-        for item in section.get("items", []):
-            if hasattr(item, 'id'):
-                all_content_ids.append(item.id)
-
-    content_genres = {}
-    if all_content_ids:
-        id_strs = [str(id) for id in all_content_ids]
-        with connection.cursor() as cur:
-            cur.execute("""
-                SELECT cg.content_id, g.name
-                FROM cinema.content_genres cg
-                JOIN cinema.genres g ON g.id = cg.genre_id
-                WHERE cg.content_id = ANY(%s)
-                ORDER BY g.name
-            """, [id_strs])
-            for content_id, genre_name in cur.fetchall():
-                content_genres.setdefault(str(content_id), []).append(genre_name)
-
-    ratings = {}
-    if all_content_ids:
-        ratings = services.rating_map(all_content_ids)
-
-    def to_ctx_item(c):
-        is_free = bool(getattr(c, "is_free", False))
-        price = float(getattr(c, "price", 0) or 0)
-        is_subscription = (not is_free) and (price <= 1)
+    def to_ctx_item(it):
+        is_free = it["is_free"]
+        is_subscription = (not is_free) and (it["price"] <= 1)
         is_ppv = (not is_free) and (not is_subscription)
 
         if is_free:
             cta_label = "Смотреть"
-            cta_href = safe_reverse("content_detail", c.id)
+            cta_href = safe_reverse("content_detail", it["id"])
         elif is_subscription:
             cta_label = "По подписке"
             cta_href = safe_reverse("subscribe")
         else:
             cta_label = "Купить"
-            cta_href = safe_reverse("purchase_start", c.id)
-
+            cta_href = safe_reverse("purchase_start", it["id"])
 
-        backdrop_url = ""
-        poster_url = ""
-        
-
-        if hasattr(c, "cover_image") and c.cover_image:
-            if hasattr(c.cover_image, 'url'):
-                poster_url = c.cover_image.url
-            elif hasattr(c.cover_image, 'id'):
-
-                poster_url = services._get_media_url(c.cover_image.id) if hasattr(services, '_get_media_url') else ""
-            else:
-
-                try:
-                    poster_url = getattr(c.cover_image, 'image_url', '')
-                except:
-                    pass
-
-        if hasattr(c, "cover_image_wide") and c.cover_image_wide:
-            if hasattr(c.cover_image_wide, 'url'):
-                backdrop_url = c.cover_image_wide.url
-            elif hasattr(c.cover_image_wide, 'id'):
-                backdrop_url = services._get_media_url(c.cover_image_wide.id) if hasattr(services, '_get_media_url') else ""
-            else:
-
-                try:
-                    backdrop_url = getattr(c.cover_image_wide, 'image_url', '')
-                except:
-                    pass
-
-        if not backdrop_url and poster_url:
-            backdrop_url = poster_url
-
-        desc_full = (getattr(c, "description", "") or "").strip()
+        desc_full = it["description"]
         words = desc_full.split()
         desc_long = len(words) > 25
         desc_short = " ".join(words[:25]) + ("…" if desc_long else "")
 
-
-        genres = content_genres.get(str(c.id), [])
-
         return {
-            "id": c.id,
-            "title": getattr(c, "title", ""),
-            "backdrop_url": backdrop_url,
-            "poster_url": poster_url,
-            "rating": float(ratings.get(c.id) or 0.0),
-            "year": getattr(c, "release_year", 0),
-            "type": getattr(c, "type", "movie"),
-            "kind_display": ("Фильм" if getattr(c, "type", "") == "movie" else "Сериал"),
+            "id": it["id"],
+            "title": it["title"],
+            "backdrop_url": it["backdrop_url"],
+            "poster_url": it["poster_url"],
+            "rating": it["rating"],
+            "year": it["release_year"],
+            "type": it["type"],
+            "kind_display": ("Фильм" if it["type"] == "movie" else "Сериал"),
             "description": (desc_full[:180] + "…") if len(desc_full) > 180 else desc_full,
 
             "is_free": is_free,
@@ -229,29 +109,26 @@ def main(request):
             "desc_full": desc_full,
             "desc_short": desc_short,
             "desc_long": desc_long,
-            "genres": genres,
+            "genres": it["genres"],
+            "resume": it.get("resume"),
         }
-    
-    hero_items = [to_ctx_item(c) for c in hero_qs]
-
 
-    continue_watch_vm = [to_ctx_item(c) for c in continue_items]
-
-    genre_sections_vm = []
-    for section in genre_sections_raw:
-        items_vm = [to_ctx_item(item) for item in section.get("items", [])]
-        if items_vm:
-            genre_sections_vm.append({
-                "title": section.get("title", "Жанр"),
-                "items": items_vm
-            })
+    genre_sections_vm = [
+        {"title": section["title"], "items": [to_ctx_item(it) for it in section["items"]]}
+        for section in snapshot.genre_sections
+    ]
+    if not genre_sections_vm:
+        if snapshot.movies:
+            genre_sections_vm.append({"title": "Фильмы", "items": [to_ctx_item(it) for it in snapshot.movies[:10]]})
+        if snapshot.series:
+            genre_sections_vm.append({"title": "Сериалы", "items": [to_ctx_item(it) for it in snapshot.series[:10]]})
 
     ctx = {
 
-        "series": [to_ctx_item(x) for x in series[:10]],
-        "movies": [to_ctx_item(x) for x in movies[:10]],
-        "hero_items": hero_items,
-        "continue_watch": continue_watch_vm,
+        "series": [to_ctx_item(x) for x in snapshot.series[:10]],
+        "movies": [to_ctx_item(x) for x in snapshot.movies[:10]],
+        "hero_items": [to_ctx_item(x) for x in snapshot.hero],
+        "continue_watch": [to_ctx_item(x) for x in continue_items],
 
         "genre_sections": genre_sections_vm
     }
@@ -275,82 +152,15 @@ def content_detail(request, pk):
         """, [str(pk)])
         genres = [row[0] for row in cur.fetchall()]
 
-    backdrop = ""
-    poster_url = ""
-    
-
-    if hasattr(c, "cover_image_wide") and c.cover_image_wide:
+    services._load_media_for_content([c])
 
-        if hasattr(c.cover_image_wide, 'url') and c.cover_image_wide.url:
-            backdrop = c.cover_image_wide.url
-
-        elif hasattr(c.cover_image_wide, 'id'):
-            image_id = str(c.cover_image_wide.id)
-            with connection.cursor() as cur:
-                cur.execute("SELECT url FROM cinema.media_assets WHERE id = %s", [image_id])
-                row = cur.fetchone()
-                if row and row[0]:
-                    backdrop = row[0]
-
-        elif isinstance(c.cover_image_wide, str) and len(c.cover_image_wide) == 36:
-            with connection.cursor() as cur:
-                cur.execute("SELECT url FROM cinema.media_assets WHERE id = %s", [c.cover_image_wide])
-                row = cur.fetchone()
-                if row and row[0]:
-                    backdrop = row[0]
-
-        else:
-            try:
-
-                if isinstance(c.cover_image_wide, str) and c.cover_image_wide.startswith('http'):
-                    backdrop = c.cover_image_wide
-
-                elif hasattr(c.cover_image_wide, 'image_url'):
-                    backdrop = c.cover_image_wide.image_url
-            except:
-                pass
-    
-
-    if not backdrop and hasattr(c, "cover_image") and c.cover_image:
-
-        if hasattr(c.cover_image, 'url') and c.cover_image.url:
-            backdrop = c.cover_image.url
-            poster_url = c.cover_image.url
-
-        elif hasattr(c.cover_image, 'id'):
-            image_id = str(c.cover_image.id)
-            with connection.cursor() as cur:
-                cur.execute("SELECT url FROM cinema.media_assets WHERE id = %s", [image_id])
-                row = cur.fetchone()
-                if row and row[0]:
-                    backdrop = row[0]
-                    poster_url = row[0]
-
-        elif isinstance(c.cover_image, str) and len(c.cover_image) == 36:
-            with connection.cursor() as cur:
-                cur.execute("SELECT url FROM cinema.media_assets WHERE id = %s", [c.cover_image])
-                row = cur.fetchone()
-                if row and row[0]:
-                    backdrop = row[0]
-                    poster_url = row[0]
-
-        else:
-            try:
-                if isinstance(c.cover_image, str) and c.cover_image.startswith('http'):
-                    backdrop = c.cover_image
-                    poster_url = c.cover_image
-                elif hasattr(c.cover_image, 'image_url'):
-                    backdrop = c.cover_image.image_url
-                    poster_url = c.cover_image.image_url
-            except:
-                pass
-
-    can_watch = services.can_watch(request.user, c) if request.user.is_authenticated else bool(c.is_free)
+    poster_url = c.cover_image.url if c.cover_image else ""
+    backdrop = (c.cover_image_wide.url if c.cover_image_wide else "") or poster_url
 
+    can_watch = entitlements.for_request(request).can_watch(c)
 
     is_free = bool(c.is_free)
-    price = float(getattr(c, "price", 0) or 0)
-    access_mode = "free" if is_free else ("subscription" if price <= 1 else "ppv")
+    access_mode = entitlements.access_mode(c)
 
 
     cta_label = ""
@@ -385,24 +195,7 @@ def content_detail(request, pk):
     }
 
 
-    if not item["poster_url"] and hasattr(c, "cover_image") and c.cover_image:
-        if hasattr(c.cover_image, 'url') and c.cover_image.url:
-            item["poster_url"] = c.cover_image.url
-        elif hasattr(c.cover_image, 'id'):
-            image_id = str(c.cover_image.id)
-            with connection.cursor() as cur:
-                cur.execute("SELECT url FROM cinema.media_assets WHERE id = %s", [image_id])
-                row = cur.fetchone()
-                if row and row[0]:
-                    item["poster_url"] = row[0]
-
-    seasons = services.series_tree(c) if c.type == "series" else []
-
-    if not can_watch:
-        for s in seasons:
-            for e in s.get("episodes", []):
-                if "video_url" in e:
-                    e["video_url"] = ""
+    seasons = series_cache.get_tree(c, can_watch=bool(can_watch)) if c.type == "series" else []
 
     return render(request, "catalog/content_detail.html", {
         "content": item,
@@ -415,7 +208,7 @@ def content_detail(request, pk):
 def movie_source(request, pk):
     c = get_object_or_404(Content.objects.select_related("video"), pk=pk, type="movie")
     if not c.video: raise Http404()
-    if not c.is_free and not services.can_watch(request.user, c): 
+    if not entitlements.for_request(request).can_watch(c):
         return HttpResponseForbidden("no access")
     
     url = c.video.url or ""
@@ -469,7 +262,7 @@ def extract_rutube_id(url):
 def episode_source(request, pk, sn, en):
   from cinemaapp.models import Episode
   c = get_object_or_404(Content, pk=pk, type="series")
-  if not c.is_free and not services.can_watch(request.user, c): return HttpResponseForbidden("no access")
+  if not entitlements.for_request(request).can_watch(c): return HttpResponseForbidden("no access")
   try:
     ep = (Episode.objects.select_related("video","season")
           .get(season__content=c, season__season_num=sn, episode_num=en))
@@ -574,56 +367,15 @@ def subscriptions_view(request):
     if cinema_user:
         all_subs_query = UserSubscription.objects.filter(
             user=cinema_user
-        ).select_related('plan').order_by('-started_at')
+        ).with_lifecycle().order_by('-started_at')
 
         all_subs = [
             sub for sub in all_subs_query 
             if not (sub.plan.code.lower() == 'admin' or 'админ' in sub.plan.name.lower())
         ]
 
-    
-    total_count = 0
-    active_count = 0
-    cancelled_count = 0
-    expired_count = 0
-    
-    if cinema_user:
-
-        total_count = UserSubscription.objects.filter(user=cinema_user).count()
-
-        now = timezone.now()
-        active_count = UserSubscription.objects.filter(
-            user=cinema_user,
-            status='active',
-            started_at__lte=now,
-        ).filter(
-            Q(expires_at__isnull=True) | Q(expires_at__gt=now)
-        ).count()
-
-        future_count = UserSubscription.objects.filter(
-            user=cinema_user,
-            status='active',
-            started_at__gt=now
-        ).count()
-        
-
-        cancelled_count = UserSubscription.objects.filter(
-            user=cinema_user,
-            status='cancelled'
-        ).count()
-
-        expired_count = UserSubscription.objects.filter(
-            user=cinema_user,
-            status='active',
-            expires_at__lt=now,
-            started_at__lte=now
-        ).count()
 
-
-        expired_count += UserSubscription.objects.filter(
-            user=cinema_user,
-            status='expired'
-        ).count()
+    summary = subscriptions.summary(cinema_user.id if cinema_user else None)
 
     all_plans = SubscriptionPlan.objects.filter(is_active=True).order_by('price')
     
@@ -661,23 +413,6 @@ def subscriptions_view(request):
 
     content_list = content_qs.distinct()[:20]
 
-    total_spent_on_subscriptions = 0
-    if cinema_user:
-        from django.db.models import Sum
-        total_spent_result = UserSubscription.objects.filter(
-            user=cinema_user
-        ).aggregate(total=Sum('plan__price'))
-        
-        total_spent_on_subscriptions = total_spent_result['total'] or 0
-
-    total_spent_on_content = 0
-    if cinema_user:
-        total_spent_result = Purchase.objects.filter(
-            user=cinema_user
-        ).aggregate(total=Sum('content__price'))
-        
-        total_spent_on_content = total_spent_result['total'] or 0
-    
     context = {
         'subscription': active_sub,
         'subscriptions': all_subs,
@@ -687,12 +422,13 @@ def subscriptions_view(request):
         'cinema_user': cinema_user,
         
 
-        'total_count': total_count,
-        'active_count': active_count,
-        'cancelled_count': cancelled_count,
-        'expired_count': expired_count,
-        'total_spent_on_subscriptions': total_spent_on_subscriptions,
-        'total_spent_on_content': total_spent_on_content,
+        'summary': summary,
+        'total_count': summary.total_count,
+        'active_count': summary.active_count,
+        'cancelled_count': summary.cancelled_count,
+        'expired_count': summary.expired_count,
+        'total_spent_on_subscriptions': summary.total_spent_on_subscriptions,
+        'total_spent_on_content': summary.total_spent_on_content,
 
         'purchased_content_ids': purchased_content_ids,
     }
@@ -737,7 +473,8 @@ def purchase_start(request, pk):
         pass
 
     return render(request, 'catalog/purchase_confirm.html', {
-        'content': content
+        'content': content,
+        'idempotency_key': uuid.uuid4().hex,
     })
 
 @login_required
@@ -827,6 +564,7 @@ def activate_subscription(request, plan_code):
     
     return render(request, 'catalog/subscription_confirm.html', {
         'plan': plan,
+        'idempotency_key': uuid.uuid4().hex,
         'current_subscription': current_subscription,
         'new_subscription_start': new_subscription_start,
         'new_subscription_expiry': new_subscription_expiry,
@@ -927,98 +665,26 @@ def process_payment(request, pk):
     expiry_year = int(year_str.strip())
     
 
-    if expiry_year < 100:
-        expiry_year_full = 2000 + expiry_year
-    else:
-        expiry_year_full = expiry_year
-    
-    card_check_data = {
+    card_data = {
         'card_number': card_number,
         'expiry_month': expiry_month,
         'expiry_year': expiry_year,
         'cvc': cvc
     }
-    
-
-    check_result = BankService.check_card(card_check_data)
-    
-    if not check_result.get('success'):
-        error_msg = check_result.get('error', 'Карта недействительна')
-        messages.error(request, f"Ошибка проверки карты: {error_msg}")
-        
-
-        if 'hint' in check_result:
-            messages.info(request, f"Подсказка: {check_result['hint']}")
-        
-        return redirect('catalog:purchase_start', pk=pk)
-    
-
-    payment_data = {
-        'card_number': card_number,
-        'expiry_month': expiry_month,
-        'expiry_year': expiry_year,
-        'cvc': cvc,
-        'amount': float(content.price)
-    }
-    
-    payment_result = BankService.process_payment(payment_data)
-    
-    if not payment_result.get('success'):
-        error_msg = payment_result.get('error', 'Ошибка оплаты')
-        messages.error(request, f"Оплата не прошла: {error_msg}")
-
-        if 'hint' in payment_result:
-            messages.info(request, f"Подсказка: {payment_result['hint']}")
-        
-        return redirect('catalog:purchase_start', pk=pk)
-    
-
-    purchase = Purchase.objects.create(
-        id=uuid.uuid4(),
-        user=cinema_user,
-        content=content,
-        purchased_at=timezone.now()
-    )
-    
 
-    transaction_id = payment_result.get('transaction_id', f'TXN{uuid.uuid4().hex[:8].upper()}')
-    auth_code = payment_result.get('auth_code', '000000')
-    
-    payment = Payment.objects.create(
-        id=uuid.uuid4(),
-        txn_uuid=transaction_id,
-        amount=content.price,
-        status='paid',
-        paid_at=timezone.now(),
-        purchase=purchase,
-        created_at=timezone.now()
+    payment_id, created = payments.submit(
+        payments.PaymentJob(
+            user_id=cinema_user.id,
+            amount=content.price,
+            card=card_data,
+            content_id=content.id,
+        ),
+        idempotency_key=request.POST.get('idempotency_key'),
     )
-    
+    if not created:
+        logger.info("Duplicate payment submission for %s, reusing %s", content.id, payment_id)
 
-    try:
-        from .utils.email_sender import send_combined_email
-        send_combined_email(cinema_user, payment, purchase=purchase)
-        
-        messages.success(request, 
-            f"Оплата прошла успешно! ✅"
-            f"Контент '{content.title}' добавлен в вашу библиотеку."
-            f"Код авторизации: {auth_code}"
-            f"ID транзакции: {transaction_id}"
-            f"Подтверждение отправлено на {cinema_user.email}")
-            
-    except Exception as e:
-
-        messages.success(request, 
-            f"Оплата прошла успешно! ✅"
-            f"Контент '{content.title}' добавлен в вашу библиотеку."
-            f"Код авторизации: {auth_code}"
-            f"ID транзакции: {transaction_id}")
-    
-
-    print(f"[PAYMENT] Успешная покупка: user={cinema_user.login}, content={content.title}, "
-          f"amount={content.price}, transaction={transaction_id}")
-    
-    return redirect('catalog:content_detail', pk=pk)
+    return redirect('catalog:payment_status', payment_id=payment_id)
 
 @login_required
 @require_POST
@@ -1039,12 +705,6 @@ def process_subscription_payment(request, plan_code):
     form_email = request.POST.get('email', '')
     extend_after_current = request.POST.get('extend_after_current', 'false')
 
-
-    if not BankService.health_check():
-        messages.error(request, "Платежный сервис временно недоступен. Попробуйте позже.")
-        return redirect('catalog:activate_subscription', plan_code=plan_code)
-    
-
     errors = []
     
     if not card_number or len(card_number.replace(' ', '')) != 16:
@@ -1097,104 +757,84 @@ def process_subscription_payment(request, plan_code):
     expiry_month = int(month_str.strip())
     expiry_year = int(year_str.strip())
     
-    card_check_data = {
+    card_data = {
         'card_number': card_number,
         'expiry_month': expiry_month,
         'expiry_year': expiry_year,
         'cvc': cvc
     }
-    
-    check_result = BankService.check_card(card_check_data)
-    
-    if not check_result.get('success'):
-        error_msg = check_result.get('error', 'Карта недействительна')
-        messages.error(request, f"Ошибка проверки карты: {error_msg}")
-        return redirect('catalog:activate_subscription', plan_code=plan_code)
 
-    payment_data = {
-        'card_number': card_number,
-        'expiry_month': expiry_month,
-        'expiry_year': expiry_year,
-        'cvc': cvc,
-        'amount': float(plan.price)
-    }
-    
-    payment_result = BankService.process_payment(payment_data)
-    
-    if not payment_result.get('success'):
-        error_msg = payment_result.get('error', 'Ошибка оплаты')
-        messages.error(request, f"Оплата не прошла: {error_msg}")
-        return redirect('catalog:activate_subscription', plan_code=plan_code)
-    
-
-    start_date = timezone.now()
-    
-    active_subs = UserSubscription.get_active_subscriptions(cinema_user).order_by('-expires_at')
-    
-    will_extend = False
-    if active_subs.exists():
-        current_sub = active_subs.first()
-        if extend_after_current == 'true':
-            start_date = current_sub.expires_at
-            will_extend = True
-        else:
-
-            current_sub.status = 'cancelled'
-            current_sub.save()
-    
-    expires_at = start_date + timedelta(days=plan.period_months * 30)
-    
-    subscription = UserSubscription.objects.create(
-        id=uuid.uuid4(),
-        user=cinema_user,
-        plan=plan,
-        status='active',
-        started_at=start_date,
-        expires_at=expires_at
+    payment_id, created = payments.submit(
+        payments.PaymentJob(
+            user_id=cinema_user.id,
+            amount=plan.price,
+            card=card_data,
+            plan_id=plan.id,
+            extend_after_current=extend_after_current == 'true',
+        ),
+        idempotency_key=request.POST.get('idempotency_key'),
     )
+    if not created:
+        logger.info("Duplicate subscription payment for %s, reusing %s", plan.code, payment_id)
 
-    transaction_id = payment_result.get('transaction_id', f'TXN{uuid.uuid4().hex[:8].upper()}')
-    auth_code = payment_result.get('auth_code', '000000')
-    
-    payment = Payment.objects.create(
-        id=uuid.uuid4(),
-        txn_uuid=transaction_id,
-        amount=plan.price,
-        status='paid',
-        paid_at=timezone.now(),
-        subscription=subscription,
-        created_at=timezone.now()
-    )
+    return redirect('catalog:payment_status', payment_id=payment_id)
 
-    try:
-        from .utils.email_sender import send_combined_email
-        send_combined_email(cinema_user, payment, subscription=subscription)
-        
-        if will_extend:
-            messages.success(request, 
+@login_required
+def payment_status(request, payment_id):
+    """Страница ожидания платежа; по завершении — сообщение и переход к покупке/подпискам"""
+    cinema_user_id = identity.resolve(request.user, request.session, create=False)
+    state = payments.wait(payment_id, cinema_user_id) if cinema_user_id else None
+    if state is None:
+        raise Http404("Платёж не найден")
+
+    if not state.is_final:
+        return render(request, 'catalog/payment_pending.html', {
+            'payment': state,
+            'status_url': reverse('catalog:payment_status_json', args=[payment_id]),
+        })
+
+    if state.status == payments.FAILED:
+        messages.error(request, state.error or "Оплата не прошла")
+        if state.hint:
+            messages.info(request, f"Подсказка: {state.hint}")
+        if state.is_subscription:
+            return redirect('catalog:activate_subscription', plan_code=state.plan_code)
+        return redirect('catalog:purchase_start', pk=state.content_id)
+
+    sent_to = f"Подтверждение отправлено на {state.email}" if state.email else f"Код авторизации: {state.auth_code}"
+    if state.is_subscription:
+        if state.subscription_started_at and state.subscription_started_at > state.created_at:
+            messages.success(request,
                 f"Оплата прошла успешно! ✅"
-                f"Подписка {plan.name} будет активна с {expires_at.strftime('%d.%m.%Y')}"
-                f"Подтверждение отправлено на {cinema_user.email}")
+                f"Подписка {state.plan_name} будет активна с {state.subscription_expires_at.strftime('%d.%m.%Y')}"
+                f"{sent_to}")
         else:
-            messages.success(request, 
+            messages.success(request,
                 f"Оплата прошла успешно! ✅"
-                f"Подписка {plan.name} активирована до {expires_at.strftime('%d.%m.%Y')}"
-                f"Подтверждение отправлено на {cinema_user.email}")
-                
-    except Exception as e:
+                f"Подписка {state.plan_name} активирована до {state.subscription_expires_at.strftime('%d.%m.%Y')}"
+                f"{sent_to}")
+        return redirect('catalog:subscribe')
 
-        if will_extend:
-            messages.success(request, 
-                f"Оплата прошла успешно! ✅"
-                f"Подписка {plan.name} будет активна с {expires_at.strftime('%d.%m.%Y')}"
-                f"Код авторизации: {auth_code}")
-        else:
-            messages.success(request, 
-                f"Оплата прошла успешно! ✅"
-                f"Подписка {plan.name} активирована до {expires_at.strftime('%d.%m.%Y')}"
-                f"Код авторизации: {auth_code}")
-    
-    return redirect('catalog:subscribe')
+    messages.success(request,
+        f"Оплата прошла успешно! ✅"
+        f"Контент '{state.content_title}' добавлен в вашу библиотеку."
+        f"Код авторизации: {state.auth_code}"
+        f"ID транзакции: {state.txn_uuid}"
+        f"{sent_to if state.email else ''}")
+    return redirect('catalog:content_detail', pk=state.content_id)
+
+@login_required
+def payment_status_json(request, payment_id):
+    """Статус платежа для опроса со страницы ожидания (?wait=N — long-poll)"""
+    cinema_user_id = identity.resolve(request.user, request.session, create=False)
+    try:
+        timeout = float(request.GET.get('wait', 0))
+    except ValueError:
+        timeout = 0
+    state = payments.wait(payment_id, cinema_user_id, timeout) if cinema_user_id else None
+    if state is None:
+        return JsonResponse({'error': 'not_found'}, status=404)
+    return JsonResponse(state.as_dict())
 
 @login_required
 @require_POST
@@ -1251,10 +891,9 @@ def search(request):
         return redirect('catalog:main')
     
 
-    results = Content.objects.filter(
-        Q(title__icontains=query) | 
-        Q(description__icontains=query)
-    ).select_related('cover_image', 'cover_image_wide')[:50]
+    from cinemaapp.search import search_content
+
+    results = search_content(query, limit=50)
     
 
     ratings = services.rating_map([c.id for c in results]) if results else {}
@@ -1,77 +1,131 @@
-from django.db import connection
+import logging
+import threading
 
-class SetPgAppUser:
-    def __init__(self, get_response):
-        self.get_response = get_response
+from django.db import connection, transaction
+from psycopg.pq import TransactionStatus
 
-    def __call__(self, request):
-        if hasattr(request, 'session') and request.session.get('is_employee'):
-            employee_id = request.session.get('employee_id')
-            if employee_id:
-                try:
-                    with connection.cursor() as cur:
-                        cur.execute("SELECT set_config('app.user_id', %s, true);", [employee_id])
-                except Exception as e:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.debug(f"Could not set app.user_id for employee: {e}")
-            return self.get_response(request)
+from cinemaapp import identity
+
+logger = logging.getLogger(__name__)
+
+# Раньше два middleware на каждый запрос авторизованного пользователя делали
+# 2 поиска в cinema.users + 2 set_config, для сотрудника — 1 set_config.
+LEGACY_ROUNDTRIPS_USER = 4
+LEGACY_ROUNDTRIPS_EMPLOYEE = 1
+STATS_LOG_EVERY = 1000
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "roundtrips": 0, "roundtrips_saved": 0}
+
+
+def roundtrip_stats() -> dict:
+    """Счётчики процесса: запросы, выполненные и сэкономленные обращения к БД."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(legacy: int, actual: int):
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["roundtrips"] += actual
+        _stats["roundtrips_saved"] += max(legacy - actual, 0)
+        if _stats["requests"] % STATS_LOG_EVERY == 0:
+            logger.info("CinemaContextMiddleware stats: %s", _stats)
 
-        if hasattr(request, 'session'):
-            user = getattr(request, "user", None)
-            if user and user.is_authenticated and not request.session.get('is_employee'):
-                try:
-                    with connection.cursor() as cur:
-                        cur.execute("SELECT id FROM cinema.users WHERE email=%s OR login=%s", 
-                                   [user.email, user.username])
-                        row = cur.fetchone()
-                        
-                        if row:
-                            cur.execute("SELECT set_config('app.user_id', %s, true);", [str(row[0])])
-                        else:
-
-                            cur.execute("SELECT set_config('app.user_id', '', true);")
-                except Exception as e:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.debug(f"Could not set app.user_id for regular user: {e}")
-        
-        return self.get_response(request)
 
-class UserTypeMiddleware:
+class _LazyPgAppUser:
     """
-    Middleware для определения типа пользователя (сотрудник/пользователь)
-    и установки настроек PostgreSQL.
+    execute_wrapper: выставляет app.user_id перед первым запросом к БД,
+    и только если на этом соединении сейчас другое значение.
+    Выставленное значение запоминается на самом psycopg-соединении: новое соединение
+    (в т.ч. после закрытия по CONN_MAX_AGE) начинает с чистого листа.
+    Значение, выставленное внутри транзакции, действует, пока транзакция открыта на сервере;
+    при коммите оно становится сессионным (on_commit), при откате — забывается:
+    следующий запрос увидит соединение вне транзакции (IDLE) или ROLLBACK TO SAVEPOINT.
+    """
+    def __init__(self, value: str):
+        self.value = value
+        self.roundtrips = 0
+
+    @staticmethod
+    def _applied(raw) -> str:
+        pending = getattr(raw, "_cinema_app_user_txn", None)
+        if pending is not None:
+            if raw.info.transaction_status != TransactionStatus.IDLE:
+                return pending
+            raw._cinema_app_user_txn = None  # транзакция закончилась без нашего on_commit — откат
+        return getattr(raw, "_cinema_app_user_id", "")  # "" — настройка ещё не задана
+
+    def _remember(self, db, raw):
+        if not db.in_atomic_block:
+            raw._cinema_app_user_id = self.value
+            return
+
+        value = self.value
+        raw._cinema_app_user_txn = value
+
+        def committed():
+            raw._cinema_app_user_id = value
+            if getattr(raw, "_cinema_app_user_txn", None) == value:
+                raw._cinema_app_user_txn = None
+
+        transaction.on_commit(committed, using=db.alias)
+
+    @staticmethod
+    def _forget(raw):
+        # откат к savepoint мог вернуть и значение, и сессионную настройку — выставим заново
+        if getattr(raw, "_cinema_app_user_txn", None) is not None:
+            raw._cinema_app_user_txn = None
+            raw._cinema_app_user_id = None
+
+    def __call__(self, execute, sql, params, many, context):
+        db = context["connection"]
+        raw = db.connection
+        if isinstance(sql, str) and sql.startswith("ROLLBACK TO SAVEPOINT"):
+            self._forget(raw)
+            return execute(sql, params, many, context)
+        if self._applied(raw) != self.value:
+            with raw.cursor() as cur:
+                cur.execute("SELECT set_config('app.user_id', %s, false)", [self.value])
+            self._remember(db, raw)
+            self.roundtrips += 1
+        return execute(sql, params, many, context)
+
+
+class CinemaContextMiddleware:
+    """
+    Тип пользователя (сотрудник/пользователь) и app.user_id для PostgreSQL.
+    ID из cinema.users берётся через identity (сессия/кэш), set_config — лениво.
+    Должен стоять после AuthenticationMiddleware.
     """
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
+        session = getattr(request, "session", None)
+        request.is_employee = bool(session and session.get("is_employee", False))
+        request.employee_roles = session.get("employee_roles", []) if session else []
 
-        if hasattr(request, 'session'):
-            request.is_employee = request.session.get('is_employee', False)
-            request.employee_roles = request.session.get('employee_roles', [])
+        app_user_id = ""
+        legacy = 0
+        lookups_before = identity.db_lookups()
 
-        if hasattr(request, 'session') and hasattr(request, 'user'):
-            user = request.user
-            if user and user.is_authenticated:
+        if request.is_employee:
+            app_user_id = str(session.get("employee_id") or "")
+            legacy = LEGACY_ROUNDTRIPS_EMPLOYEE
+        else:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                legacy = LEGACY_ROUNDTRIPS_USER
                 try:
-                    with connection.cursor() as cur:
-
-                        cur.execute("SELECT id FROM cinema.users WHERE email=%s OR login=%s", 
-                                   [user.email, user.username])
-                        row = cur.fetchone()
-                        
-                        if row:
-                            cur.execute("SELECT set_config('app.user_id', %s, true);", [str(row[0])])
-                        else:
-
-                            cur.execute("SELECT set_config('app.user_id', '', true);")
+                    cinema_user_id = identity.resolve(user, session, create=False)
+                    app_user_id = str(cinema_user_id) if cinema_user_id else ""
                 except Exception as e:
+                    logger.error(f"Error resolving cinema user id: {e}")
+
+        lazy = _LazyPgAppUser(app_user_id)
+        with connection.execute_wrapper(lazy):
+            response = self.get_response(request)
 
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Error setting PostgreSQL user_id: {e}")
-        
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        _record(legacy, lazy.roundtrips + identity.db_lookups() - lookups_before)
+        return response
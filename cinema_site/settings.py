@@ -8,7 +8,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DEBUG = True
 
 SECRET_KEY = os.getenv("DJANGO_SECRET")
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Для офлайн-проверки: EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend
+# или django.core.mail.backends.filebased.EmailBackend (письма в EMAIL_FILE_PATH)
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.getenv("EMAIL_FILE_PATH", str(BASE_DIR / "tmp" / "emails"))
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -96,13 +99,12 @@ REST_FRAMEWORK = {
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
 MIDDLEWARE = [
-    'cinema_site.middleware.UserTypeMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'cinema_site.middleware.SetPgAppUser',
+    'cinema_site.middleware.CinemaContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -169,6 +171,74 @@ USE_TZ = True
 
 BANK_SERVICE_URL = os.getenv("BANK_SERVICE_URL")
 BANK_SERVICE_TIMEOUT = 30
+BANK_POOL_SIZE = 10
+# Circuit breaker: после N ошибок подряд банк считается недоступным на M секунд
+BANK_BREAKER_FAILURES = 5
+BANK_BREAKER_RESET = 30
+
+# Оплата: pending-строка в cinema.payments + пул воркеров; страница статуса опрашивает long-poll
+PAYMENT_WORKERS = 4
+PAYMENT_STATUS_WAIT = 10
+PAYMENT_JOB_TIMEOUT = 120
+
+# Исходящие письма: cinema.email_outbox, отправка пачками через одно SMTP-соединение.
+# EMAIL_OUTBOX_INLINE_SENDER=False — отправляет только manage.py send_outbox --loop
+EMAIL_OUTBOX_INLINE_SENDER = True
+EMAIL_OUTBOX_BATCH = 50
+EMAIL_OUTBOX_POLL_INTERVAL = 5
+EMAIL_OUTBOX_IDLE = 30
+EMAIL_OUTBOX_LEASE = 300
+EMAIL_OUTBOX_RETRY_BASE = 30
+EMAIL_OUTBOX_RETRY_MAX = 3600
+EMAIL_OUTBOX_MAX_ATTEMPTS = 6
+# отправленные письма хранятся без тела; отправленные и мёртвые удаляются через неделю
+EMAIL_OUTBOX_RETENTION = 7 * 24 * 3600
+EMAIL_OUTBOX_PURGE_INTERVAL = 3600
+
+SUBSCRIPTION_SWEEP_INTERVAL = 60
+
+ANALYTICS_ROLLUP_LOOKBACK = 2
+ANALYTICS_ROLLUP_INTERVAL = 300
+ANALYTICS_ROLLUP_MAX_AGE = 900
+
+HOME_SNAPSHOT_MAX_AGE = 300
+HOME_SNAPSHOT_CHECK_INTERVAL = 5
+
+MEDIA_RESOLVER_CACHE_SIZE = 10000
+MEDIA_RESOLVER_TTL = 600
+
+SEARCH_TRGM_THRESHOLD = 0.3
+SEARCH_FUZZY_LIMIT = 10
+SEARCH_API_LIMIT = 200
+SUGGEST_INDEX_CHECK_INTERVAL = 30
+# прогрев индекса подсказок при старте процесса (включать для веб-сервера)
+SUGGEST_WARMUP = os.getenv("SUGGEST_WARMUP", "0") == "1"
+
+IDENTITY_CACHE_TTL = 3600
+
+# как часто каждый процесс сверяет версию схемы cinema со своим реестром
+SCHEMA_REGISTRY_CHECK_INTERVAL = 30
+
+# Прогресс просмотра: буфер в памяти, сброс пачкой раз в N секунд
+# (это же — максимум теряемых данных при падении процесса) или при переполнении.
+PROGRESS_WRITE_BEHIND = True
+PROGRESS_FLUSH_INTERVAL = 5
+PROGRESS_MAX_PENDING = 5000
+# heartbeat, который БД отвергла столько раз подряд, отбрасывается
+PROGRESS_MAX_ATTEMPTS = 5
+
+EPISODE_INDEX_SIZE = 2000
+EPISODE_INDEX_TTL = 600
+
+SERIES_TREE_CACHE_SIZE = 1000
+SERIES_TREE_TTL = 600
+
+RUTUBE_BASE_URL = os.getenv("RUTUBE_BASE_URL", "https://rutube.ru")
+RUTUBE_TIMEOUT = (3, 5)
+RUTUBE_WAIT = 2
+RUTUBE_CACHE_TTL = 3600
+RUTUBE_NEGATIVE_TTL = 300
+RUTUBE_WORKERS = 4
 
 if DEBUG:
     import warnings
@@ -178,3 +248,6 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [ BASE_DIR / 'static' ]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# тестовая БД: перед миграциями накатывается базовая схема cinema (cinemaapp/tests/cinema_schema.sql)
+TEST_RUNNER = 'cinemaapp.tests.runner.CinemaTestRunner'
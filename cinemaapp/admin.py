@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django import forms
 import uuid
+from django.db import connection, transaction
 from django.utils.html import format_html
+from .services import _recompute_rating_stats
 from .models import *
 
 
@@ -177,4 +179,30 @@ class VContentWithRatingAdmin(admin.ModelAdmin):
 class ContentReviewAdmin(admin.ModelAdmin):
     list_display = ('user', 'content', 'rating', 'created_at')
     search_fields = ('user__login', 'content__title', 'comment')
-    raw_id_fields = ('user', 'content')
\ No newline at end of file
+    raw_id_fields = ('user', 'content')
+
+    # правки мимо сайта тоже должны попадать в cinema.content_rating_stats
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            old_content_id = None
+            if change:
+                old_content_id = (ContentReview.objects.filter(pk=obj.pk)
+                                  .values_list('content_id', flat=True).first())
+            if not obj.id:
+                obj.id = uuid.uuid4()
+            super().save_model(request, obj, form, change)
+            with connection.cursor() as cur:
+                _recompute_rating_stats(cur, [old_content_id, obj.content_id])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            with connection.cursor() as cur:
+                _recompute_rating_stats(cur, [obj.content_id])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            content_ids = list(queryset.values_list('content_id', flat=True).distinct())
+            super().delete_queryset(request, queryset)
+            with connection.cursor() as cur:
+                _recompute_rating_stats(cur, content_ids)
\ No newline at end of file
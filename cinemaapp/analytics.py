@@ -0,0 +1,310 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from cinemaapp import schema
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = "daily"
+
+# (таблица, SELECT за полуинтервал дней [%s, %s)); day = DATE(ts) в часовом поясе сессии,
+# как и в прежних запросах панели
+FACTS = [
+    ("analytics_daily_registrations", """
+        SELECT DATE(created_at), COUNT(*)
+        FROM cinema.users
+        WHERE created_at >= %s::date AND created_at < %s::date
+        GROUP BY 1
+    """),
+    ("analytics_daily_purchases", """
+        SELECT DATE(p.purchased_at), COUNT(*), COALESCE(SUM(c.price), 0)
+        FROM cinema.purchases p
+        JOIN cinema.content c ON c.id = p.content_id
+        WHERE p.purchased_at >= %s::date AND p.purchased_at < %s::date
+        GROUP BY 1
+    """),
+    ("analytics_daily_content_sales", """
+        SELECT DATE(p.purchased_at), p.content_id, COUNT(*), COALESCE(SUM(c.price), 0)
+        FROM cinema.purchases p
+        JOIN cinema.content c ON c.id = p.content_id
+        WHERE p.purchased_at >= %s::date AND p.purchased_at < %s::date
+        GROUP BY 1, 2
+    """),
+    ("analytics_daily_payments", """
+        SELECT DATE(paid_at),
+               CASE WHEN subscription_id IS NOT NULL THEN 'subscription'
+                    WHEN purchase_id IS NOT NULL THEN 'purchase'
+                    ELSE 'other' END,
+               status, COUNT(*), COALESCE(SUM(amount), 0)
+        FROM cinema.payments
+        WHERE paid_at >= %s::date AND paid_at < %s::date
+        GROUP BY 1, 2, 3
+    """),
+    ("analytics_daily_purchase_revenue", """
+        SELECT DATE(pur.purchased_at), COALESCE(p.status, 'none'),
+               COUNT(*), COALESCE(SUM(c.price), 0), COALESCE(SUM(p.amount), 0)
+        FROM cinema.purchases pur
+        JOIN cinema.content c ON c.id = pur.content_id
+        LEFT JOIN cinema.payments p ON p.purchase_id = pur.id
+        WHERE pur.purchased_at >= %s::date AND pur.purchased_at < %s::date
+          AND NOT c.is_free AND c.price > 0
+        GROUP BY 1, 2
+    """),
+    # subscriptions — подписка считается один раз, в день её первого платежа с этим статусом,
+    # поэтому суммы по дням не удваивают подписки с несколькими платежами
+    ("analytics_daily_subscription_sales", """
+        SELECT DATE(p.paid_at), us.plan_id, p.status,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE NOT EXISTS (
+                   SELECT 1 FROM cinema.payments p2
+                   WHERE p2.subscription_id = p.subscription_id
+                     AND p2.status = p.status
+                     AND (p2.paid_at, p2.id) < (p.paid_at, p.id)
+               )),
+               COALESCE(SUM(p.amount), 0)
+        FROM cinema.payments p
+        JOIN cinema.user_subscriptions us ON us.id = p.subscription_id
+        WHERE p.paid_at >= %s::date AND p.paid_at < %s::date
+        GROUP BY 1, 2, 3
+    """),
+    ("analytics_daily_viewers", """
+        SELECT DATE(watched_at), user_id, MIN(watched_at), MAX(watched_at)
+        FROM cinema.watch_history
+        WHERE watched_at >= %s::date AND watched_at < %s::date
+        GROUP BY 1, 2
+    """),
+    ("analytics_daily_payment_methods", """
+        SELECT DATE(paid_at), payment_method::text, COUNT(*), COALESCE(SUM(amount), 0)
+        FROM cinema.payments
+        WHERE paid_at >= %s::date AND paid_at < %s::date
+          AND payment_method IS NOT NULL
+        GROUP BY 1, 2
+    """),
+]
+
+# Покупка или подписка меняет конверсию и географию когорты дня регистрации пользователя
+_REGISTRATION_DAYS_TOUCHED = """
+    SELECT DATE(u.created_at)
+    FROM cinema.purchases p
+    JOIN cinema.users u ON u.id = p.user_id
+    WHERE p.purchased_at >= %(start)s::date AND p.purchased_at < %(stop)s::date
+    UNION
+    SELECT DATE(u.created_at)
+    FROM cinema.user_subscriptions us
+    JOIN cinema.users u ON u.id = us.user_id
+    WHERE us.started_at >= %(start)s::date AND us.started_at < %(stop)s::date
+"""
+
+# Платёж меняет выручку дня покупки / начала подписки, к которой он относится
+_REVENUE_DAYS_TOUCHED = """
+    SELECT DATE(pur.purchased_at)
+    FROM cinema.payments p
+    JOIN cinema.purchases pur ON pur.id = p.purchase_id
+    WHERE (p.created_at >= %(start)s::date AND p.created_at < %(stop)s::date)
+       OR (p.paid_at >= %(start)s::date AND p.paid_at < %(stop)s::date)
+    UNION
+    SELECT DATE(us.started_at)
+    FROM cinema.payments p
+    JOIN cinema.user_subscriptions us ON us.id = p.subscription_id
+    WHERE (p.created_at >= %(start)s::date AND p.created_at < %(stop)s::date)
+       OR (p.paid_at >= %(start)s::date AND p.paid_at < %(stop)s::date)
+"""
+
+# Когортные витрины: строка дня зависит и от событий других дней, поэтому кроме дней
+# [start, stop) пересчитываются дни, задетые событиями этого полуинтервала.
+# (таблица, SELECT задетых дней, SELECT по списку дней %(days)s)
+COHORT_FACTS = [
+    ("analytics_daily_conversion", _REGISTRATION_DAYS_TOUCHED, """
+        SELECT d.day, COUNT(*),
+               COUNT(*) FILTER (WHERE f.bought),
+               COUNT(*) FILTER (WHERE f.subscribed),
+               COUNT(*) FILTER (WHERE f.bought OR f.subscribed)
+        FROM unnest(%(days)s::date[]) AS d(day)
+        JOIN cinema.users u ON u.created_at >= d.day AND u.created_at < d.day + 1
+        CROSS JOIN LATERAL (
+            SELECT EXISTS (SELECT 1 FROM cinema.purchases p WHERE p.user_id = u.id) AS bought,
+                   EXISTS (SELECT 1 FROM cinema.user_subscriptions us WHERE us.user_id = u.id) AS subscribed
+        ) f
+        GROUP BY 1
+    """),
+    ("analytics_daily_user_revenue", _REVENUE_DAYS_TOUCHED, """
+        SELECT d.day, pur.user_id, 'purchase', SUM(p.amount)
+        FROM unnest(%(days)s::date[]) AS d(day)
+        JOIN cinema.purchases pur ON pur.purchased_at >= d.day AND pur.purchased_at < d.day + 1
+        JOIN cinema.payments p ON p.purchase_id = pur.id
+        GROUP BY 1, 2
+        HAVING SUM(p.amount) > 0
+        UNION ALL
+        SELECT d.day, us.user_id, 'subscription', SUM(p.amount)
+        FROM unnest(%(days)s::date[]) AS d(day)
+        JOIN cinema.user_subscriptions us ON us.started_at >= d.day AND us.started_at < d.day + 1
+        JOIN cinema.payments p ON p.subscription_id = us.id
+        GROUP BY 1, 2
+        HAVING SUM(p.amount) > 0
+    """),
+    ("analytics_daily_geography", _REGISTRATION_DAYS_TOUCHED, """
+        SELECT d.day, u.country::text, COALESCE(u.city::text, ''), COUNT(*),
+               COUNT(*) FILTER (WHERE EXISTS (SELECT 1 FROM cinema.purchases p WHERE p.user_id = u.id))
+        FROM unnest(%(days)s::date[]) AS d(day)
+        JOIN cinema.users u ON u.created_at >= d.day AND u.created_at < d.day + 1
+        WHERE u.country IS NOT NULL
+        GROUP BY 1, 2, 3
+    """),
+]
+
+# Колонки, которых в схеме cinema может не быть: без них витрина остаётся пустой
+REQUIRED_COLUMNS = {
+    "analytics_daily_payment_methods": ("payments", {"payment_method"}),
+    "analytics_daily_geography": ("users", {"country", "city"}),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _today() -> datetime.date:
+    return timezone.now().date()
+
+
+def _enabled(table: str) -> bool:
+    if table not in REQUIRED_COLUMNS:
+        return True
+    source, columns = REQUIRED_COLUMNS[table]
+    return columns <= schema.get().columns_of(source)
+
+
+def rebuild(start: datetime.date, end: datetime.date) -> dict:
+    """
+    Пересчитать все витрины за дни [start, end] включительно (когортные — ещё и за дни,
+    задетые событиями этого периода): DELETE + INSERT … SELECT в одной транзакции,
+    поэтому повторный запуск за тот же период идемпотентен.
+    Возвращает {таблица: число строк}.
+    """
+    stop = end + datetime.timedelta(days=1)
+    period = {start + datetime.timedelta(days=n) for n in range((stop - start).days)}
+    written = {}
+    with transaction.atomic(), connection.cursor() as cur:
+        for table, select in FACTS:
+            if not _enabled(table):
+                continue
+            cur.execute(f"DELETE FROM cinema.{table} WHERE day >= %s AND day < %s", [start, stop])
+            cur.execute(f"INSERT INTO cinema.{table} {select}", [start, stop])
+            written[table] = cur.rowcount
+
+        for table, touched, select in COHORT_FACTS:
+            if not _enabled(table):
+                continue
+            cur.execute(touched, {"start": start, "stop": stop})
+            days = sorted(period.union(row[0] for row in cur.fetchall()))
+            cur.execute(f"DELETE FROM cinema.{table} WHERE day = ANY(%s)", [days])
+            cur.execute(f"INSERT INTO cinema.{table} {select}", {"days": days})
+            written[table] = cur.rowcount
+    return written
+
+
+def _source_start() -> datetime.date | None:
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT LEAST(
+                (SELECT MIN(created_at) FROM cinema.users),
+                (SELECT MIN(purchased_at) FROM cinema.purchases),
+                (SELECT MIN(paid_at) FROM cinema.payments),
+                (SELECT MIN(watched_at) FROM cinema.watch_history)
+            )::date
+        """)
+        return cur.fetchone()[0]
+
+
+def _state(cur):
+    cur.execute("""
+        SELECT watermark, updated_at FROM cinema.analytics_rollup_state
+        WHERE name = %s
+    """, [STATE_NAME])
+    return cur.fetchone()
+
+
+def _save_state(cur, watermark):
+    cur.execute("""
+        INSERT INTO cinema.analytics_rollup_state (name, watermark, updated_at)
+        VALUES (%s, %s, now())
+        ON CONFLICT (name) DO UPDATE
+        SET watermark = GREATEST(cinema.analytics_rollup_state.watermark, EXCLUDED.watermark),
+            updated_at = now()
+    """, [STATE_NAME, watermark])
+
+
+def refresh(lookback: int | None = None, wait: bool = True) -> dict | None:
+    """
+    Инкрементальное обновление: от watermark минус ANALYTICS_ROLLUP_LOOKBACK дней
+    (поздние платежи и смены статусов) до сегодняшнего дня. Без watermark — полный пересчёт.
+    wait=False — если другой процесс уже обновляет витрины, сразу вернуть None.
+    """
+    lookback = _setting("ANALYTICS_ROLLUP_LOOKBACK", 2) if lookback is None else lookback
+    today = _today()
+    with transaction.atomic(), connection.cursor() as cur:
+        if wait:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('cinema.analytics_rollup'))")
+        else:
+            cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('cinema.analytics_rollup'))")
+            if not cur.fetchone()[0]:
+                return None
+
+        state = _state(cur)
+        if state and state[0]:
+            start = state[0] - datetime.timedelta(days=lookback)
+        else:
+            start = _source_start() or today
+
+        written = rebuild(start, today)
+        # сегодняшний день ещё не закрыт — его пересчитает следующий запуск
+        _save_state(cur, today - datetime.timedelta(days=1))
+
+    logger.info("Analytics rollups refreshed for %s..%s: %s", start, today, written)
+    return written
+
+
+def backfill(start: datetime.date | None = None, end: datetime.date | None = None) -> dict:
+    """Пересчитать произвольный период (по умолчанию — с самых ранних данных до сегодня)."""
+    start = start or _source_start() or _today()
+    end = end or _today()
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('cinema.analytics_rollup'))")
+        written = rebuild(start, end)
+        _save_state(cur, min(end, _today() - datetime.timedelta(days=1)))
+    return written
+
+
+def staleness() -> str | None:
+    """
+    Для панели: предупреждение, если витрины пусты или не обновлялись дольше
+    ANALYTICS_ROLLUP_MAX_AGE секунд; None — всё свежее. Сама панель витрины не
+    пересчитывает — это делает rollup_analytics --loop (первое заполнение — --backfill).
+    """
+    with connection.cursor() as cur:
+        state = _state(cur)
+    if state is None:
+        logger.warning("Analytics rollups are empty, run rollup_analytics --backfill")
+        return "Витрины аналитики ещё не заполнены: запустите rollup_analytics --backfill"
+
+    max_age = datetime.timedelta(seconds=_setting("ANALYTICS_ROLLUP_MAX_AGE", 900))
+    age = timezone.now() - state[1]
+    if age > max_age:
+        logger.warning("Analytics rollups are %s old", age)
+        return f"Витрины аналитики обновлялись {state[1]:%d.%m.%Y %H:%M}: данные могут быть неполными"
+    return None
+
+
+def day_range(start_date: datetime.datetime, end_date: datetime.datetime):
+    """
+    Границы периода панели в днях витрин: [start, end] включительно.
+    Конец ровно в полночь (выбранная дата + 1 день) — значит, последний день предыдущий.
+    """
+    last = end_date.date()
+    if end_date.time() == datetime.time.min and last > start_date.date():
+        last -= datetime.timedelta(days=1)
+    return start_date.date(), last
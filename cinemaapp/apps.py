@@ -1,4 +1,32 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def _should_warm_up() -> bool:
+    """
+    Строить индексы в фоне при старте — только по явному SUGGEST_WARMUP
+    (веб-сервер), не в прочих manage.py-командах и не в родительском процессе
+    автоперезагрузчика runserver. Без прогрева индекс строится при первом запросе.
+    """
+    if not getattr(settings, "SUGGEST_WARMUP", False):
+        return False
+    if os.path.basename(sys.argv[0]) == "manage.py":
+        if sys.argv[1:2] != ["runserver"]:
+            return False
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+    return True
+
+
 class CinemaAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "cinemaapp"
\ No newline at end of file
+    name = "cinemaapp"
+
+    def ready(self):
+        from cinemaapp import schema  # noqa: F401 — подключает обработчики сигналов
+
+        if _should_warm_up():
+            from cinemaapp import suggest
+            suggest.refresh()
@@ -0,0 +1,93 @@
+from dataclasses import dataclass, field
+
+from django.db import connection
+from django.utils import timezone
+
+from cinemaapp import services
+
+_REQUEST_ATTR = "_entitlements"
+
+
+def access_mode(content) -> str:
+    """Как открывается контент: free / subscription (цена <= 1) / ppv"""
+    if bool(getattr(content, "is_free", False)):
+        return "free"
+    price = float(getattr(content, "price", 0) or 0.0)
+    return "subscription" if price <= 1.0 else "ppv"
+
+
+@dataclass
+class EntitlementContext:
+    """
+    Права просмотра пользователя, загруженные один раз на запрос:
+    купленный контент и окна активных/будущих подписок.
+    """
+    cinema_user_id: object = None
+    purchased: set = field(default_factory=set)
+    subscription_windows: list = field(default_factory=list)
+
+    @classmethod
+    def load(cls, dj_user) -> "EntitlementContext":
+        if not getattr(dj_user, "is_authenticated", False):
+            return cls()
+
+        cinema_user_id = services._ensure_cinema_user(dj_user)
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT content_id::text
+                FROM cinema.purchases
+                WHERE user_id = %s
+            """, [cinema_user_id])
+            purchased = {row[0] for row in cur.fetchall()}
+
+            cur.execute("""
+                SELECT started_at, expires_at
+                FROM cinema.user_subscriptions
+                WHERE user_id = %s
+                  AND effective_status IN ('pending', 'active')
+                  AND status = 'active'
+                  AND (expires_at IS NULL OR expires_at > now())
+            """, [cinema_user_id])
+            windows = cur.fetchall()
+
+        return cls(cinema_user_id=cinema_user_id, purchased=purchased, subscription_windows=windows)
+
+    @property
+    def is_authenticated(self) -> bool:
+        return self.cinema_user_id is not None
+
+    def has_subscription_access(self) -> bool:
+        """Подписка действует прямо сейчас (будущие окна доступа не дают)"""
+        now = timezone.now()
+        return any(
+            started_at <= now and (expires_at is None or expires_at > now)
+            for started_at, expires_at in self.subscription_windows
+        )
+
+    def has_future_subscription(self) -> bool:
+        now = timezone.now()
+        return any(started_at > now for started_at, _ in self.subscription_windows)
+
+    def can_watch(self, content) -> bool:
+        mode = access_mode(content)
+        if mode == "free":
+            return True
+        if not self.is_authenticated:
+            return False
+        if str(content.id) in self.purchased:
+            return True
+        return mode == "subscription" and self.has_subscription_access()
+
+    def can_watch_many(self, contents) -> dict:
+        """{content.id: bool} без дополнительных запросов"""
+        return {c.id: self.can_watch(c) for c in contents}
+
+
+def for_request(request) -> EntitlementContext:
+    """EntitlementContext текущего запроса (загружается при первом обращении)."""
+    http_request = getattr(request, "_request", request)
+    ctx = getattr(http_request, _REQUEST_ATTR, None)
+    if ctx is None:
+        ctx = EntitlementContext.load(request.user)
+        setattr(http_request, _REQUEST_ATTR, ctx)
+    return ctx
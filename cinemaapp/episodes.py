@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection
+
+from cinemaapp import schema
+
+_lock = threading.Lock()
+_series = OrderedDict()
+
+
+@dataclass(frozen=True)
+class EpisodeRef:
+    id: object
+    video_id: object
+    duration_sec: int | None
+
+
+def _max_series() -> int:
+    return getattr(settings, "EPISODE_INDEX_SIZE", 2000)
+
+
+def _ttl() -> float:
+    return getattr(settings, "EPISODE_INDEX_TTL", 600)
+
+
+def _number_expr(alias: str, col: str | None, partition: str | None = None) -> str:
+    """Номер сезона/серии: колонка из реестра или порядковый номер по id (как раньше)."""
+    if col:
+        return f"{alias}.{col}"
+    over = f"PARTITION BY {alias}.{partition} " if partition else ""
+    return f"ROW_NUMBER() OVER ({over}ORDER BY {alias}.id)"
+
+
+def load_series(content_id) -> dict:
+    """{(sn, en): EpisodeRef} для сериала — один запрос."""
+    registry = schema.get()
+    s_num = _number_expr("s", registry.season_number_col)
+    e_num = _number_expr("e", registry.episode_number_col, partition="season_id")
+
+    with connection.cursor() as cur:
+        cur.execute(f"""
+            WITH s AS (
+                SELECT s.id, {s_num} AS sn
+                FROM cinema.seasons s
+                WHERE s.content_id = %s
+            ),
+            e AS (
+                SELECT e.id, e.season_id, e.video_id, e.duration_sec, {e_num} AS en
+                FROM cinema.episodes e
+                WHERE e.season_id IN (SELECT id FROM s)
+            )
+            SELECT s.sn, e.en, e.id, e.video_id, e.duration_sec
+            FROM s JOIN e ON e.season_id = s.id
+            ORDER BY s.sn, e.en, e.id
+        """, [str(content_id)])
+        rows = cur.fetchall()
+
+    index = {}
+    for sn, en, episode_id, video_id, duration_sec in rows:
+        index.setdefault((int(sn), int(en)), EpisodeRef(episode_id, video_id, duration_sec))
+    return index
+
+
+def series_index(content_id) -> dict:
+    """Индекс серий из LRU (подгружается при первом обращении или по истечении TTL)."""
+    key = str(content_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _series.get(key)
+        if entry is not None and now - entry[0] <= _ttl():
+            _series.move_to_end(key)
+            return entry[1]
+
+    index = load_series(content_id)
+    with _lock:
+        _series[key] = (now, index)
+        _series.move_to_end(key)
+        while len(_series) > _max_series():
+            _series.popitem(last=False)
+    return index
+
+
+def lookup(content_id, sn, en) -> EpisodeRef | None:
+    if not sn or not en:
+        return None
+    return series_index(content_id).get((int(sn), int(en)))
+
+
+def invalidate(content_id):
+    """Сбросить индекс сериала (вызывается из админки при правке сезонов/серий)."""
+    with _lock:
+        _series.pop(str(content_id), None)
+
+
+def clear():
+    with _lock:
+        _series.clear()
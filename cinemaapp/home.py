@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from cinemaapp import services
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_KEY = "home:snapshot"
+LANE_LIMIT = 20
+HERO_LIMIT = 5
+
+_lock = threading.Lock()
+_rebuilding = False
+_last_version_check = 0.0
+_known_version = None
+
+
+@dataclass
+class HomeSnapshot:
+    """
+    Предрасчитанные данные главной страницы.
+    Элементы — готовые словари с медиа, жанрами и рейтингом.
+    """
+    version: str
+    built_at: float
+    movies: list = field(default_factory=list)
+    series: list = field(default_factory=list)
+    hero: list = field(default_factory=list)
+    genre_sections: list = field(default_factory=list)
+
+
+def catalog_version() -> str:
+    """Версия каталога: последний content.updated_at + число записей (ловит удаления)."""
+    with connection.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(updated_at)::text, ''), COUNT(*) FROM cinema.content")
+        max_updated, total = cur.fetchone()
+    return f"{max_updated}:{total}"
+
+
+def genres_map(ids) -> dict:
+    """{str(content_id): [названия жанров]} одним запросом"""
+    if not ids:
+        return {}
+    result = {}
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT cg.content_id, g.name
+            FROM cinema.content_genres cg
+            JOIN cinema.genres g ON g.id = cg.genre_id
+            WHERE cg.content_id = ANY(%s)
+            ORDER BY g.name
+        """, [[str(i) for i in ids]])
+        for content_id, genre_name in cur.fetchall():
+            result.setdefault(str(content_id), []).append(genre_name)
+    return result
+
+
+def _media_url(asset) -> str:
+    return (getattr(asset, "url", "") or "") if asset else ""
+
+
+def content_item(c, genres: dict, ratings: dict) -> dict:
+    """Общее представление карточки контента для HTML и API."""
+    poster_url = _media_url(getattr(c, "cover_image", None))
+    backdrop_url = _media_url(getattr(c, "cover_image_wide", None)) or poster_url
+
+    return {
+        "id": c.id,
+        "title": getattr(c, "title", ""),
+        "type": getattr(c, "type", "movie"),
+        "release_year": getattr(c, "release_year", 0),
+        "description": (getattr(c, "description", "") or "").strip(),
+        "is_free": bool(getattr(c, "is_free", False)),
+        "price": float(getattr(c, "price", 0) or 0),
+        "poster_url": poster_url,
+        "backdrop_url": backdrop_url,
+        "genres": genres.get(str(c.id), []),
+        "rating": float(ratings.get(c.id) or 0.0),
+        "resume": getattr(c, "resume", None),
+    }
+
+
+def content_items(contents) -> list:
+    """Карточки для произвольного списка контента (жанры и рейтинги — пакетно)."""
+    contents = list(contents)
+    if not contents:
+        return []
+    ids = [c.id for c in contents]
+    genres = genres_map(ids)
+    ratings = services.rating_map(ids)
+    return [content_item(c, genres, ratings) for c in contents]
+
+
+def build_home_snapshot(version: str) -> HomeSnapshot:
+    movies = services.list_content("movies", limit=LANE_LIMIT)
+    series = services.list_content("series", limit=LANE_LIMIT)
+    all_items = services.list_content("all", limit=LANE_LIMIT)
+    sections = services.build_genre_sections(limit_per_genre=LANE_LIMIT)
+
+    ids = {c.id for c in movies + series + all_items}
+    for section in sections:
+        ids.update(c.id for c in section["items"])
+    ids = list(ids)
+
+    genres = genres_map(ids)
+    ratings = services.rating_map(ids)
+
+    def items(lst):
+        return [content_item(c, genres, ratings) for c in lst]
+
+    return HomeSnapshot(
+        version=version,
+        built_at=time.time(),
+        movies=items(movies),
+        series=items(series),
+        hero=items(all_items[:HERO_LIMIT]),
+        genre_sections=[
+            {"title": section["title"], "items": items(section["items"])}
+            for section in sections if section["items"]
+        ],
+    )
+
+
+def rebuild_home_snapshot() -> HomeSnapshot:
+    global _known_version, _last_version_check
+    version = catalog_version()
+    snapshot = build_home_snapshot(version)
+    cache.set(SNAPSHOT_CACHE_KEY, snapshot, None)
+    _known_version = version
+    _last_version_check = time.monotonic()
+    return snapshot
+
+
+def _is_stale(snapshot: HomeSnapshot) -> bool:
+    global _known_version, _last_version_check
+    max_age = getattr(settings, "HOME_SNAPSHOT_MAX_AGE", 300)
+    if time.time() - snapshot.built_at > max_age:
+        return True
+
+    check_interval = getattr(settings, "HOME_SNAPSHOT_CHECK_INTERVAL", 5)
+    now = time.monotonic()
+    if _known_version is None or now - _last_version_check >= check_interval:
+        _known_version = catalog_version()
+        _last_version_check = now
+    return _known_version != snapshot.version
+
+
+def _rebuild_in_background():
+    global _rebuilding
+    try:
+        rebuild_home_snapshot()
+    except Exception:
+        logger.exception("Home snapshot rebuild failed")
+    finally:
+        connection.close()
+        with _lock:
+            _rebuilding = False
+
+
+def _schedule_rebuild():
+    global _rebuilding
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild_in_background, name="home-snapshot", daemon=True).start()
+
+
+def get_home_snapshot() -> HomeSnapshot:
+    """
+    Вернуть снимок главной. Первый запрос строит его синхронно,
+    дальше устаревший снимок отдаётся, пока новый строится в фоне.
+    """
+    snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+    if snapshot is None:
+        return rebuild_home_snapshot()
+    try:
+        if _is_stale(snapshot):
+            _schedule_rebuild()
+    except Exception:
+        logger.exception("Home snapshot version check failed")
+    return snapshot
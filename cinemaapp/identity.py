@@ -0,0 +1,102 @@
+import re
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+CACHE_PREFIX = "identity:cinema_user:"
+SESSION_KEY = "cinema_user"
+_USER_ATTR = "_cinema_user_id"
+
+_local = threading.local()
+
+
+def db_lookups() -> int:
+    """Сколько раз текущий поток обращался к cinema.users (для статистики middleware)."""
+    return getattr(_local, "lookups", 0)
+
+
+def cinema_login(user) -> str:
+    """Логин в cinema.users для Django-пользователя (та же нормализация, что при создании)."""
+    login = re.sub(r"[^A-Za-z0-9_.-]", "_", user.username or f"user{user.id}")[:32]
+    if len(login) < 5:
+        login = f"user{user.id:04d}"
+    return login
+
+
+def _cache_key(user) -> str:
+    return f"{CACHE_PREFIX}{user.pk}"
+
+
+def _lookup(user, login: str, create: bool):
+    _local.lookups = db_lookups() + 1
+    with connection.cursor() as cur:
+        cur.execute("SELECT id FROM cinema.users WHERE login=%s", [login])
+        row = cur.fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+
+        cur.execute(
+            """
+            INSERT INTO cinema.users (email, login, password_hash)
+            VALUES (%s, %s, %s)
+            RETURNING id
+            """,
+            [user.email or f"{login}@local.test", login, "$argon2"],
+        )
+        return cur.fetchone()[0]
+
+
+def resolve(user, session=None, create: bool = True):
+    """
+    UUID из cinema.users для Django-пользователя.
+    Порядок: объект пользователя (в пределах запроса) -> сессия -> общий кэш -> БД.
+    Записи привязаны к логину, поэтому смена логина сама делает их недействительными.
+    create=False — не создавать запись в cinema.users, вернуть None.
+    """
+    if not getattr(user, "is_authenticated", False):
+        return None
+
+    login = cinema_login(user)
+
+    memo = getattr(user, _USER_ATTR, None)
+    if memo and memo[0] == login:
+        return memo[1]
+
+    cinema_user_id = None
+    if session is not None:
+        entry = session.get(SESSION_KEY)
+        if entry and entry.get("uid") == user.pk and entry.get("login") == login:
+            cinema_user_id = uuid.UUID(entry["id"])
+
+    if cinema_user_id is None:
+        cached = cache.get(_cache_key(user))
+        if cached and cached[0] == login:
+            cinema_user_id = uuid.UUID(cached[1])
+
+    if cinema_user_id is None:
+        found = _lookup(user, login, create)
+        if found is None:
+            return None
+        cinema_user_id = uuid.UUID(str(found))
+        cache.set(_cache_key(user), (login, str(cinema_user_id)),
+                  getattr(settings, "IDENTITY_CACHE_TTL", 3600))
+
+    if session is not None and (session.get(SESSION_KEY) or {}).get("id") != str(cinema_user_id):
+        session[SESSION_KEY] = {"uid": user.pk, "login": login, "id": str(cinema_user_id)}
+
+    setattr(user, _USER_ATTR, (login, cinema_user_id))
+    return cinema_user_id
+
+
+def invalidate(user, session=None):
+    """Сбросить сопоставление (смена логина, удаление аккаунта)."""
+    cache.delete(_cache_key(user))
+    if hasattr(user, _USER_ATTR):
+        delattr(user, _USER_ATTR)
+    if session is not None:
+        session.pop(SESSION_KEY, None)
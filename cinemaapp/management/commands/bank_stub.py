@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+TEST_CARDS = {
+    "4242424242424242": {"brand": "VISA", "balance": Decimal("100000"), "hint": "Успешная оплата"},
+    "5555555555554444": {"brand": "MC", "balance": Decimal("500"), "hint": "Баланс 500 ₽"},
+    "2200000000000004": {"brand": "МИР", "balance": Decimal("100000"), "hint": "Успешная оплата"},
+    "4000000000000002": {"brand": "VISA", "declined": True, "hint": "Карта отклонена банком"},
+}
+
+
+class _Bank:
+    """Состояние заглушки: балансы тестовых карт и выданные транзакции."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.balances = {n: c.get("balance", Decimal(0)) for n, c in TEST_CARDS.items()}
+
+    def check(self, data):
+        number = str(data.get("card_number", "")).replace(" ", "")
+        card = TEST_CARDS.get(number)
+        if card is None:
+            return {"success": False, "error": "Карта не найдена",
+                    "hint": "Используйте тестовую карту 4242 4242 4242 4242"}
+        if card.get("declined"):
+            return {"success": False, "error": "Карта отклонена", "hint": card["hint"]}
+        if len(str(data.get("cvc", ""))) != 3:
+            return {"success": False, "error": "Неверный CVC"}
+        return {"success": True, "card": {"brand": card["brand"], "last4": number[-4:]}}
+
+    def pay(self, data):
+        result = self.check(data)
+        if not result["success"]:
+            return result
+        number = str(data["card_number"]).replace(" ", "")
+        amount = Decimal(str(data.get("amount", 0)))
+        with self.lock:
+            if self.balances[number] < amount:
+                return {"success": False, "error": "Недостаточно средств",
+                        "hint": TEST_CARDS[number]["hint"]}
+            self.balances[number] -= amount
+        return {
+            "success": True,
+            "message": "Оплата проведена",
+            "transaction_id": f"TXN{uuid.uuid4().hex[:8].upper()}",
+            "auth_code": f"{uuid.uuid4().int % 1000000:06d}",
+        }
+
+    def cards(self):
+        with self.lock:
+            return {"success": True, "cards": [
+                {"card_number": n, "brand": c["brand"], "hint": c["hint"],
+                 "balance": float(self.balances[n])}
+                for n, c in TEST_CARDS.items()
+            ]}
+
+
+class Command(BaseCommand):
+    help = "Локальная заглушка банковского сервиса (BANK_SERVICE_URL=http://localhost:5000)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=5000)
+        parser.add_argument("--latency", type=float, default=0.0,
+                            help="Задержка ответа, сек (имитация медленного банка)")
+        parser.add_argument("--fail-rate", type=float, default=0.0,
+                            help="Доля ответов 503 (проверка circuit breaker)")
+
+    def handle(self, *args, **options):
+        bank = _Bank()
+        latency = options["latency"]
+        fail_every = int(1 / options["fail_rate"]) if options["fail_rate"] > 0 else 0
+        counter = iter(range(1, 1 << 62))
+        stdout = self.stdout
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _dispatch(self, routes):
+                if latency:
+                    time.sleep(latency)
+                if fail_every and next(counter) % fail_every == 0:
+                    return self._reply(503, {"success": False, "error": "Service unavailable"})
+                handler = routes.get(self.path.rstrip("/"))
+                if handler is None:
+                    return self._reply(404, {"success": False, "error": "Not found"})
+                self._reply(200, handler())
+
+            def _json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    return json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return {}
+
+            def do_GET(self):
+                self._dispatch({
+                    "/health": lambda: {"status": "ok"},
+                    "/api/cards": bank.cards,
+                })
+
+            def do_POST(self):
+                data = self._json()
+                self._dispatch({
+                    "/api/check": lambda: bank.check(data),
+                    "/api/pay": lambda: bank.pay(data),
+                    "/api/reset": lambda: (bank.reset(), {"success": True})[1],
+                })
+
+            def log_message(self, fmt, *args):
+                stdout.write(f"[bank] {self.address_string()} {fmt % args}")
+
+        server = ThreadingHTTPServer((options["host"], options["port"]), Handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Заглушка банка на http://{options['host']}:{options['port']} "
+            f"(карты: {', '.join(TEST_CARDS)})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+class Command(BaseCommand):
+    help = "Пересчитать cinema.content_rating_stats по cinema.content_reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--content", help="UUID контента: пересчитать только его")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        content_id = options.get("content")
+
+        with connection.cursor() as cur:
+            if content_id:
+                cur.execute("DELETE FROM cinema.content_rating_stats WHERE content_id = %s", [content_id])
+                where, params = "WHERE content_id = %s", [content_id]
+            else:
+                cur.execute("LOCK TABLE cinema.content_rating_stats IN EXCLUSIVE MODE")
+                cur.execute("DELETE FROM cinema.content_rating_stats")
+                where, params = "", []
+
+            cur.execute(f"""
+                INSERT INTO cinema.content_rating_stats
+                    (content_id, rating_sum, rating_count, avg_rating, updated_at)
+                SELECT content_id, SUM(rating), COUNT(*), ROUND(AVG(rating)::numeric, 2), now()
+                FROM cinema.content_reviews
+                {where}
+                GROUP BY content_id
+            """, params)
+            rebuilt = cur.rowcount
+
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано рейтингов: {rebuilt}"))
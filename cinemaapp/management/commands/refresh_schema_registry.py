@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from cinemaapp import schema
+
+
+class Command(BaseCommand):
+    help = ("Перечитать схему cinema в реестр и показать выбранные имена таблиц/колонок "
+            "(остальные процессы заметят изменение в течение SCHEMA_REGISTRY_CHECK_INTERVAL)")
+
+    def handle(self, *args, **options):
+        schema.schema_changed.send(sender=self.__class__)
+        registry = schema.get()
+
+        self.stdout.write(f"Таблиц в схеме {schema.SCHEMA}: {len(registry.columns)}")
+        self.stdout.write(f"seasons: номер сезона — {registry.season_number_col or 'по порядку id'}")
+        self.stdout.write(f"episodes: номер серии — {registry.episode_number_col or 'по порядку id'}")
+        self.stdout.write(f"история просмотров: {registry.history_table or '—'}"
+                          f" ({registry.history_time_col or '—'})")
+        self.stdout.write(self.style.SUCCESS("Реестр схемы обновлён"))
@@ -0,0 +1,52 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cinemaapp import analytics
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Неверная дата: {value} (ожидается YYYY-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = ("Обновить дневные витрины аналитики (по умолчанию — инкрементально от watermark; "
+            "--loop — периодически, --backfill — первое заполнение или пересчёт периода)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backfill", action="store_true", help="Полный пересчёт за период --from/--to")
+        parser.add_argument("--from", dest="start", help="Начало периода для --backfill (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="end", help="Конец периода для --backfill (YYYY-MM-DD)")
+        parser.add_argument("--lookback", type=int, help="Сколько дней до watermark пересчитать заново")
+        parser.add_argument("--loop", action="store_true", help="Повторять каждые ANALYTICS_ROLLUP_INTERVAL секунд")
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            start = options["start"] and _date(options["start"])
+            end = options["end"] and _date(options["end"])
+            self._report(analytics.backfill(start, end))
+            return
+
+        interval = getattr(settings, "ANALYTICS_ROLLUP_INTERVAL", 300)
+        while True:
+            written = analytics.refresh(lookback=options["lookback"], wait=not options["loop"])
+            if written is not None:
+                self._report(written)
+            if not options["loop"]:
+                return
+            connection.close_if_unusable_or_obsolete()
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                return
+
+    def _report(self, written):
+        for table, rows in written.items():
+            self.stdout.write(f"{table}: {rows}")
+        self.stdout.write(self.style.SUCCESS("Витрины аналитики обновлены"))
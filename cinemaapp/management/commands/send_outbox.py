@@ -0,0 +1,42 @@
+import signal
+import threading
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from cinemaapp import outbox
+
+
+class Command(BaseCommand):
+    help = "Отправить письма из cinema.email_outbox (--loop — работать постоянно)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Не выходить, ждать новых писем")
+        parser.add_argument("--batch", type=int, help="Размер пачки (по умолчанию EMAIL_OUTBOX_BATCH)")
+
+    def handle(self, *args, **options):
+        if options["loop"]:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            try:
+                outbox.run(stop)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        total_sent = total_failed = 0
+        mail_connection = get_connection()
+        try:
+            while True:
+                sent, failed = outbox.drain(mail_connection, batch_size=options.get("batch"))
+                total_sent += sent
+                total_failed += failed
+                if not sent and not failed:
+                    break
+        finally:
+            mail_connection.close()
+        purged = outbox.purge()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Отправлено: {total_sent}, ошибок: {total_failed}, удалено старых: {purged}"
+        ))
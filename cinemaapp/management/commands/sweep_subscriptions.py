@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from cinemaapp import subscriptions
+
+
+class Command(BaseCommand):
+    help = "Обновить effective_status подписок: pending -> active -> expired (--loop — периодически)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Повторять каждые SUBSCRIPTION_SWEEP_INTERVAL секунд")
+
+    def handle(self, *args, **options):
+        interval = getattr(settings, "SUBSCRIPTION_SWEEP_INTERVAL", 60)
+        while True:
+            activated, expired = subscriptions.sweep()
+            if activated or expired or not options["loop"]:
+                self.stdout.write(self.style.SUCCESS(f"Активировано: {activated}, истекло: {expired}"))
+            if not options["loop"]:
+                return
+            connection.close_if_unusable_or_obsolete()
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+
+
+def _max_size() -> int:
+    return getattr(settings, "MEDIA_RESOLVER_CACHE_SIZE", 10000)
+
+
+def _ttl() -> float:
+    return getattr(settings, "MEDIA_RESOLVER_TTL", 600)
+
+
+def _get_cached(key):
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    stored_at, asset = entry
+    if time.monotonic() - stored_at > _ttl():
+        del _entries[key]
+        return None
+    _entries.move_to_end(key)
+    return asset
+
+
+def _put(key, asset):
+    _entries[key] = (time.monotonic(), asset)
+    _entries.move_to_end(key)
+    while len(_entries) > _max_size():
+        _entries.popitem(last=False)
+
+
+def resolve_many(ids) -> dict:
+    """
+    {str(media_id): {"url", "kind", "mime_type"}} для переданных ID.
+    Промахи LRU догружаются одним запросом с = ANY(%s).
+    """
+    keys = {str(i) for i in ids if i}
+    if not keys:
+        return {}
+
+    found = {}
+    with _lock:
+        for key in keys:
+            asset = _get_cached(key)
+            if asset is not None:
+                found[key] = asset
+    missing = [key for key in keys if key not in found]
+
+    if missing:
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT id, url, kind, mime_type
+                FROM cinema.media_assets
+                WHERE id = ANY(%s)
+            """, [missing])
+            rows = cur.fetchall()
+
+        with _lock:
+            for media_id, url, kind, mime_type in rows:
+                asset = {"url": url or "", "kind": kind or "", "mime_type": mime_type or ""}
+                key = str(media_id)
+                _put(key, asset)
+                found[key] = asset
+
+    return found
+
+
+def resolve(media_id):
+    """Один медиа-актив или None"""
+    if not media_id:
+        return None
+    return resolve_many([media_id]).get(str(media_id))
+
+
+def url_for(media_id) -> str:
+    asset = resolve(media_id)
+    return asset["url"] if asset else ""
+
+
+def invalidate(*ids):
+    """Сбросить закэшированные записи (вызывается редактором медиа-активов)."""
+    with _lock:
+        for media_id in ids:
+            if media_id:
+                _entries.pop(str(media_id), None)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_sender = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(subject, body, to, html=None, from_email=None):
+    """
+    Поставить письмо в cinema.email_outbox. Запись идёт в текущей транзакции
+    вызывающего: откат транзакции отменяет и письмо. Отправка — фоновым отправителем.
+    """
+    to = [to] if isinstance(to, str) else [addr for addr in to if addr]
+    if not to:
+        return None
+
+    with connection.cursor() as cur:
+        cur.execute("""
+            INSERT INTO cinema.email_outbox (to_addrs, subject, body, html, from_email)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id
+        """, [to, subject, body, html, from_email])
+        outbox_id = cur.fetchone()[0]
+
+    transaction.on_commit(_wake)
+    return outbox_id
+
+
+def enqueue_message(message: EmailMultiAlternatives):
+    """То же для готового EmailMultiAlternatives (HTML берётся из alternatives)."""
+    html = next((content for content, mimetype in getattr(message, "alternatives", [])
+                 if mimetype == "text/html"), None)
+    return enqueue(message.subject, message.body, message.to, html=html,
+                   from_email=message.from_email)
+
+
+def _claim(cur, limit: int) -> list:
+    """
+    Забрать пачку готовых к отправке писем. Строка «арендуется» сдвигом next_attempt_at
+    на EMAIL_OUTBOX_LEASE секунд — если отправитель упадёт, письмо вернётся в очередь само.
+    """
+    cur.execute("""
+        UPDATE cinema.email_outbox o
+        SET attempts = o.attempts + 1,
+            next_attempt_at = now() + make_interval(secs => %s)
+        WHERE o.id IN (
+            SELECT id FROM cinema.email_outbox
+            WHERE status = 'pending' AND next_attempt_at <= now()
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING o.id, o.to_addrs, o.subject, o.body, o.html, o.from_email, o.attempts
+    """, [_setting("EMAIL_OUTBOX_LEASE", 300), limit])
+    return cur.fetchall()
+
+
+def _backoff(attempts: int) -> float:
+    base = _setting("EMAIL_OUTBOX_RETRY_BASE", 30)
+    return min(base * 2 ** (attempts - 1), _setting("EMAIL_OUTBOX_RETRY_MAX", 3600))
+
+
+def _mark_sent(cur, ids):
+    # тело отправленного письма больше не нужно, а в нём коды и ссылки сброса пароля
+    if ids:
+        cur.execute("""
+            UPDATE cinema.email_outbox
+            SET status = 'sent', sent_at = now(), last_error = NULL, body = '', html = NULL
+            WHERE id = ANY(%s)
+        """, [ids])
+
+
+def _mark_failed(cur, outbox_id, attempts: int, error: str):
+    if attempts >= _setting("EMAIL_OUTBOX_MAX_ATTEMPTS", 6):
+        logger.error("Email %s moved to dead letters after %d attempts: %s", outbox_id, attempts, error)
+        cur.execute("""
+            UPDATE cinema.email_outbox SET status = 'dead', last_error = %s WHERE id = %s
+        """, [error, outbox_id])
+    else:
+        cur.execute("""
+            UPDATE cinema.email_outbox
+            SET last_error = %s, next_attempt_at = now() + make_interval(secs => %s)
+            WHERE id = %s
+        """, [error, _backoff(attempts), outbox_id])
+
+
+def drain(mail_connection=None, batch_size=None) -> tuple[int, int]:
+    """
+    Отправить одну пачку писем через одно SMTP-соединение (открывается, если не передано).
+    Возвращает (отправлено, ошибок).
+    """
+    batch_size = batch_size or _setting("EMAIL_OUTBOX_BATCH", 50)
+    with transaction.atomic(), connection.cursor() as cur:
+        rows = _claim(cur, batch_size)
+    if not rows:
+        return 0, 0
+
+    own_connection = mail_connection is None
+    mail_connection = mail_connection or get_connection()
+    sent, failed = [], 0
+    try:
+        mail_connection.open()
+        for outbox_id, to, subject, body, html, from_email, attempts in rows:
+            message = EmailMultiAlternatives(
+                subject=subject, body=body, to=list(to),
+                from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+                connection=mail_connection,
+            )
+            if html:
+                message.attach_alternative(html, "text/html")
+            try:
+                mail_connection.send_messages([message])
+                sent.append(outbox_id)
+            except Exception as e:
+                failed += 1
+                with connection.cursor() as cur:
+                    _mark_failed(cur, outbox_id, attempts, str(e)[:1000])
+    except Exception as e:
+        # не удалось даже подключиться — вся неотправленная часть пачки уходит на повтор
+        logger.warning("SMTP connection failed: %s", e)
+        with connection.cursor() as cur:
+            for outbox_id, *_, attempts in rows:
+                if outbox_id not in sent:
+                    failed += 1
+                    _mark_failed(cur, outbox_id, attempts, str(e)[:1000])
+    finally:
+        with connection.cursor() as cur:
+            _mark_sent(cur, sent)
+        if own_connection:
+            mail_connection.close()
+    return len(sent), failed
+
+
+def purge(retention=None) -> int:
+    """
+    Удалить отправленные и мёртвые письма старше EMAIL_OUTBOX_RETENTION секунд
+    (мёртвые до этого остаются для разбора — вместе с телом). Возвращает число строк.
+    """
+    retention = _setting("EMAIL_OUTBOX_RETENTION", 7 * 24 * 3600) if retention is None else retention
+    with connection.cursor() as cur:
+        cur.execute("""
+            DELETE FROM cinema.email_outbox
+            WHERE status IN ('sent', 'dead')
+              AND COALESCE(sent_at, created_at) < now() - make_interval(secs => %s)
+        """, [retention])
+        return cur.rowcount
+
+
+def run(stop: threading.Event | None = None, idle_timeout=None):
+    """
+    Цикл отправителя: пачки идут подряд, пока очередь не пуста; SMTP-соединение
+    держится открытым между пачками и закрывается после idle_timeout секунд простоя.
+    В простое не чаще раза в EMAIL_OUTBOX_PURGE_INTERVAL секунд чистит старые письма.
+    """
+    idle_timeout = idle_timeout if idle_timeout is not None else _setting("EMAIL_OUTBOX_IDLE", 30)
+    mail_connection = None
+    idle_since = time.monotonic()
+    purged_at = None
+    while stop is None or not stop.is_set():
+        try:
+            if mail_connection is None:
+                mail_connection = get_connection()
+            sent, failed = drain(mail_connection)
+            if sent or failed:
+                idle_since = time.monotonic()
+                logger.info("Outbox batch: %d sent, %d failed", sent, failed)
+                if failed:
+                    # соединение могло умереть — переоткроется на следующей пачке
+                    mail_connection.close()
+                    mail_connection = None
+                continue
+            if purged_at is None or time.monotonic() - purged_at > _setting("EMAIL_OUTBOX_PURGE_INTERVAL", 3600):
+                purged_at = time.monotonic()
+                purged = purge()
+                if purged:
+                    logger.info("Outbox purge: %d old emails deleted", purged)
+        except Exception:
+            logger.exception("Outbox sender iteration failed")
+        finally:
+            connection.close_if_unusable_or_obsolete()
+
+        if mail_connection is not None and time.monotonic() - idle_since > idle_timeout:
+            mail_connection.close()
+            mail_connection = None
+        _wakeup.wait(_setting("EMAIL_OUTBOX_POLL_INTERVAL", 5))
+        _wakeup.clear()
+
+    if mail_connection is not None:
+        mail_connection.close()
+
+
+def _wake():
+    if not _setting("EMAIL_OUTBOX_INLINE_SENDER", True):
+        return
+    _ensure_sender()
+    _wakeup.set()
+
+
+def _ensure_sender():
+    global _sender
+    if _sender is not None:
+        return
+    with _lock:
+        if _sender is not None:
+            return
+        _sender = threading.Thread(target=run, name="email-outbox", daemon=True)
+        _sender.start()
@@ -0,0 +1,382 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PAID = "paid"
+FAILED = "failed"
+
+# кто держит аренду pending-платежа (claimed_by)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_lock = threading.Lock()
+_executor = None
+_events = {}
+
+
+@dataclass
+class PaymentJob:
+    """
+    Оплата покупки (content_id) или подписки (plan_id).
+    Данные карты живут только в памяти процесса — в БД они не пишутся.
+    """
+    user_id: object
+    amount: object
+    card: dict = field(repr=False)
+    content_id: object = None
+    plan_id: object = None
+    extend_after_current: bool = False
+
+
+@dataclass
+class PaymentState:
+    id: object
+    status: str
+    amount: object
+    txn_uuid: str
+    auth_code: str | None
+    error: str | None
+    hint: str | None
+    created_at: object
+    content_id: object
+    content_title: str | None
+    plan_code: str | None
+    plan_name: str | None
+    subscription_started_at: object
+    subscription_expires_at: object
+    email: str | None
+
+    @property
+    def is_final(self) -> bool:
+        return self.status != PENDING
+
+    @property
+    def is_subscription(self) -> bool:
+        return self.plan_code is not None
+
+    def as_dict(self) -> dict:
+        return {
+            "id": str(self.id),
+            "status": self.status,
+            "error": self.error,
+            "hint": self.hint,
+            "transaction_id": self.txn_uuid if self.status == PAID else None,
+        }
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _lease_seconds() -> int:
+    return _setting("PAYMENT_JOB_TIMEOUT", 120)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_setting("PAYMENT_WORKERS", 4), thread_name_prefix="payment",
+            )
+        return _executor
+
+
+def submit(job: PaymentJob, idempotency_key: str | None = None):
+    """
+    Записать pending-платёж (сразу арендованный этим процессом) и поставить его
+    в пул воркеров. Повтор с тем же ключом (двойной клик, повторная отправка формы) не создаёт
+    второго платежа — возвращается уже существующий. Возвращает (payment_id, created).
+    """
+    client_key = (idempotency_key or "").strip()[:64] or uuid.uuid4().hex
+    key = f"{job.user_id}:{client_key}"
+    payment_id = uuid.uuid4()
+
+    with connection.cursor() as cur:
+        cur.execute("""
+            INSERT INTO cinema.payments
+                (id, txn_uuid, amount, status, created_at, updated_at, idempotency_key,
+                 user_id, content_id, plan_id, extend_after_current, claimed_at, claimed_by)
+            VALUES (%s, %s, %s, 'pending', now(), now(), %s, %s, %s, %s, %s, now(), %s)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING id
+        """, [str(payment_id), str(payment_id), job.amount, key, str(job.user_id),
+              job.content_id and str(job.content_id), job.plan_id and str(job.plan_id),
+              bool(job.extend_after_current), WORKER_ID])
+        if cur.fetchone() is None:
+            cur.execute("SELECT id FROM cinema.payments WHERE idempotency_key = %s", [key])
+            return cur.fetchone()[0], False
+
+    with _lock:
+        _events[str(payment_id)] = threading.Event()
+    transaction.on_commit(lambda: _get_executor().submit(_run, payment_id, job))
+    return payment_id, True
+
+
+def _run(payment_id, job: PaymentJob):
+    from catalog.utils.bank_service import BankService
+
+    try:
+        if not _claim(payment_id):
+            logger.warning("Payment %s is no longer ours to charge, skipped", payment_id)
+            return
+
+        check = BankService.check_card(job.card)
+        if not check.get("success"):
+            _fail(payment_id, f"Ошибка проверки карты: {check.get('error', 'Карта недействительна')}",
+                  check.get("hint"))
+            return
+
+        if not _claim(payment_id):
+            logger.warning("Payment %s lost its claim before charging, skipped", payment_id)
+            return
+        result = BankService.process_payment({**job.card, "amount": float(job.amount)})
+        if not result.get("success"):
+            _fail(payment_id, f"Оплата не прошла: {result.get('error', 'Ошибка оплаты')}",
+                  result.get("hint"))
+            return
+
+        _record_charge(payment_id, result)
+        finalize(payment_id)
+    except Exception:
+        logger.exception("Payment %s failed", payment_id)
+        # если деньги уже списаны, _fail строку не тронет — её дофинализирует recover()
+        _fail(payment_id, "Оплата не прошла: внутренняя ошибка, попробуйте позже")
+    finally:
+        with _lock:
+            event = _events.pop(str(payment_id), None)
+        if event is not None:
+            event.set()
+        connection.close_if_unusable_or_obsolete()
+
+
+def _claim(payment_id) -> bool:
+    """
+    Продлить аренду платежа перед походом в банк. False — платёж уже закрыт
+    или его аренду перехватил recover() (значит, списывать деньги нельзя).
+    """
+    with connection.cursor() as cur:
+        cur.execute("""
+            UPDATE cinema.payments
+            SET claimed_at = now(), claimed_by = %s
+            WHERE id = %s AND status = 'pending' AND auth_code IS NULL
+              AND (claimed_by = %s OR claimed_at IS NULL
+                   OR claimed_at < now() - make_interval(secs => %s))
+        """, [WORKER_ID, str(payment_id), WORKER_ID, _lease_seconds()])
+        return cur.rowcount == 1
+
+
+def _fail(payment_id, error: str, hint: str | None = None):
+    with connection.cursor() as cur:
+        cur.execute("""
+            UPDATE cinema.payments
+            SET status = 'failed', error = %s, hint = %s, updated_at = now()
+            WHERE id = %s AND status = 'pending' AND auth_code IS NULL
+        """, [error, hint, str(payment_id)])
+
+
+def _record_charge(payment_id, result: dict):
+    """
+    Сразу запомнить списание: даже если процесс упадёт, платёж не потеряется.
+    Если платёж успели пометить failed (аренда истекла посреди оплаты), он
+    возвращается в pending — деньги списаны, покупку нужно оформить.
+    """
+    with connection.cursor() as cur:
+        cur.execute("""
+            UPDATE cinema.payments
+            SET txn_uuid = %s, auth_code = %s, status = 'pending',
+                error = NULL, hint = NULL, updated_at = now()
+            WHERE id = %s AND auth_code IS NULL AND status IN ('pending', 'failed')
+        """, [result.get("transaction_id") or f"TXN{uuid.uuid4().hex[:8].upper()}",
+              result.get("auth_code") or "000000", str(payment_id)])
+        if cur.rowcount != 1:
+            logger.critical("Charge for payment %s was not recorded: %s", payment_id, result)
+
+
+def _create_purchase(cur, user_id, content_id):
+    cur.execute("""
+        INSERT INTO cinema.purchases (id, user_id, content_id, purchased_at)
+        VALUES (%s, %s, %s, now())
+        ON CONFLICT (user_id, content_id) DO NOTHING
+        RETURNING id
+    """, [str(uuid.uuid4()), str(user_id), str(content_id)])
+    row = cur.fetchone()
+    if row is not None:
+        return row[0]
+
+    logger.warning("Content %s already purchased by %s, payment kept as paid", content_id, user_id)
+    cur.execute("SELECT id FROM cinema.purchases WHERE user_id = %s AND content_id = %s",
+                [str(user_id), str(content_id)])
+    return cur.fetchone()[0]
+
+
+def _create_subscription(user_id, plan_id, extend_after_current: bool):
+    from catalog.models import SubscriptionPlan, UserSubscription
+
+    plan = SubscriptionPlan.objects.get(pk=plan_id)
+    start_date = timezone.now()
+
+    current_sub = (UserSubscription.get_active_subscriptions(user_id)
+                   .select_for_update().order_by('-expires_at').first())
+    if current_sub is not None:
+        if extend_after_current:
+            start_date = current_sub.expires_at
+        else:
+            current_sub.status = 'cancelled'
+            current_sub.save()
+
+    subscription = UserSubscription.objects.create(
+        id=uuid.uuid4(),
+        user_id=user_id,
+        plan=plan,
+        status='active',
+        started_at=start_date,
+        expires_at=start_date + timedelta(days=plan.period_months * 30),
+    )
+    return subscription.id
+
+
+def finalize(payment_id) -> bool:
+    """
+    Оформить покупку/подписку по списанному платежу (auth_code уже записан).
+    Строка блокируется FOR UPDATE, поэтому повторная финализация ничего не делает.
+    """
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("""
+            SELECT user_id, content_id, plan_id, extend_after_current
+            FROM cinema.payments
+            WHERE id = %s AND status = 'pending' AND auth_code IS NOT NULL
+            FOR UPDATE
+        """, [str(payment_id)])
+        row = cur.fetchone()
+        if row is None:
+            return False
+
+        user_id, content_id, plan_id, extend_after_current = row
+        purchase_id = subscription_id = None
+        if plan_id is not None:
+            subscription_id = _create_subscription(user_id, plan_id, extend_after_current)
+        else:
+            purchase_id = _create_purchase(cur, user_id, content_id)
+
+        cur.execute("""
+            UPDATE cinema.payments
+            SET status = 'paid', paid_at = now(), updated_at = now(),
+                purchase_id = %s, subscription_id = %s
+            WHERE id = %s
+        """, [purchase_id and str(purchase_id), subscription_id and str(subscription_id),
+              str(payment_id)])
+        # письмо ложится в outbox в той же транзакции, что и сам платёж
+        _send_receipt(payment_id)
+    return True
+
+
+def _send_receipt(payment_id):
+    from catalog.models import Payment
+    from catalog.utils.email_sender import send_combined_email
+
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.select_related(
+                'purchase__user', 'purchase__content', 'subscription__user', 'subscription__plan',
+            ).get(pk=payment_id)
+            target = payment.purchase or payment.subscription
+            send_combined_email(target.user, payment,
+                                purchase=payment.purchase, subscription=payment.subscription)
+    except Exception:
+        logger.exception("Receipt for payment %s was not queued", payment_id)
+
+
+def recover(payment_id=None) -> int:
+    """
+    Разобрать зависшие pending-платежи (процесс упал посреди обработки):
+    уже списанные финализируются, остальные помечаются failed — данных карты
+    для повтора больше нет. Без payment_id — все старше PAYMENT_JOB_TIMEOUT.
+    Платежи с живой арендой (их сейчас ведёт воркер любого процесса) не трогаются;
+    каждая строка разбирается под FOR UPDATE SKIP LOCKED в своей транзакции.
+    """
+    lease = _lease_seconds()
+    cutoff = timezone.now() - timedelta(seconds=lease)
+    where, params = "status = 'pending' AND created_at < %s", [cutoff]
+    if payment_id is not None:
+        where += " AND id = %s"
+        params.append(str(payment_id))
+
+    with connection.cursor() as cur:
+        cur.execute(f"SELECT id FROM cinema.payments WHERE {where}", params)
+        stale = [row[0] for row in cur.fetchall()]
+
+    recovered = 0
+    for pid in stale:
+        with transaction.atomic(), connection.cursor() as cur:
+            cur.execute("""
+                SELECT auth_code FROM cinema.payments
+                WHERE id = %s AND status = 'pending'
+                  AND (claimed_at IS NULL OR claimed_at < now() - make_interval(secs => %s))
+                FOR UPDATE SKIP LOCKED
+            """, [str(pid), lease])
+            row = cur.fetchone()
+            if row is None:
+                continue
+            if row[0]:
+                finalize(pid)
+            else:
+                _fail(pid, "Оплата не прошла: обработка платежа прервана, деньги не списаны")
+        recovered += 1
+    return recovered
+
+
+def get(payment_id, user_id) -> PaymentState | None:
+    """Состояние платежа пользователя (чужие платежи не видны)."""
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT p.id, p.status, p.amount, p.txn_uuid, p.auth_code, p.error, p.hint,
+                   p.created_at, p.content_id, c.title, sp.code, sp.name,
+                   us.started_at, us.expires_at, u.email
+            FROM cinema.payments p
+            JOIN cinema.users u ON u.id = p.user_id
+            LEFT JOIN cinema.content c ON c.id = p.content_id
+            LEFT JOIN cinema.subscription_plans sp ON sp.id = p.plan_id
+            LEFT JOIN cinema.user_subscriptions us ON us.id = p.subscription_id
+            WHERE p.id = %s AND p.user_id = %s
+        """, [str(payment_id), str(user_id)])
+        row = cur.fetchone()
+    return PaymentState(*row) if row else None
+
+
+def wait(payment_id, user_id, timeout: float = 0) -> PaymentState | None:
+    """
+    Long-poll: ждать завершения платежа не дольше timeout секунд.
+    Платежи этого процесса ждут события воркера, чужие — опрашиваются по БД.
+    """
+    deadline = time.monotonic() + max(0.0, min(timeout, _setting("PAYMENT_STATUS_WAIT", 10)))
+    while True:
+        state = get(payment_id, user_id)
+        if state is None or state.is_final:
+            return state
+
+        if timezone.now() - state.created_at > timedelta(seconds=_setting("PAYMENT_JOB_TIMEOUT", 120)):
+            recover(payment_id)
+            return get(payment_id, user_id)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return state
+        with _lock:
+            event = _events.get(str(payment_id))
+        if event is not None:
+            event.wait(remaining)
+        else:
+            time.sleep(min(0.5, remaining))
@@ -0,0 +1,308 @@
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+from cinemaapp import episodes, schema
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_pending = {}
+_flusher = None
+
+
+@dataclass
+class Heartbeat:
+    """Последняя известная позиция по ключу (user_id, content_id, sn, en)."""
+    user_id: str
+    content_id: str
+    sn: int
+    en: int
+    position: int
+    duration: int | None
+    completed: bool
+    watched_at: object
+    attempts: int = 0
+
+
+def _flush_interval() -> float:
+    return getattr(settings, "PROGRESS_FLUSH_INTERVAL", 5)
+
+
+def _max_pending() -> int:
+    return getattr(settings, "PROGRESS_MAX_PENDING", 5000)
+
+
+def _max_attempts() -> int:
+    return getattr(settings, "PROGRESS_MAX_ATTEMPTS", 5)
+
+
+def _key(user_id, content_id, sn, en):
+    return (str(user_id), str(content_id), int(sn or 0), int(en or 0))
+
+
+def make_heartbeat(cinema_user_id, content_id, position, duration=None, sn=0, en=0, completed=False):
+    return Heartbeat(
+        user_id=str(cinema_user_id),
+        content_id=str(content_id),
+        sn=int(sn or 0),
+        en=int(en or 0),
+        position=max(0, int(position or 0)),
+        duration=None if duration in (None, "", 0) else int(duration),
+        completed=bool(completed),
+        watched_at=timezone.now(),
+    )
+
+
+def record(cinema_user_id, content_id, position, duration=None, sn=0, en=0, completed=False):
+    """
+    Принять heartbeat в буфер. Хранится только последняя позиция по ключу;
+    запись в БД — пачкой из фонового потока раз в PROGRESS_FLUSH_INTERVAL секунд
+    или сразу, если в буфере больше PROGRESS_MAX_PENDING ключей.
+    """
+    hb = make_heartbeat(cinema_user_id, content_id, position, duration, sn, en, completed)
+    with _lock:
+        _pending[_key(hb.user_id, hb.content_id, hb.sn, hb.en)] = hb
+        overflow = len(_pending) >= _max_pending()
+    _ensure_flusher()
+    if overflow:
+        _wakeup.set()
+
+
+def pending(cinema_user_id, content_id, sn=0, en=0):
+    """Ещё не записанный heartbeat (чтобы чтение видело свежую позицию)."""
+    with _lock:
+        return _pending.get(_key(cinema_user_id, content_id, sn, en))
+
+
+def _take_batch() -> list:
+    with _lock:
+        batch = list(_pending.values())
+        _pending.clear()
+    return batch
+
+
+def _requeue(batch):
+    """
+    Вернуть не записавшиеся heartbeats в буфер (более свежие позиции не затираются).
+    После PROGRESS_MAX_ATTEMPTS неудач heartbeat отбрасывается, чтобы одна
+    «ядовитая» строка не крутилась в буфере вечно.
+    """
+    limit = _max_attempts()
+    dropped = []
+    with _lock:
+        for hb in batch:
+            hb.attempts += 1
+            if hb.attempts >= limit:
+                dropped.append(hb)
+                continue
+            _pending.setdefault(_key(hb.user_id, hb.content_id, hb.sn, hb.en), hb)
+    for hb in dropped:
+        logger.error("Progress heartbeat dropped after %d attempts: user=%s content=%s sn=%s en=%s",
+                     hb.attempts, hb.user_id, hb.content_id, hb.sn, hb.en)
+
+
+_NO_EPISODE = object()
+
+
+def _collapse(batch, failed: list) -> dict:
+    """{(user_id, content_id, episode_id): последний Heartbeat}; heartbeats с ошибкой поиска серии — в failed."""
+    from cinemaapp import services
+
+    episode_ids = {}
+    rows = {}
+    for hb in batch:
+        ep_key = (hb.content_id, hb.sn, hb.en)
+        if ep_key not in episode_ids:
+            try:
+                with transaction.atomic():
+                    episode_ids[ep_key] = services._find_episode_id(hb.content_id, hb.sn, hb.en)
+            except Exception:
+                logger.warning("Episode lookup failed for %s s%se%s", *ep_key, exc_info=True)
+                episode_ids[ep_key] = _NO_EPISODE
+        if episode_ids[ep_key] is _NO_EPISODE:
+            failed.append(hb)
+            continue
+        row_key = (hb.user_id, hb.content_id, episode_ids[ep_key])
+        prev = rows.get(row_key)
+        if prev is None or prev.watched_at <= hb.watched_at:
+            rows[row_key] = hb
+    return rows
+
+
+def write_batch(batch, failed: list | None = None) -> int:
+    """
+    Записать heartbeats одним многострочным INSERT … ON CONFLICT в одной транзакции.
+    Более старый heartbeat не перезаписывает более свежую позицию.
+    Если пачку отвергла БД (удалённый контент или пользователь, кривой id), строки
+    пишутся по одной — каждая в своей транзакции; отвергнутые heartbeats попадают в failed.
+    """
+    failed = [] if failed is None else failed
+    if not batch:
+        return 0
+
+    rows = _collapse(batch, failed)
+    if not rows:
+        return 0
+
+    try:
+        _write_rows(rows)
+        return len(rows)
+    except (IntegrityError, DataError):
+        logger.warning("Progress batch of %d rows rejected, writing row by row", len(rows))
+
+    written = 0
+    for row_key, hb in rows.items():
+        try:
+            _write_rows({row_key: hb})
+            written += 1
+        except (IntegrityError, DataError):
+            logger.warning("Progress row %s rejected", row_key, exc_info=True)
+            failed.append(hb)
+    return written
+
+
+def _write_rows(rows: dict):
+    values = []
+    params = []
+    for (user_id, content_id, episode_id), hb in rows.items():
+        values.append("(%s, %s, %s, %s, %s)")
+        params += [user_id, content_id, episode_id, hb.position, hb.watched_at]
+
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO cinema.watch_history
+                (user_id, content_id, episode_id, progress_sec, watched_at)
+            VALUES {", ".join(values)}
+            ON CONFLICT (user_id, content_id, episode_id) DO UPDATE
+            SET progress_sec = EXCLUDED.progress_sec,
+                watched_at   = EXCLUDED.watched_at
+            WHERE cinema.watch_history.watched_at <= EXCLUDED.watched_at
+        """, params)
+        _upsert_resume(cur, rows)
+    return len(rows)
+
+
+def _upsert_resume(cur, rows: dict):
+    """
+    Обновить cinema.user_resume: последняя позиция по (user, content),
+    процент просмотра и следующая серия. rows — {(user_id, content_id, episode_id): Heartbeat}.
+    """
+    latest = {}
+    for (user_id, content_id, episode_id), hb in rows.items():
+        prev = latest.get((user_id, content_id))
+        if prev is None or prev[1].watched_at <= hb.watched_at:
+            latest[(user_id, content_id)] = (episode_id, hb)
+
+    values = []
+    params = []
+    for (user_id, content_id), (episode_id, hb) in latest.items():
+        values.append("(%s, %s, %s, %s, %s, %s, %s, %s, %s)")
+        params += [user_id, content_id, episode_id and str(episode_id), hb.sn, hb.en,
+                   hb.position, hb.duration, hb.completed, hb.watched_at]
+
+    # номера сезона/серии — как в индексе серий: колонки из реестра схемы или порядок по id
+    registry = schema.get()
+    s_num = episodes._number_expr("s", registry.season_number_col)
+    e_num = episodes._number_expr("e", registry.episode_number_col, partition="season_id")
+
+    cur.execute(f"""
+        INSERT INTO cinema.user_resume AS r
+            (user_id, content_id, episode_id, sn, en, position_sec, duration_sec,
+             progress_pct, next_episode_id, next_sn, next_en, watched_at)
+        SELECT v.user_id::uuid, v.content_id::uuid, v.episode_id::uuid,
+               v.sn::int, v.en::int, v.position::int,
+               COALESCE(v.duration::int, e.duration_sec),
+               CASE WHEN v.completed::boolean THEN 100
+                    ELSE LEAST(100, ROUND(100.0 * v.position::int
+                                          / NULLIF(COALESCE(v.duration::int, e.duration_sec), 0), 2))
+               END,
+               nx.id, nx.season_num, nx.episode_num,
+               v.watched_at::timestamptz
+        FROM (VALUES {", ".join(values)})
+             AS v(user_id, content_id, episode_id, sn, en, position, duration, completed, watched_at)
+        LEFT JOIN cinema.episodes e ON e.id = v.episode_id::uuid
+        LEFT JOIN LATERAL (
+            SELECT n.id, n.sn AS season_num, n.en AS episode_num
+            FROM (
+                SELECT e.id, s.sn, {e_num} AS en
+                FROM (
+                    SELECT s.id, {s_num} AS sn
+                    FROM cinema.seasons s
+                    WHERE s.content_id = v.content_id::uuid
+                ) s
+                JOIN cinema.episodes e ON e.season_id = s.id
+            ) n
+            WHERE (n.sn, n.en) > (v.sn::int, v.en::int)
+            ORDER BY n.sn, n.en, n.id
+            LIMIT 1
+        ) nx ON v.episode_id IS NOT NULL
+        ON CONFLICT (user_id, content_id) DO UPDATE
+        SET episode_id      = EXCLUDED.episode_id,
+            sn              = EXCLUDED.sn,
+            en              = EXCLUDED.en,
+            position_sec    = EXCLUDED.position_sec,
+            duration_sec    = EXCLUDED.duration_sec,
+            progress_pct    = EXCLUDED.progress_pct,
+            next_episode_id = EXCLUDED.next_episode_id,
+            next_sn         = EXCLUDED.next_sn,
+            next_en         = EXCLUDED.next_en,
+            watched_at      = EXCLUDED.watched_at
+        WHERE r.watched_at <= EXCLUDED.watched_at
+    """, params)
+
+
+def flush() -> int:
+    """
+    Сбросить буфер в БД сейчас. Отвергнутые строки и вся пачка при ошибке записи
+    возвращаются в буфер (с ограничением числа попыток, см. _requeue).
+    """
+    batch = _take_batch()
+    if not batch:
+        return 0
+    failed = []
+    try:
+        written = write_batch(batch, failed)
+    except Exception:
+        logger.exception("Progress flush failed, %d heartbeats requeued", len(batch))
+        _requeue(batch)
+        return 0
+    if failed:
+        _requeue(failed)
+    return written
+
+
+def _run_flusher():
+    while True:
+        _wakeup.wait(_flush_interval())
+        _wakeup.clear()
+        try:
+            flush()
+        finally:
+            connection.close_if_unusable_or_obsolete()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_run_flusher, name="progress-flush", daemon=True)
+        _flusher.start()
+
+
+@atexit.register
+def _flush_on_exit():
+    if _pending:
+        started = time.monotonic()
+        written = flush()
+        logger.info("Progress flushed on exit: %d rows in %.3fs", written, time.monotonic() - started)
@@ -0,0 +1,159 @@
+import json
+import logging
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "rutube:url:{}"
+
+_ID_PATTERNS = [
+    re.compile(r'rutube\.ru/video/([a-f0-9]{32})', re.IGNORECASE),
+    re.compile(r'rutube\.ru/play/embed/([a-f0-9]{32})', re.IGNORECASE),
+]
+_DATA_RE = re.compile(r'window\.__DATA__\s*=\s*({.*?});', re.DOTALL)
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Referer': 'https://rutube.ru/',
+    'Accept': 'application/json',
+}
+
+_lock = threading.Lock()
+_inflight = {}
+_executor = None
+_session = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_setting("RUTUBE_WORKERS", 4), thread_name_prefix="rutube",
+            )
+        return _executor
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(_HEADERS)
+        return _session
+
+
+def extract_video_id(url: str) -> str | None:
+    for pattern in _ID_PATTERNS:
+        match = pattern.search(url or "")
+        if match:
+            return match.group(1)
+    return None
+
+
+def fetch_direct_url(video_id: str) -> str | None:
+    """
+    Запрос к Rutube: сначала API play/options, затем window.__DATA__ со страницы видео.
+    Базовый адрес — RUTUBE_BASE_URL (для локального заглушечного сервера).
+    """
+    base = _setting("RUTUBE_BASE_URL", "https://rutube.ru").rstrip("/")
+    timeout = _setting("RUTUBE_TIMEOUT", (3, 5))
+    session = _get_session()
+
+    response = session.get(f"{base}/api/play/options/{video_id}/", timeout=timeout)
+    if response.status_code != 200:
+        return None
+
+    data = response.json()
+    if 'mp4' in data.get('video_balancer', {}):
+        return data['video_balancer']['mp4']['url']
+    if 'url' in data.get('video', {}):
+        return data['video']['url']
+
+    html = session.get(f"{base}/video/{video_id}/", timeout=timeout).text
+    match = _DATA_RE.search(html)
+    if match:
+        page_data = json.loads(match.group(1))
+        if 'url' in page_data.get('video', {}):
+            return page_data['video']['url']
+    return None
+
+
+def _resolve_and_store(video_id: str) -> str | None:
+    try:
+        url = fetch_direct_url(video_id)
+    except Exception as e:
+        logger.warning(f"Rutube lookup failed for {video_id}: {e}")
+        url = None
+
+    if url:
+        cache.set(CACHE_KEY.format(video_id), url, _setting("RUTUBE_CACHE_TTL", 3600))
+    else:
+        # отрицательный результат кэшируем короче, чтобы не долбить Rutube
+        cache.set(CACHE_KEY.format(video_id), "", _setting("RUTUBE_NEGATIVE_TTL", 300))
+
+    with _lock:
+        _inflight.pop(video_id, None)
+    return url
+
+
+def _submit(video_id: str):
+    """Один запрос к Rutube на video_id, сколько бы потоков его ни ждали (single-flight)."""
+    executor = _get_executor()  # до _lock: _get_executor берёт его сам, а Lock не реентерабелен
+    with _lock:
+        future = _inflight.get(video_id)
+        if future is None:
+            # поиск мог завершиться между промахом кэша у вызывающего и _lock:
+            # результат уже в кэше (_resolve_and_store кладёт его до снятия из _inflight)
+            cached = cache.get(CACHE_KEY.format(video_id))
+            if cached is not None:
+                future = Future()
+                future.set_result(cached or None)
+                return future
+            future = _inflight[video_id] = executor.submit(_resolve_and_store, video_id)
+    return future
+
+
+def resolve(rutube_url: str, wait: float | None = None) -> str | None:
+    """
+    Прямая ссылка на видео Rutube или None.
+    Ждёт разрешения не дольше wait (по умолчанию RUTUBE_WAIT) секунд — если не успели,
+    поиск продолжается в фоне, а результат попадёт в кэш для следующего запроса.
+    """
+    video_id = extract_video_id(rutube_url)
+    if not video_id:
+        return None
+
+    cached = cache.get(CACHE_KEY.format(video_id))
+    if cached is not None:
+        return cached or None
+
+    future = _submit(video_id)
+    try:
+        return future.result(timeout=_setting("RUTUBE_WAIT", 2) if wait is None else wait)
+    except FutureTimeout:
+        return None
+
+
+def prefetch(*urls):
+    """Разрешить ссылки в фоне (новые медиа-активы), не дожидаясь результата."""
+    for url in urls:
+        video_id = extract_video_id(url)
+        if video_id and cache.get(CACHE_KEY.format(video_id)) is None:
+            _submit(video_id)
+
+
+def invalidate(rutube_url: str):
+    video_id = extract_video_id(rutube_url)
+    if video_id:
+        cache.delete(CACHE_KEY.format(video_id))
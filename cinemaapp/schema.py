@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection
+from django.dispatch import Signal, receiver
+from django.db.models.signals import post_migrate
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = "cinema"
+
+# season_num/episode_num — колонки текущей схемы (их же используют модели каталога и
+# бэкфилл cinema.user_resume), остальные — для старых вариантов схемы
+SEASON_NUMBER_COLUMNS = ["season_num", "season_number", "number", "seq", "position", "ord", "order_num", "index"]
+EPISODE_NUMBER_COLUMNS = ["episode_num", "number", "episode_number", "seq", "position", "ord", "order_num", "index"]
+HISTORY_TABLES = ["watch_history", "view_history", "content_views", "views", "history"]
+HISTORY_TIME_COLUMNS = ["viewed_at", "watched_at", "created_at", "updated_at", "time_at", "timestamp"]
+
+# Отправляется после изменения схемы cinema — реестр перечитывается.
+schema_changed = Signal()
+
+_lock = threading.Lock()
+_registry = None
+_last_version_check = 0.0
+
+
+@dataclass(frozen=True)
+class SchemaRegistry:
+    """
+    Снимок схемы cinema: таблицы, их колонки и выбранные из вариантов имена.
+    Строится одним запросом к information_schema на процесс.
+    """
+    columns: dict = field(default_factory=dict)
+    version: str = ""
+    season_number_col: str | None = None
+    episode_number_col: str | None = None
+    history_table: str | None = None
+    history_time_col: str | None = None
+
+    @property
+    def tables(self) -> set:
+        return set(self.columns)
+
+    def has_table(self, table: str) -> bool:
+        return table in self.columns
+
+    def columns_of(self, table: str) -> set:
+        return set(self.columns.get(table, ()))
+
+    def pick(self, table: str, candidates) -> str | None:
+        cols = self.columns.get(table, ())
+        return next((c for c in candidates if c in cols), None)
+
+
+def schema_version() -> str:
+    """
+    Версия схемы cinema из pg_catalog, общая для всех процессов: число колонок и
+    сумма xmin их строк в pg_attribute. Любой DDL по колонкам (миграция или правка
+    руками) меняет её, поэтому каждый процесс дешёво замечает изменение сам.
+    """
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*), COALESCE(SUM(a.xmin::text::bigint), 0)
+            FROM pg_catalog.pg_attribute a
+            JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s
+              AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+              AND a.attnum > 0 AND NOT a.attisdropped
+        """, [SCHEMA])
+        total, xmin_sum = cur.fetchone()
+    return f"{total}:{xmin_sum}"
+
+
+def introspect() -> SchemaRegistry:
+    version = schema_version()
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = %s
+        """, [SCHEMA])
+        rows = cur.fetchall()
+
+    columns = {}
+    for table, column in rows:
+        columns.setdefault(table, set()).add(column)
+    columns = {table: frozenset(cols) for table, cols in columns.items()}
+
+    probe = SchemaRegistry(columns=columns)
+    history_table = next((t for t in HISTORY_TABLES if probe.has_table(t)), None)
+    history_time_col = None
+    if history_table:
+        history_time_col = probe.pick(history_table, HISTORY_TIME_COLUMNS) or "created_at"
+
+    return SchemaRegistry(
+        columns=columns,
+        version=version,
+        season_number_col=probe.pick("seasons", SEASON_NUMBER_COLUMNS),
+        episode_number_col=probe.pick("episodes", EPISODE_NUMBER_COLUMNS),
+        history_table=history_table,
+        history_time_col=history_time_col,
+    )
+
+
+def refresh() -> SchemaRegistry:
+    global _registry, _last_version_check
+    registry = introspect()
+    with _lock:
+        _registry = registry
+        _last_version_check = time.monotonic()
+    logger.info("Schema registry loaded: %d tables in %s", len(registry.columns), SCHEMA)
+    return registry
+
+
+def get() -> SchemaRegistry:
+    """
+    Реестр текущего процесса (строится при первом обращении). Раз в
+    SCHEMA_REGISTRY_CHECK_INTERVAL секунд версия схемы сверяется с БД —
+    после миграции в другом процессе реестр перечитывается и здесь.
+    """
+    global _last_version_check
+    registry = _registry
+    if registry is None:
+        return refresh()
+
+    now = time.monotonic()
+    if now - _last_version_check < getattr(settings, "SCHEMA_REGISTRY_CHECK_INTERVAL", 30):
+        return registry
+    _last_version_check = now
+    try:
+        if schema_version() != registry.version:
+            logger.info("Schema %s changed, reloading registry", SCHEMA)
+            registry = refresh()
+    except Exception:
+        logger.exception("Schema version check failed")
+    return registry
+
+
+@receiver(schema_changed)
+def _on_schema_changed(sender, **kwargs):
+    refresh()
+
+
+@receiver(post_migrate)
+def _on_post_migrate(sender, **kwargs):
+    global _registry
+    with _lock:
+        _registry = None
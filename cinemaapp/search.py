@@ -0,0 +1,142 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Content
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def to_tsquery_text(query: str) -> str | None:
+    """
+    'Матрица перезагр' -> 'матрица:* & перезагр:*'.
+    Каждое слово ищется по префиксу, спецсимволы tsquery отбрасываются.
+    """
+    tokens = _TOKEN_RE.findall((query or "").lower())
+    if not tokens:
+        return None
+    return " & ".join(f"{t}:*" for t in tokens)
+
+
+def match_sql(alias: str = "c", query: str = ""):
+    """
+    SQL-условие полнотекстового совпадения для cinema.content и его параметры.
+    Ищет одновременно по русской (со стеммингом) и simple конфигурации.
+    """
+    tsq = to_tsquery_text(query)
+    if tsq is None:
+        return "FALSE", []
+    return (
+        f"{alias}.search_vector @@ (to_tsquery('russian', %s) || to_tsquery('simple', %s))",
+        [tsq, tsq],
+    )
+
+
+def fuzzy_search_ids(query: str, content_type: str | None = None, limit: int | None = None) -> list:
+    """
+    Нечёткий поиск по триграммам (pg_trgm) для запросов с опечатками.
+    Совпадения по названию серии засчитываются сериалу с небольшим штрафом.
+    Использует GIN-индексы content_title_trgm и episodes_title_trgm.
+    """
+    q = (query or "").strip()
+    if not q:
+        return []
+
+    threshold = getattr(settings, "SEARCH_TRGM_THRESHOLD", 0.3)
+    limit = limit or getattr(settings, "SEARCH_FUZZY_LIMIT", 10)
+
+    sql = """
+        WITH hits AS (
+            SELECT c.id AS content_id, similarity(c.title, %s) AS sim
+            FROM cinema.content c
+            WHERE c.title %% %s
+          UNION ALL
+            SELECT s.content_id, similarity(e.title, %s) * 0.9 AS sim
+            FROM cinema.episodes e
+            JOIN cinema.seasons s ON s.id = e.season_id
+            WHERE e.title %% %s
+        )
+        SELECT h.content_id
+        FROM hits h
+        JOIN cinema.content c ON c.id = h.content_id
+    """
+    params = [q, q, q, q]
+
+    if content_type:
+        sql += " WHERE c.type = %s"
+        params.append(content_type)
+
+    sql += """
+        GROUP BY h.content_id, c.title
+        ORDER BY MAX(h.sim) DESC, c.title
+        LIMIT %s
+    """
+    params.append(limit)
+
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", [str(threshold)])
+        cur.execute(sql, params)
+        return [row[0] for row in cur.fetchall()]
+
+
+def search_ids(query: str, content_type: str | None = None, limit: int | None = 50,
+               fuzzy: bool = True) -> list:
+    """
+    ID контента в порядке релевантности:
+    точное совпадение названия, затем совпадение по префиксу, затем ts_rank.
+    Если полнотекстовый поиск ничего не нашёл — триграммный поиск (fuzzy_search_ids).
+    """
+    tsq = to_tsquery_text(query)
+    ids = _fulltext_ids(query, tsq, content_type, limit) if tsq else []
+
+    if not ids and fuzzy:
+        fuzzy_limit = getattr(settings, "SEARCH_FUZZY_LIMIT", 10)
+        ids = fuzzy_search_ids(query, content_type, min(limit or fuzzy_limit, fuzzy_limit))
+    return ids
+
+
+def _fulltext_ids(query: str, tsq: str, content_type: str | None, limit: int | None) -> list:
+    q = query.strip().lower()
+    sql = """
+        WITH q AS (
+            SELECT to_tsquery('russian', %s) || to_tsquery('simple', %s) AS tsq
+        )
+        SELECT c.id
+        FROM cinema.content c, q
+        WHERE c.search_vector @@ q.tsq
+    """
+    params = [tsq, tsq]
+
+    if content_type:
+        sql += " AND c.type = %s"
+        params.append(content_type)
+
+    sql += """
+        ORDER BY
+            (lower(c.title) = %s) DESC,
+            (left(lower(c.title), %s) = %s) DESC,
+            ts_rank(c.search_vector, q.tsq) DESC,
+            c.release_year DESC,
+            c.title
+    """
+    params += [q, len(q), q]
+
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        return [row[0] for row in cur.fetchall()]
+
+
+def search_content(query: str, content_type: str | None = None, limit: int | None = 50) -> list:
+    """Объекты Content (с обложками) в порядке search_ids"""
+    ids = search_ids(query, content_type, limit)
+    if not ids:
+        return []
+    by_id = (Content.objects
+             .select_related("cover_image", "cover_image_wide")
+             .in_bulk(ids))
+    return [by_id[i] for i in ids if i in by_id]
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from cinemaapp import services
+
+VERSION_KEY = "series_tree:version:{}"
+
+_lock = threading.Lock()
+_trees = OrderedDict()
+
+
+def _max_trees() -> int:
+    return getattr(settings, "SERIES_TREE_CACHE_SIZE", 1000)
+
+
+def _ttl() -> float:
+    return getattr(settings, "SERIES_TREE_TTL", 600)
+
+
+def _version(content_id) -> int:
+    return cache.get(VERSION_KEY.format(content_id), 0)
+
+
+def _masked(tree: list) -> list:
+    """Тот же список сезонов, но с пустыми video_url (строится один раз при сборке)."""
+    return [
+        {**season, "episodes": [{**e, "video_url": ""} for e in season["episodes"]]}
+        for season in tree
+    ]
+
+
+def get_tree(content, can_watch: bool = True) -> list:
+    """
+    Дерево сезонов/серий сериала (формат services.series_tree) из кэша процесса.
+    Для пользователей без доступа отдаётся заранее построенный вариант без video_url,
+    поэтому маскирование не копирует дерево на каждый запрос.
+    Результат общий для всех запросов — не изменять.
+    """
+    key = str(content.id)
+    version = _version(key)
+    now = time.monotonic()
+
+    with _lock:
+        entry = _trees.get(key)
+        if entry is not None and entry[0] == version and now - entry[1] <= _ttl():
+            _trees.move_to_end(key)
+            return entry[2] if can_watch else entry[3]
+
+    tree = services.series_tree(content)
+    masked = _masked(tree)
+    with _lock:
+        _trees[key] = (version, now, tree, masked)
+        _trees.move_to_end(key)
+        while len(_trees) > _max_trees():
+            _trees.popitem(last=False)
+    return tree if can_watch else masked
+
+
+def bump(content_id):
+    """Новая версия дерева сериала (админка: сезоны/серии изменились)."""
+    key = VERSION_KEY.format(content_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+    with _lock:
+        _trees.pop(str(content_id), None)
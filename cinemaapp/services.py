@@ -1,4 +1,3 @@
-import requests
 from .models import Genre, Content, ContentGenre, VContentWithRating, WatchHistory, Episode, Season, Watchlist, Episode
 from django.db.models import Count, Prefetch, Max, Exists, OuterRef
 from typing import Iterable, List, Dict, Optional
@@ -7,7 +6,8 @@ from django.db import connection, transaction
 from cinemaapp.models import Watchlist, ContentGenre
 from django.utils import timezone
 from uuid import UUID
-import re
+
+from cinemaapp import schema
 
 def list_genres_non_empty(order_by='items_desc'):
     """Получить жанры с контентом (без prefetch_related)"""
@@ -102,36 +102,94 @@ def list_content_by_genre(genre: Genre, limit=20, group='all'):
     return results
 
 def build_genre_sections(limit_sections=12, limit_per_genre=20, group='all'):
-    """Построить секции по жанрам (упрощенная версия)"""
+    """
+    Построить секции по жанрам одним запросом.
+    Топ-N контента для каждого жанра выбирается через ROW_NUMBER() OVER (PARTITION BY genre),
+    поэтому число обращений к БД не зависит от количества жанров.
+    """
+    from django.db import connection
+    from .models import Content, MediaAsset
+
+    type_filter = ""
+    if group == 'movies':
+        type_filter = " AND c.type = 'movie'"
+    elif group == 'series':
+        type_filter = " AND c.type = 'series'"
+
+    query = f"""
+        WITH top_genres AS (
+            SELECT g.id, g.name, COUNT(cg.content_id) AS items_cnt
+            FROM cinema.genres g
+            JOIN cinema.content_genres cg ON cg.genre_id = g.id
+            GROUP BY g.id, g.name
+            ORDER BY items_cnt DESC, g.name
+            LIMIT %s
+        ),
+        ranked AS (
+            SELECT tg.id AS genre_id, tg.name AS genre_name, tg.items_cnt,
+                   c.id, c.type, c.title, c.release_year, c.description,
+                   c.is_free, c.price, c.cover_image_id, c.cover_image_wide_id,
+                   c.trailer_id, c.video_id,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY tg.id
+                       ORDER BY c.release_year DESC, c.title
+                   ) AS rn
+            FROM top_genres tg
+            JOIN cinema.content_genres cg ON cg.genre_id = tg.id
+            JOIN cinema.content c ON c.id = cg.content_id
+            WHERE 1=1{type_filter}
+        )
+        SELECT genre_id, genre_name, id, type, title, release_year, description,
+               is_free, price, cover_image_id, cover_image_wide_id, trailer_id, video_id
+        FROM ranked
+        WHERE rn <= %s
+        ORDER BY items_cnt DESC, genre_name, rn
+    """
+
+    with connection.cursor() as cur:
+        cur.execute(query, [limit_sections, limit_per_genre])
+        columns = [col[0] for col in cur.description]
+        rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+
     sections = []
+    by_genre = {}
+    for row in rows:
+        section = by_genre.get(row['genre_id'])
+        if section is None:
+            section = {"title": row['genre_name'], "items": []}
+            by_genre[row['genre_id']] = section
+            sections.append(section)
 
-    genres = list_genres_non_empty(order_by='items_desc')
-    
-    for g in genres[:limit_sections]:
+        content = Content(
+            id=row['id'],
+            type=row['type'],
+            title=row['title'],
+            release_year=row['release_year'],
+            description=row['description'],
+            is_free=row['is_free'],
+            price=row['price']
+        )
+        if row['cover_image_id']:
+            content.cover_image = MediaAsset(id=row['cover_image_id'])
+        if row['cover_image_wide_id']:
+            content.cover_image_wide = MediaAsset(id=row['cover_image_wide_id'])
+        if row['trailer_id']:
+            content.trailer = MediaAsset(id=row['trailer_id'])
+        if row['video_id']:
+            content.video = MediaAsset(id=row['video_id'])
+        section["items"].append(content)
+
+    all_items = [c for section in sections for c in section["items"]]
+    _load_media_for_content(all_items)
 
-        items = list_content_by_genre(g, limit=limit_per_genre, group=group)
-        
-        if items:
-            sections.append({"title": g.name, "items": list(items)})
-    
     return sections
 
 def _pick_col(table: str, candidates: list[str]) -> str | None:
-    with connection.cursor() as cur:
-        cur.execute(
-            "SELECT column_name FROM information_schema.columns "
-            "WHERE table_schema='cinema' AND table_name=%s",
-            [table],
-        )
-        cols = {r[0] for r in cur.fetchall()}
-    for c in candidates:
-        if c in cols:
-            return c
-    return None
+    return schema.get().pick(table, candidates)
 
 def _resolve_season_id(content_id, sn: int):
     sn = int(sn)
-    col = _pick_col("seasons", ["season_number", "number", "seq", "position", "ord", "order_num", "index"])
+    col = schema.get().season_number_col
     with connection.cursor() as cur:
         if col:
             cur.execute(f"SELECT id FROM cinema.seasons WHERE content_id=%s AND {col}=%s LIMIT 1", [str(content_id), sn])
@@ -145,7 +203,7 @@ def _resolve_season_id(content_id, sn: int):
 
 def _resolve_episode_id(season_id, en: int):
     en = int(en)
-    col = _pick_col("episodes", ["number", "episode_number", "seq", "position", "ord", "order_num", "index"])
+    col = schema.get().episode_number_col
     with connection.cursor() as cur:
         if col:
             cur.execute(f"SELECT id FROM cinema.episodes WHERE season_id=%s AND {col}=%s LIMIT 1", [str(season_id), en])
@@ -275,14 +333,14 @@ def rating_map(ids):
     id_strs = [str(id) for id in ids]
     
     query = """
-        SELECT id, avg_rating
-        FROM cinema.v_content_with_rating
-        WHERE id = ANY(%s)
+        SELECT content_id, avg_rating
+        FROM cinema.content_rating_stats
+        WHERE content_id = ANY(%s)
     """
     
     with connection.cursor() as cur:
         cur.execute(query, [id_strs])
-        return {row[0]: row[1] for row in cur.fetchall()}
+        return {row[0]: float(row[1]) for row in cur.fetchall()}
 
 def to_ctx_item(c):
     """Преобразовать объект Content в словарь для шаблона"""
@@ -301,29 +359,56 @@ def to_ctx_item(c):
     }
 
 def get_continue_watch_for_user(django_user, limit=20):
-    """Получить контент для продолжения просмотра"""
+    """
+    Контент для «Продолжить просмотр» из cinema.user_resume — один запрос
+    по индексу (user_id, watched_at DESC). У объектов есть атрибут resume
+    (позиция, процент, текущая и следующая серия).
+    """
     if not getattr(django_user, "is_authenticated", False):
         return []
 
     from django.db import connection
-    
-    query = """
-        SELECT DISTINCT ON (wh.content_id) wh.content_id, wh.watched_at
-        FROM cinema.watch_history wh
-        JOIN cinema.users u ON u.id = wh.user_id
-        WHERE u.login = %s
-        ORDER BY wh.content_id, wh.watched_at DESC
-        LIMIT %s
-    """
-    
-    with connection.cursor() as cur:
-        cur.execute(query, [django_user.username, limit])
-        content_ids = [row[0] for row in cur.fetchall()]
-    
-    if not content_ids:
+    from . import identity
+    from .models import MediaAsset
+
+    cinema_user_id = identity.resolve(django_user, create=False)
+    if cinema_user_id is None:
         return []
 
-    return list_content_by_ids(content_ids)
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT c.id, c.type, c.title, c.release_year, c.description,
+                   c.is_free, c.price, c.cover_image_id, c.cover_image_wide_id,
+                   r.sn, r.en, r.position_sec, r.duration_sec, r.progress_pct,
+                   r.next_sn, r.next_en, r.watched_at
+            FROM cinema.user_resume r
+            JOIN cinema.content c ON c.id = r.content_id
+            WHERE r.user_id = %s
+            ORDER BY r.watched_at DESC
+            LIMIT %s
+        """, [cinema_user_id, limit])
+        rows = cur.fetchall()
+
+    results = []
+    for (content_id, ctype, title, year, description, is_free, price, cover_id, wide_id,
+         sn, en, position, duration, pct, next_sn, next_en, watched_at) in rows:
+        content = Content(
+            id=content_id, type=ctype, title=title, release_year=year,
+            description=description, is_free=is_free, price=price,
+        )
+        if cover_id:
+            content.cover_image = MediaAsset(id=cover_id)
+        if wide_id:
+            content.cover_image_wide = MediaAsset(id=wide_id)
+        content.resume = {
+            "sn": sn, "en": en,
+            "position_sec": position, "duration_sec": duration,
+            "progress_pct": float(pct) if pct is not None else None,
+            "next_sn": next_sn, "next_en": next_en,
+            "watched_at": watched_at,
+        }
+        results.append(content)
+    return results
 
 def list_content_by_ids(ids, limit=None):
     """Получить контент по списку ID"""
@@ -418,6 +503,7 @@ def _user_has_active_subscription(cinema_user_id) -> bool:
             SELECT 1
             FROM cinema.user_subscriptions
             WHERE user_id=%s
+              AND effective_status IN ('pending', 'active')
               AND status='active'
               AND (
                   -- Текущая активная подписка
@@ -437,16 +523,7 @@ def _user_has_active_subscription(cinema_user_id) -> bool:
         return False
 
     def pick(cols):
-        with connection.cursor() as cur:
-            cur.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_schema='cinema' AND table_name=%s
-            """, [table])
-            have = {r[0] for r in cur.fetchall()}
-        for c in cols:
-            if c in have:
-                return c
-        return None
+        return schema.get().pick(table, cols)
 
     user_col   = pick(["user_id","uid","customer_id"])
     active_col = pick(["is_active","active"])
@@ -488,20 +565,12 @@ def dictfetchone(cur):
     return {cols[i]: row[i] for i in range(len(cols))}
 
 def _cinema_tables():
-    with connection.cursor() as cur:
-        cur.execute("""
-            SELECT table_name FROM information_schema.tables
-            WHERE table_schema='cinema'
-        """)
-        return {r[0] for r in cur.fetchall()}
+    return schema.get().tables
 
-def _columns(schema, table):
-    with connection.cursor() as cur:
-        cur.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_schema=%s AND table_name=%s
-        """, [schema, table])
-        return {r[0] for r in cur.fetchall()}
+def _columns(schema_name, table):
+    if schema_name != schema.SCHEMA:
+        return set()
+    return schema.get().columns_of(table)
 
 def _detect_subscription_table():
     return {
@@ -577,33 +646,136 @@ def get_user_subscription_info(dj_user):
 def _ensure_cinema_user(user):
     """
     Возвращает UUID из cinema.users для текущего Django-пользователя.
-    Если записи нет — создаёт её (минимально валидную).
+    Если записи нет — создаёт её (минимально валидную). Результат кэшируется в identity.
     """
-    login_raw = user.username or f"user{user.id}"
-
-    login = re.sub(r"[^A-Za-z0-9_.-]", "_", login_raw)[:32]
-    if len(login) < 5:
-        login = f"user{user.id:04d}"
+    from . import identity
+    return identity.resolve(user)
 
- 
-    email = user.email or f"{login}@local.test"
+def _apply_rating_delta(cur, content_id, old_rating, new_rating):
+    """
+    Обновить агрегат cinema.content_rating_stats на разницу между старой и новой оценкой.
+    Вызывать в той же транзакции, что и запись в content_reviews.
+    Возвращает новый средний рейтинг.
+    """
+    delta_sum = int(new_rating) - int(old_rating or 0)
+    delta_count = 0 if old_rating is not None else 1
+
+    cur.execute(
+        """
+        INSERT INTO cinema.content_rating_stats AS s
+            (content_id, rating_sum, rating_count, avg_rating, updated_at)
+        VALUES (%s, %s, %s, %s, now())
+        ON CONFLICT (content_id) DO UPDATE
+        SET rating_sum   = s.rating_sum + EXCLUDED.rating_sum,
+            rating_count = s.rating_count + EXCLUDED.rating_count,
+            avg_rating   = COALESCE(ROUND(
+                               (s.rating_sum + EXCLUDED.rating_sum)::numeric
+                               / NULLIF(s.rating_count + EXCLUDED.rating_count, 0), 2), 0),
+            updated_at   = now()
+        RETURNING avg_rating
+        """,
+        [str(content_id), delta_sum, delta_count, int(new_rating)],
+    )
+    return cur.fetchone()[0]
 
-    with connection.cursor() as cur:
-        cur.execute("SELECT id FROM cinema.users WHERE login=%s", [login])
-        row = cur.fetchone()
-        if row:
-            return row[0]
+_KEEP_COMMENT = object()
 
 
+def _write_review(cur, cinema_user_id, content_id, rating: int, comment=_KEEP_COMMENT):
+    """
+    Записать оценку пользователя и вернуть прежнюю (None — отзыв новый).
+    Сначала INSERT … ON CONFLICT DO NOTHING: при одновременной вставке того же
+    отзыва он дождётся чужой транзакции, и прежнее значение читается уже под
+    блокировкой строки. Так два параллельных «первых» отзыва не посчитаются дважды.
+    """
+    user_id, content_id = str(cinema_user_id), str(content_id)
+    new_comment = None if comment is _KEEP_COMMENT else comment
+    for _ in range(3):
         cur.execute(
             """
-            INSERT INTO cinema.users (email, login, password_hash)
-            VALUES (%s, %s, %s)
-            RETURNING id
+            INSERT INTO cinema.content_reviews (user_id, content_id, rating, comment)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (user_id, content_id) DO NOTHING
+            RETURNING rating
             """,
-            [email, login, "$argon2"],
+            [user_id, content_id, rating, new_comment],
         )
-        return cur.fetchone()[0]
+        if cur.fetchone() is not None:
+            return None
+
+        cur.execute(
+            "SELECT rating FROM cinema.content_reviews "
+            "WHERE user_id=%s AND content_id=%s FOR UPDATE",
+            [user_id, content_id],
+        )
+        row = cur.fetchone()
+        if row is None:
+            continue  # отзыв удалили между запросами — пробуем вставить снова
+
+        if comment is _KEEP_COMMENT:
+            cur.execute(
+                "UPDATE cinema.content_reviews SET rating=%s, updated_at=now() "
+                "WHERE user_id=%s AND content_id=%s",
+                [rating, user_id, content_id],
+            )
+        else:
+            cur.execute(
+                "UPDATE cinema.content_reviews SET rating=%s, comment=%s, updated_at=now() "
+                "WHERE user_id=%s AND content_id=%s",
+                [rating, comment, user_id, content_id],
+            )
+        return row[0]
+    raise RuntimeError(f"Не удалось записать отзыв {user_id}/{content_id}")
+
+
+def _recompute_rating_stats(cur, content_ids):
+    """
+    Пересчитать агрегаты заданного контента по cinema.content_reviews целиком
+    (правки отзывов в админке). Строки агрегата блокируются до подсчёта, поэтому
+    параллельные дельты из _apply_rating_delta применятся поверх, а не потеряются.
+    """
+    ids = [str(i) for i in set(content_ids) if i]
+    if not ids:
+        return
+    cur.execute(
+        "SELECT 1 FROM cinema.content_rating_stats WHERE content_id = ANY(%s::uuid[]) FOR UPDATE",
+        [ids],
+    )
+    cur.execute(
+        """
+        INSERT INTO cinema.content_rating_stats AS s
+            (content_id, rating_sum, rating_count, avg_rating, updated_at)
+        SELECT c.id, COALESCE(SUM(r.rating), 0), COUNT(r.rating),
+               COALESCE(ROUND(AVG(r.rating)::numeric, 2), 0), now()
+        FROM cinema.content c
+        LEFT JOIN cinema.content_reviews r ON r.content_id = c.id
+        WHERE c.id = ANY(%s::uuid[])
+        GROUP BY c.id
+        ON CONFLICT (content_id) DO UPDATE
+        SET rating_sum   = EXCLUDED.rating_sum,
+            rating_count = EXCLUDED.rating_count,
+            avg_rating   = EXCLUDED.avg_rating,
+            updated_at   = now()
+        """,
+        [ids],
+    )
+
+def _remove_user_ratings(cur, cinema_user_id):
+    """Вычесть оценки пользователя из агрегатов перед удалением его отзывов."""
+    cur.execute(
+        """
+        UPDATE cinema.content_rating_stats s
+        SET rating_sum   = s.rating_sum - r.rating,
+            rating_count = s.rating_count - 1,
+            avg_rating   = COALESCE(ROUND(
+                               (s.rating_sum - r.rating)::numeric
+                               / NULLIF(s.rating_count - 1, 0), 2), 0),
+            updated_at   = now()
+        FROM cinema.content_reviews r
+        WHERE r.user_id = %s AND r.content_id = s.content_id
+        """,
+        [str(cinema_user_id)],
+    )
 
 @transaction.atomic
 def upsert_rating(dj_user, content_id, rating: int):
@@ -614,61 +786,32 @@ def upsert_rating(dj_user, content_id, rating: int):
     rating = max(1, min(5, int(rating)))
 
     with connection.cursor() as cur:
+        old_rating = _write_review(cur, cinema_user_id, content_id, rating)
+        avg = _apply_rating_delta(cur, content_id, old_rating, rating)
 
-        cur.execute(
-            """
-            INSERT INTO cinema.content_reviews (user_id, content_id, rating)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id, content_id) DO UPDATE
-            SET rating = EXCLUDED.rating, updated_at = now()
-            """,
-            [cinema_user_id, str(content_id), rating],
-        )
-
-        cur.execute(
-            "SELECT COALESCE(ROUND(AVG(rating)::numeric, 1), 0) "
-            "FROM cinema.content_reviews WHERE content_id=%s",
-            [str(content_id)],
-        )
-        avg = cur.fetchone()[0]
-
-    return float(avg or 0)
+    return round(float(avg or 0), 1)
 
 
 def _find_episode_id(content_id, sn: int | None, en: int | None):
-    if not sn or not en:
-        return None
-    season_id = _resolve_season_id(content_id, int(sn))
-    if not season_id:
-        return None
-    return _resolve_episode_id(season_id, int(en))
+    from . import episodes
+
+    ref = episodes.lookup(content_id, sn, en)
+    return ref.id if ref else None
 
 def save_progress(dj_user, content_id, position: int, duration: int | None,
                   sn: int = 0, en: int = 0, completed: bool = False):
     """
     Сохранить/обновить прогресс просмотра.
     Уникальность по (user_id, content_id, episode_id).
+    Запись идёт через буфер progress (write-behind), если PROGRESS_WRITE_BEHIND включён.
     """
-    cinema_user_id = _ensure_cinema_user(dj_user)
-    episode_id = _find_episode_id(content_id, sn, en)
-
-    position = max(0, int(position or 0))
-    duration = None if duration in (None, "", 0) else int(duration)
-    completed = bool(completed)
+    from django.conf import settings
+    from . import progress
 
-    with connection.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO cinema.watch_history
-                (user_id, content_id, episode_id, progress_sec, watched_at)
-            VALUES
-                (%s, %s, %s, %s, now())
-            ON CONFLICT (user_id, content_id, episode_id) DO UPDATE
-            SET progress_sec = EXCLUDED.progress_sec,
-                watched_at   = now()
-            """,
-            [cinema_user_id, str(content_id), episode_id, position],
-        )
+    cinema_user_id = _ensure_cinema_user(dj_user)
+    progress.record(cinema_user_id, content_id, position, duration, sn, en, completed)
+    if not getattr(settings, "PROGRESS_WRITE_BEHIND", True):
+        progress.flush()
 
 
 def get_progress(dj_user, content_id, sn: int = 0, en: int = 0):
@@ -676,7 +819,13 @@ def get_progress(dj_user, content_id, sn: int = 0, en: int = 0):
     Вернёт последний прогресс по фильму/эпизоду.
     Ответ: { position_sec, duration_sec, is_completed }
     """
+    from . import progress
+
     cinema_user_id = _ensure_cinema_user(dj_user)
+    hb = progress.pending(cinema_user_id, content_id, sn, en)
+    if hb is not None:
+        return {"position_sec": hb.position, "duration_sec": None, "is_completed": False}
+
     episode_id = _find_episode_id(content_id, sn, en)
 
     with connection.cursor() as cur:
@@ -725,28 +874,22 @@ def episode_source(content, season_number: int, episode_number: int) -> dict:
     """
     {"ok": True/False, "kind": "file|youtube|rutube|web", "url": "<...>"}
     """
-    season_id = _resolve_season_id(content.id, season_number)
-    if not season_id:
+    from . import episodes, media
+
+    index = episodes.series_index(content.id)
+    if not any(sn == int(season_number) for sn, _ in index):
         return {"ok": False, "detail": "season not found"}
 
-    episode_id = _resolve_episode_id(season_id, episode_number)
-    if not episode_id:
+    ref = index.get((int(season_number), int(episode_number)))
+    if not ref:
         return {"ok": False, "detail": "episode not found"}
 
-    with connection.cursor() as cur:
-        cur.execute(
-            "SELECT COALESCE(ma.kind,'') AS k, ma.url "
-            "FROM cinema.episodes e LEFT JOIN cinema.media_assets ma ON ma.id = e.video_id "
-            "WHERE e.id=%s LIMIT 1",
-            [str(episode_id)],
-        )
-        row = cur.fetchone()
-
-    if not row or not row[1]:
+    asset = media.resolve(ref.video_id)
+    if not asset or not asset["url"]:
         return {"ok": False, "detail": "video url is empty"}
 
-    kind = (row[0] or "").lower()
-    url = row[1]
+    kind = (asset["kind"] or "").lower()
+    url = asset["url"]
     if kind in ("", None, "file"):
         kind = "file"
     elif kind == "web":
@@ -778,8 +921,9 @@ def series_tree(content: Content):
     [{"number":1,"title":"Сезон 1","episodes":[{"number":1,"title":"Серия 1"}, ...]}, ...]
     """
     seasons = []
-    s_col = _pick_col("seasons", ["season_number", "number", "seq", "position", "ord", "order_num", "index"])
-    e_col = _pick_col("episodes", ["number", "episode_number", "seq", "position", "ord", "order_num", "index"])
+    registry = schema.get()
+    s_col = registry.season_number_col
+    e_col = registry.episode_number_col
 
     with connection.cursor() as cur:
         if s_col:
@@ -852,8 +996,8 @@ def rating_for(content_id):
     
     with connection.cursor() as cur:
         cur.execute("""
-            SELECT ROUND(AVG(rating)::numeric, 2)
-            FROM cinema.content_reviews
+            SELECT avg_rating
+            FROM cinema.content_rating_stats
             WHERE content_id = %s
         """, [str(content_id)])
         row = cur.fetchone()
@@ -861,21 +1005,13 @@ def rating_for(content_id):
     return float(row[0]) if row and row[0] is not None else 0.0
 
 def _table_exists(qualified: str) -> bool:
-    with connection.cursor() as cur:
-        cur.execute("SELECT to_regclass(%s)", [qualified])
-        return cur.fetchone()[0] is not None
+    schema_name, _, table = qualified.rpartition(".")
+    return (schema_name or schema.SCHEMA) == schema.SCHEMA and schema.get().has_table(table)
 
-def _first_existing_column(schema: str, table: str, candidates):
-    with connection.cursor() as cur:
-        cur.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_schema=%s AND table_name=%s
-        """, [schema, table])
-        cols = {r[0] for r in cur.fetchall()}
-    for c in candidates:
-        if c in cols:
-            return c
-    return None
+def _first_existing_column(schema_name: str, table: str, candidates):
+    if schema_name != schema.SCHEMA:
+        return None
+    return schema.get().pick(table, candidates)
 
 def list_user_purchases(dj_user):
     cid = _ensure_cinema_user(dj_user)
@@ -904,18 +1040,11 @@ def list_user_ratings(dj_user):
 def list_user_history(dj_user):
     """Построит историю по первой найденной таблице из набора вариантов."""
     cid = _ensure_cinema_user(dj_user)
-    options = ['watch_history', 'view_history', 'content_views', 'views', 'history']
-    table = None
-    for t in options:
-        if _table_exists(f'cinema.{t}'):
-            table = t
-            break
+    registry = schema.get()
+    table = registry.history_table
     if not table:
         return []
-    ts_col = _first_existing_column('cinema', table,
-            ['viewed_at', 'watched_at', 'created_at', 'updated_at', 'time_at', 'timestamp'])
-    if not ts_col:
-        ts_col = 'created_at'
+    ts_col = registry.history_time_col
 
     with connection.cursor() as cur:
         cur.execute(f"""
@@ -929,148 +1058,65 @@ def list_user_history(dj_user):
     return [{'content_id': r[0], 'viewed_at': r[1]} for r in rows]
 
 def list_user_favorites(dj_user):
+    from . import identity
+
+    cinema_user_id = identity.resolve(dj_user, create=False)
+    if cinema_user_id is None:
+        return []
     with connection.cursor() as cur:
         cur.execute("""
             SELECT f.content_id, f.created_at
             FROM cinema.favorites f
-            JOIN cinema.users u ON u.id = f.user_id
-            WHERE u.login = %s
+            WHERE f.user_id = %s
             ORDER BY f.created_at DESC
-        """, [dj_user.username])
+        """, [cinema_user_id])
         return [{'content_id': row[0], 'created_at': row[1]} for row in cur.fetchall()]
     
 def _get_media_url(media_id):
     """Получить URL медиафайла по ID"""
-    if not media_id:
-        return ""
-    
-    from django.db import connection
-    with connection.cursor() as cur:
-        cur.execute("SELECT url FROM cinema.media_assets WHERE id = %s", [str(media_id)])
-        row = cur.fetchone()
-        return row[0] if row else ""
+    from . import media
+    return media.url_for(media_id)
 
 def _load_media_for_content(content_list):
     """Загрузить медиа URL для списка контента"""
     if not content_list:
         return content_list
     
-    from django.db import connection
+    from . import media
     from .models import MediaAsset
 
+    fields = ('cover_image', 'cover_image_wide', 'trailer', 'video')
+
     media_ids = set()
     for content in content_list:
-        if hasattr(content, 'cover_image_id') and content.cover_image_id:
-            media_ids.add(content.cover_image_id)
-        if hasattr(content, 'cover_image_wide_id') and content.cover_image_wide_id:
-            media_ids.add(content.cover_image_wide_id)
-        if hasattr(content, 'trailer_id') and content.trailer_id:
-            media_ids.add(content.trailer_id)
-        if hasattr(content, 'video_id') and content.video_id:
-            media_ids.add(content.video_id)
+        for name in fields:
+            media_id = getattr(content, f'{name}_id', None)
+            if media_id:
+                media_ids.add(media_id)
     
     if not media_ids:
         return content_list
-    
 
-    media_urls = {}
-    id_strs = [str(id) for id in media_ids]
-    with connection.cursor() as cur:
-        cur.execute("""
-            SELECT id, url FROM cinema.media_assets 
-            WHERE id = ANY(%s)
-        """, [id_strs])
-        media_urls = {row[0]: row[1] for row in cur.fetchall()}
+    assets = media.resolve_many(media_ids)
 
     for content in content_list:
-        if hasattr(content, 'cover_image_id') and content.cover_image_id:
-            url = media_urls.get(content.cover_image_id)
-            if url:
-                if not content.cover_image:
-                    content.cover_image = MediaAsset(id=content.cover_image_id)
-                content.cover_image.url = url
-        
-        if hasattr(content, 'cover_image_wide_id') and content.cover_image_wide_id:
-            url = media_urls.get(content.cover_image_wide_id)
-            if url:
-                if not content.cover_image_wide:
-                    content.cover_image_wide = MediaAsset(id=content.cover_image_wide_id)
-                content.cover_image_wide.url = url
-        
-        if hasattr(content, 'trailer_id') and content.trailer_id:
-            url = media_urls.get(content.trailer_id)
-            if url:
-                if not content.trailer:
-                    content.trailer = MediaAsset(id=content.trailer_id)
-                content.trailer.url = url
-        
-        if hasattr(content, 'video_id') and content.video_id:
-            url = media_urls.get(content.video_id)
-            if url:
-                if not content.video:
-                    content.video = MediaAsset(id=content.video_id)
-                content.video.url = url
+        for name in fields:
+            media_id = getattr(content, f'{name}_id', None)
+            if not media_id:
+                continue
+            asset = assets.get(str(media_id))
+            if not asset or not asset['url']:
+                continue
+            setattr(content, name, MediaAsset(
+                id=media_id, url=asset['url'], kind=asset['kind'], mime_type=asset['mime_type']
+            ))
     
     return content_list
 
 def get_rutube_video_url(rutube_url):
-    """Попытаться получить прямую ссылку на видео Rutube"""
-    try:
-
-        video_id = None
-        patterns = [
-            r'rutube\.ru/video/([a-f0-9]{32})',
-            r'rutube\.ru/play/embed/([a-f0-9]{32})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, rutube_url, re.IGNORECASE)
-            if match:
-                video_id = match.group(1)
-                break
-        
-        if not video_id:
-            return None
-
-        api_url = f"https://rutube.ru/api/play/options/{video_id}/"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://rutube.ru/',
-            'Accept': 'application/json',
-        }
-        
-        response = requests.get(api_url, headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
- 
-            if 'video_balancer' in data:
-                if 'mp4' in data['video_balancer']:
-                    return data['video_balancer']['mp4']['url']
-            
-            if 'video' in data:
-                if 'url' in data['video']:
-                    return data['video']['url']
-
-            html_url = f"https://rutube.ru/video/{video_id}/"
-            html_response = requests.get(html_url, headers=headers)
-            html = html_response.text
-
-            json_pattern = r'window\.__DATA__\s*=\s*({.*?});'
-            match = re.search(json_pattern, html, re.DOTALL)
-            
-            if match:
-                import json
-                data_json = match.group(1)
-                data = json.loads(data_json)
-
-                if 'video' in data and 'url' in data['video']:
-                    return data['video']['url']
-        
-    except Exception as e:
-        print(f"Error getting Rutube URL: {e}")
-    
-    return None
+    """Попытаться получить прямую ссылку на видео Rutube (кэш + фоновое разрешение)"""
+    from . import rutube
+    return rutube.resolve(rutube_url)
 
 def _user_has_current_subscription(cinema_user_id) -> bool:
     """Проверяет, есть ли ТЕКУЩАЯ активная подписка (для доступа к контенту)"""
@@ -1086,6 +1132,7 @@ def _user_has_any_active_subscription(cinema_user_id) -> bool:
             SELECT 1
             FROM cinema.user_subscriptions
             WHERE user_id=%s
+              AND effective_status IN ('pending', 'active')
               AND status='active'
               AND (
                   -- Текущая активная подписка
@@ -0,0 +1,81 @@
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+@dataclass(frozen=True)
+class SubscriptionSummary:
+    """Счётчики подписок пользователя и суммы трат (страница подписок и API)."""
+    total_count: int = 0
+    active_count: int = 0        # действует сейчас: started_at <= now < expires_at (или бессрочная)
+    future_count: int = 0        # оплачена, ещё не началась
+    cancelled_count: int = 0
+    expired_count: int = 0       # status='expired' + 'active' с истёкшим expires_at
+    unexpired_count: int = 0     # status='active' и expires_at >= now (текущие + будущие)
+    total_spent_on_subscriptions: Decimal = Decimal(0)
+    total_spent_on_content: Decimal = Decimal(0)
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["total_spent_on_subscriptions"] = float(self.total_spent_on_subscriptions)
+        data["total_spent_on_content"] = float(self.total_spent_on_content)
+        return data
+
+
+def summary(cinema_user_id, now=None) -> SubscriptionSummary:
+    """Все счётчики и суммы одним запросом с условной агрегацией."""
+    if cinema_user_id is None:
+        return SubscriptionSummary()
+
+    now = now or timezone.now()
+    user_id = str(cinema_user_id)
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT
+                COUNT(*),
+                COUNT(*) FILTER (WHERE us.status = 'active' AND us.started_at <= %s
+                                   AND (us.expires_at IS NULL OR us.expires_at > %s)),
+                COUNT(*) FILTER (WHERE us.status = 'active' AND us.started_at > %s),
+                COUNT(*) FILTER (WHERE us.status = 'cancelled'),
+                COUNT(*) FILTER (WHERE us.status = 'expired'
+                                    OR (us.status = 'active' AND us.expires_at < %s
+                                        AND us.started_at <= %s)),
+                COUNT(*) FILTER (WHERE us.status = 'active' AND us.expires_at >= %s),
+                COALESCE(SUM(sp.price), 0),
+                (SELECT COALESCE(SUM(c.price), 0)
+                 FROM cinema.purchases p
+                 JOIN cinema.content c ON c.id = p.content_id
+                 WHERE p.user_id = %s)
+            FROM cinema.user_subscriptions us
+            JOIN cinema.subscription_plans sp ON sp.id = us.plan_id
+            WHERE us.user_id = %s
+        """, [now, now, now, now, now, now, user_id, user_id])
+        return SubscriptionSummary(*cur.fetchone())
+
+
+def sweep(now=None) -> tuple[int, int]:
+    """
+    Перевести effective_status по времени: pending -> active (подписка началась)
+    и pending/active -> expired (срок вышел). Остальные переходы делает триггер при записи.
+    Возвращает (активировано, истекло).
+    """
+    now = now or timezone.now()
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("""
+            UPDATE cinema.user_subscriptions
+            SET effective_status = 'expired'
+            WHERE effective_status IN ('pending', 'active')
+              AND expires_at <= %s
+        """, [now])
+        expired = cur.rowcount
+
+        cur.execute("""
+            UPDATE cinema.user_subscriptions
+            SET effective_status = 'active'
+            WHERE effective_status = 'pending'
+              AND started_at <= %s
+        """, [now])
+        activated = cur.rowcount
+    return activated, expired
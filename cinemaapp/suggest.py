@@ -0,0 +1,177 @@
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection
+
+from cinemaapp import media
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+_lock = threading.Lock()
+_index = None
+_rebuilding = False
+_last_version_check = 0.0
+
+
+@dataclass
+class SuggestIndex:
+    """
+    Префиксный индекс по нормализованным названиям.
+    keys отсортирован; refs[i] = (номер элемента в items, 0 — начало названия / 1 — начало слова).
+    ranks[i] — место ключа в выдаче: tier * len(items) + место элемента в order
+    (order — элементы от новых к старым, затем по названию).
+    """
+    version: str
+    built_at: float
+    keys: list = field(default_factory=list)
+    refs: list = field(default_factory=list)
+    items: list = field(default_factory=list)
+    ranks: list = field(default_factory=list)
+    order: list = field(default_factory=list)
+
+
+def normalize(text: str) -> str:
+    """'Ёлки-2: Новый год' -> 'елки 2 новый год'"""
+    text = (text or "").casefold().replace("ё", "е")
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def build_index() -> SuggestIndex:
+    from cinemaapp.home import catalog_version
+
+    version = catalog_version()
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT id, title, type, release_year, cover_image_id
+            FROM cinema.content
+        """)
+        rows = cur.fetchall()
+
+    assets = media.resolve_many([row[4] for row in rows])
+
+    entries = []
+    items = []
+    for content_id, title, content_type, release_year, cover_image_id in rows:
+        asset = assets.get(str(cover_image_id)) if cover_image_id else None
+        n = len(items)
+        items.append({
+            "id": str(content_id),
+            "title": title,
+            "type": content_type,
+            "release_year": release_year,
+            "poster_url": asset["url"] if asset else "",
+        })
+
+        norm = normalize(title)
+        if not norm:
+            continue
+        entries.append((norm, n, 0))
+        for pos, ch in enumerate(norm):
+            if ch == " ":
+                entries.append((norm[pos + 1:], n, 1))
+
+    entries.sort(key=lambda e: e[0])
+    order = sorted(range(len(items)),
+                   key=lambda n: (-(items[n]["release_year"] or 0), items[n]["title"]))
+    place = {n: i for i, n in enumerate(order)}
+    return SuggestIndex(
+        version=version,
+        built_at=time.time(),
+        keys=[e[0] for e in entries],
+        refs=[(e[1], e[2]) for e in entries],
+        items=items,
+        ranks=[e[2] * len(items) + place[e[1]] for e in entries],
+        order=order,
+    )
+
+
+def rebuild():
+    global _index, _last_version_check
+    index = build_index()
+    with _lock:
+        _index = index
+        _last_version_check = time.monotonic()
+    logger.info("Suggest index built: %d titles", len(index.items))
+    return index
+
+
+def _refresh_in_background(check_version: bool):
+    global _rebuilding, _last_version_check
+    try:
+        if check_version and _index is not None:
+            from cinemaapp.home import catalog_version
+            _last_version_check = time.monotonic()
+            if catalog_version() == _index.version:
+                return
+        rebuild()
+    except Exception:
+        logger.exception("Suggest index rebuild failed")
+    finally:
+        connection.close()
+        with _lock:
+            _rebuilding = False
+
+
+def refresh(check_version: bool = False):
+    """Перестроить индекс в фоне (вызывается после правок контента в админке)."""
+    global _rebuilding
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(
+        target=_refresh_in_background, args=(check_version,),
+        name="suggest-index", daemon=True,
+    ).start()
+
+
+def _get_index() -> SuggestIndex:
+    index = _index
+    if index is None:
+        return rebuild()
+
+    check_interval = getattr(settings, "SUGGEST_INDEX_CHECK_INTERVAL", 30)
+    if time.monotonic() - _last_version_check >= check_interval:
+        refresh(check_version=True)
+    return index
+
+
+def suggest(query: str, limit: int = 10) -> list:
+    """
+    Подсказки по префиксу названия или любого его слова без обращения к БД.
+    Сначала совпадения с начала названия, затем более новые.
+    """
+    q = normalize(query)
+    if not q:
+        return []
+
+    index = _get_index()
+    total = len(index.items)
+    if not total:
+        return []
+
+    # все ключи с префиксом q — непрерывный диапазон; ранжируем его целиком, потом режем
+    lo = bisect.bisect_left(index.keys, q)
+    hi = bisect.bisect_left(index.keys, q + "\uffff", lo)
+    # у элемента не больше двух разных рангов (название / слово), поэтому 2 * limit хватает
+    best = heapq.nsmallest(2 * limit, set(index.ranks[lo:hi]))
+
+    result = []
+    seen = set()
+    for rank in best:
+        n = index.order[rank % total]
+        if n in seen:
+            continue
+        seen.add(n)
+        result.append(index.items[n])
+        if len(result) == limit:
+            break
+    return result
@@ -0,0 +1,59 @@
+import uuid
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+
+class CinemaDBTestCase(TransactionTestCase):
+    """
+    Тесты поверх схемы cinema (таблицы managed=False, их создаёт не Django; в тестовой БД
+    базовую схему накатывает CinemaTestRunner). Без нужной таблицы тест пропускается.
+    TransactionTestCase — потому что код под тестом сам открывает транзакции и берёт
+    блокировки; созданные строки cinema.* тест убирает за собой сам (flush их не чистит).
+    """
+    required_tables = ()
+    # с available_apps flush между тестами идёт с CASCADE: таблицы catalog_* из 0001
+    # (модели с тех пор managed=False) ссылаются на auth_user
+    available_apps = [
+        "django.contrib.auth", "django.contrib.contenttypes", "django.contrib.sessions",
+        "accounts", "catalog", "cinemaapp",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        with connection.cursor() as cur:
+            for table in self.required_tables:
+                cur.execute("SELECT to_regclass(%s)", [f"cinema.{table}"])
+                if cur.fetchone()[0] is None:
+                    self.skipTest(f"cinema.{table} is missing in the test database")
+        self._cleanup = []
+
+    def tearDown(self):
+        with connection.cursor() as cur:
+            for sql, params in reversed(self._cleanup):
+                cur.execute(sql, params)
+        super().tearDown()
+
+    def sql(self, sql, params=None):
+        with connection.cursor() as cur:
+            cur.execute(sql, params or [])
+            return cur.fetchall() if cur.description else cur.rowcount
+
+    def make_user(self):
+        login = f"test-{uuid.uuid4().hex[:12]}"
+        user_id = self.sql("""
+            INSERT INTO cinema.users (email, login, password_hash)
+            VALUES (%s, %s, '$argon2') RETURNING id
+        """, [f"{login}@local.test", login])[0][0]
+        self._cleanup.append(("DELETE FROM cinema.users WHERE id = %s", [str(user_id)]))
+        return user_id
+
+    def make_content(self, price="199.00"):
+        content_id = uuid.uuid4()
+        self.sql("""
+            INSERT INTO cinema.content
+                (id, type, title, release_year, description, is_free, price, created_at, updated_at)
+            VALUES (%s, 'movie', %s, 2024, '', false, %s, now(), now())
+        """, [str(content_id), f"Test {content_id.hex}", price])
+        self._cleanup.append(("DELETE FROM cinema.content WHERE id = %s", [str(content_id)]))
+        return content_id
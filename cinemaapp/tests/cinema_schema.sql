@@ -0,0 +1,161 @@
+-- Базовые таблицы схемы cinema для тестовой БД — состояние до RunSQL-миграций catalog
+-- (0005 и далее достраивают их сами). Колонки — по моделям (managed=False) и запросам приложения.
+-- Накатывается CinemaTestRunner перед миграциями, только если схемы cinema ещё нет.
+
+CREATE SCHEMA cinema;
+
+CREATE TABLE cinema.media_assets (
+    id          uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    kind        text NOT NULL,
+    mime_type   text NOT NULL,
+    url         text NOT NULL UNIQUE
+);
+
+CREATE TABLE cinema.content (
+    id                   uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    type                 text NOT NULL CHECK (type IN ('movie', 'series')),
+    title                text NOT NULL UNIQUE,
+    release_year         integer NOT NULL,
+    description          text NOT NULL DEFAULT '',
+    is_free              boolean NOT NULL DEFAULT false,
+    price                numeric(10, 2) NOT NULL DEFAULT 0,
+    cover_image_id       uuid REFERENCES cinema.media_assets(id) ON DELETE SET NULL,
+    cover_image_wide_id  uuid REFERENCES cinema.media_assets(id) ON DELETE SET NULL,
+    trailer_id           uuid REFERENCES cinema.media_assets(id) ON DELETE SET NULL,
+    video_id             uuid REFERENCES cinema.media_assets(id) ON DELETE SET NULL,
+    created_at           timestamptz NOT NULL DEFAULT now(),
+    updated_at           timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE cinema.genres (
+    id    uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    name  text NOT NULL UNIQUE
+);
+
+CREATE TABLE cinema.content_genres (
+    content_id  uuid NOT NULL REFERENCES cinema.content(id) ON DELETE CASCADE,
+    genre_id    uuid NOT NULL REFERENCES cinema.genres(id) ON DELETE CASCADE,
+    PRIMARY KEY (content_id, genre_id)
+);
+
+CREATE TABLE cinema.seasons (
+    id          uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    content_id  uuid NOT NULL REFERENCES cinema.content(id) ON DELETE CASCADE,
+    season_num  integer NOT NULL,
+    title       text,
+    UNIQUE (content_id, season_num)
+);
+
+CREATE TABLE cinema.episodes (
+    id            uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    season_id     uuid NOT NULL REFERENCES cinema.seasons(id) ON DELETE CASCADE,
+    episode_num   integer NOT NULL,
+    title         text NOT NULL DEFAULT '',
+    description   text,
+    duration_sec  integer,
+    video_id      uuid REFERENCES cinema.media_assets(id) ON DELETE SET NULL,
+    UNIQUE (season_id, episode_num)
+);
+
+CREATE TABLE cinema.users (
+    id             uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    email          text NOT NULL UNIQUE,
+    login          text NOT NULL UNIQUE,
+    password_hash  text NOT NULL,
+    is_active      boolean NOT NULL DEFAULT true,
+    created_at     timestamptz NOT NULL DEFAULT now(),
+    updated_at     timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE cinema.employees (
+    id             uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    email          text NOT NULL UNIQUE,
+    full_name      text NOT NULL,
+    password_hash  text NOT NULL,
+    is_active      boolean NOT NULL DEFAULT true,
+    is_staff       boolean NOT NULL DEFAULT true,
+    is_superuser   boolean NOT NULL DEFAULT false,
+    last_login     timestamptz,
+    created_at     timestamptz NOT NULL DEFAULT now(),
+    updated_at     timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE cinema.favorites (
+    user_id     uuid NOT NULL REFERENCES cinema.users(id) ON DELETE CASCADE,
+    content_id  uuid NOT NULL REFERENCES cinema.content(id) ON DELETE CASCADE,
+    created_at  timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, content_id)
+);
+
+CREATE TABLE cinema.watchlist (
+    user_id     uuid NOT NULL REFERENCES cinema.users(id) ON DELETE CASCADE,
+    content_id  uuid NOT NULL REFERENCES cinema.content(id) ON DELETE CASCADE,
+    created_at  timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, content_id)
+);
+
+CREATE TABLE cinema.watch_history (
+    id            uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id       uuid NOT NULL REFERENCES cinema.users(id) ON DELETE CASCADE,
+    content_id    uuid NOT NULL REFERENCES cinema.content(id) ON DELETE CASCADE,
+    episode_id    uuid REFERENCES cinema.episodes(id) ON DELETE CASCADE,
+    watched_at    timestamptz NOT NULL DEFAULT now(),
+    progress_sec  integer NOT NULL DEFAULT 0,
+    UNIQUE (user_id, content_id, episode_id)
+);
+
+CREATE TABLE cinema.content_reviews (
+    id          uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id     uuid NOT NULL REFERENCES cinema.users(id) ON DELETE CASCADE,
+    content_id  uuid NOT NULL REFERENCES cinema.content(id) ON DELETE CASCADE,
+    rating      integer NOT NULL CHECK (rating BETWEEN 1 AND 10),
+    comment     text,
+    created_at  timestamptz NOT NULL DEFAULT now(),
+    updated_at  timestamptz NOT NULL DEFAULT now(),
+    UNIQUE (user_id, content_id)
+);
+
+CREATE VIEW cinema.v_content_with_rating AS
+SELECT c.id, c.title, c.type, c.release_year, AVG(r.rating)::float AS avg_rating
+FROM cinema.content c
+LEFT JOIN cinema.content_reviews r ON r.content_id = c.id
+GROUP BY c.id;
+
+CREATE TABLE cinema.subscription_plans (
+    id             uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    code           text NOT NULL UNIQUE,
+    name           text NOT NULL,
+    period_months  integer NOT NULL,
+    price          numeric(12, 2) NOT NULL,
+    is_active      boolean NOT NULL DEFAULT true,
+    created_at     timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE cinema.user_subscriptions (
+    id          uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id     uuid NOT NULL REFERENCES cinema.users(id) ON DELETE CASCADE,
+    plan_id     uuid NOT NULL REFERENCES cinema.subscription_plans(id) ON DELETE RESTRICT,
+    status      text NOT NULL,
+    started_at  timestamptz NOT NULL DEFAULT now(),
+    expires_at  timestamptz,
+    UNIQUE (user_id, plan_id, started_at)
+);
+
+CREATE TABLE cinema.purchases (
+    id            uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id       uuid NOT NULL REFERENCES cinema.users(id) ON DELETE CASCADE,
+    content_id    uuid NOT NULL REFERENCES cinema.content(id) ON DELETE RESTRICT,
+    purchased_at  timestamptz NOT NULL DEFAULT now(),
+    UNIQUE (user_id, content_id)
+);
+
+CREATE TABLE cinema.payments (
+    id               uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    txn_uuid         text NOT NULL UNIQUE,
+    amount           numeric(12, 2) NOT NULL,
+    status           text NOT NULL,
+    paid_at          timestamptz,
+    purchase_id      uuid REFERENCES cinema.purchases(id) ON DELETE CASCADE,
+    subscription_id  uuid REFERENCES cinema.user_subscriptions(id) ON DELETE CASCADE,
+    created_at       timestamptz NOT NULL DEFAULT now()
+);
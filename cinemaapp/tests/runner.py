@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from django.db import connections
+from django.db.models.signals import pre_migrate
+from django.test.runner import DiscoverRunner
+
+SCHEMA_SQL = Path(__file__).with_name("cinema_schema.sql")
+
+
+def _seed_cinema_schema(sender, using, **kwargs):
+    """Схемы cinema в свежей тестовой БД нет — накатить базовые таблицы до миграций catalog."""
+    with connections[using].cursor() as cur:
+        cur.execute("SELECT to_regnamespace('cinema')")
+        if cur.fetchone()[0] is None:
+            cur.execute(SCHEMA_SQL.read_text(encoding="utf-8"))
+
+
+class CinemaTestRunner(DiscoverRunner):
+    """
+    manage.py test создаёт тестовую БД с нуля, а схему cinema создаёт не Django:
+    модели над ней managed=False, а миграции catalog достраивают уже существующие таблицы.
+    Перед миграциями runner накатывает cinema_schema.sql (с --keepdb — только в первый раз).
+    """
+
+    def setup_databases(self, **kwargs):
+        pre_migrate.connect(_seed_cinema_schema, dispatch_uid="cinema-test-schema")
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid="cinema-test-schema")
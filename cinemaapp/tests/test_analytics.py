@@ -0,0 +1,61 @@
+import datetime
+import uuid
+
+from cinemaapp import analytics
+from cinemaapp.tests.base import CinemaDBTestCase
+
+
+class CohortRollupTests(CinemaDBTestCase):
+    required_tables = ("users", "content", "purchases", "payments", "analytics_daily_conversion")
+
+    def setUp(self):
+        super().setUp()
+        self.today = self.sql("SELECT CURRENT_DATE")[0][0]
+        self.registered = self.today - datetime.timedelta(days=10)
+        self.user_id = self.make_user()
+        self.content_id = self.make_content()
+        self.sql("UPDATE cinema.users SET created_at = %s::date + time '12:00' WHERE id = %s",
+                 [self.registered, str(self.user_id)])
+        self._cleanup.append(("DELETE FROM cinema.purchases WHERE user_id = %s", [str(self.user_id)]))
+        for table in ("analytics_daily_conversion", "analytics_daily_user_revenue"):
+            self._cleanup.append((f"DELETE FROM cinema.{table} WHERE day >= %s", [self.registered]))
+
+    def _conversion(self, day):
+        return self.sql("""
+            SELECT registered, bought_content, subscribed, converted
+            FROM cinema.analytics_daily_conversion WHERE day = %s
+        """, [day])
+
+    def _buy(self, amount="199.00"):
+        purchase_id = self.sql("""
+            INSERT INTO cinema.purchases (user_id, content_id) VALUES (%s, %s) RETURNING id
+        """, [str(self.user_id), str(self.content_id)])[0][0]
+        self.sql("""
+            INSERT INTO cinema.payments (txn_uuid, amount, status, paid_at, purchase_id)
+            VALUES (%s, %s, 'paid', now(), %s)
+        """, [f"TXN{uuid.uuid4().hex}", amount, str(purchase_id)])
+
+    def test_registration_day_is_counted(self):
+        analytics.rebuild(self.registered, self.registered)
+
+        self.assertEqual(self._conversion(self.registered), [(1, 0, 0, 0)])
+
+    def test_purchase_today_recomputes_registration_cohort(self):
+        analytics.rebuild(self.registered, self.registered)
+        self._buy()
+
+        # инкрементальный пересчёт только за сегодня задевает и когорту дня регистрации
+        analytics.rebuild(self.today, self.today)
+
+        self.assertEqual(self._conversion(self.registered), [(1, 1, 0, 1)])
+        revenue = self.sql("""
+            SELECT day, kind, amount FROM cinema.analytics_daily_user_revenue WHERE user_id = %s
+        """, [str(self.user_id)])
+        self.assertEqual([(day, kind, str(amount)) for day, kind, amount in revenue],
+                         [(self.today, "purchase", "199.00")])
+
+    def test_optional_rollups_are_skipped_without_columns(self):
+        written = analytics.rebuild(self.today, self.today)
+
+        self.assertNotIn("analytics_daily_geography", written)
+        self.assertNotIn("analytics_daily_payment_methods", written)
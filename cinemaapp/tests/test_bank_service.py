@@ -0,0 +1,135 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from catalog.utils import bank_service
+from catalog.utils.bank_service import CircuitBreaker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        patcher = mock.patch.object(bank_service, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def _open(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()  # успех сбрасывает счётчик
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+        self.assertFalse(self.breaker.is_available())
+
+    def test_half_open_lets_through_a_single_trial(self):
+        self._open()
+        self.clock.now += 30
+
+        self.assertEqual(self.breaker.state, "half-open")
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_trial_closes(self):
+        self._open()
+        self.clock.now += 30
+        self.breaker.allow()
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens_for_another_reset_timeout(self):
+        self._open()
+        self.clock.now += 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 1
+        self.assertTrue(self.breaker.allow())
+
+
+class CallBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        self.session = mock.Mock()
+        for patcher in (
+            mock.patch.object(bank_service, "time", self.clock),
+            mock.patch.object(bank_service, "breaker", self.breaker),
+            mock.patch.object(bank_service, "_get_session", return_value=self.session),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _half_open(self):
+        self.breaker.record_failure()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, "half-open")
+
+    def test_unexpected_error_in_trial_does_not_wedge_breaker(self):
+        self._half_open()
+        self.session.request.side_effect = ValueError("broken response")
+
+        with self.assertRaises(ValueError):
+            bank_service._call("check", "POST", "/api/check", timeout=1)
+
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+
+    def test_server_errors_are_retried_then_counted_once(self):
+        self.session.request.return_value = mock.Mock(status_code=503)
+
+        response = bank_service._call("check", "POST", "/api/check", timeout=1, retries=2)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_open_breaker_short_circuits_without_http(self):
+        self.breaker.record_failure()
+
+        with self.assertRaises(bank_service._BankUnavailable):
+            bank_service._call("pay", "POST", "/api/pay", timeout=1)
+        self.session.request.assert_not_called()
+
+    def test_bank_service_reports_unavailable_when_open(self):
+        self.breaker.record_failure()
+
+        self.assertFalse(bank_service.BankService.health_check())
+        result = bank_service.BankService.process_payment({"amount": 1.0})
+        self.assertEqual(result, {"success": False, "error": "Банковский сервис недоступен"})
+
+    def test_connection_errors_open_the_breaker(self):
+        self.session.request.side_effect = requests.exceptions.ConnectTimeout()
+
+        result = bank_service.BankService.check_card({"card_number": "4242424242424242"})
+
+        self.assertFalse(result["success"])
+        self.assertEqual(self.breaker.state, "open")
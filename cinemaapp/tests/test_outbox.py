@@ -0,0 +1,175 @@
+import smtplib
+import threading
+import uuid
+
+from django.core import mail
+from django.db import connection, transaction
+from django.test import override_settings
+
+from cinemaapp import outbox
+from cinemaapp.tests.base import CinemaDBTestCase
+
+
+class _FailingConnection:
+    """SMTP-сервер на связи, но каждое письмо отвергает."""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPException("550 mailbox unavailable")
+
+
+class _DownConnection(_FailingConnection):
+    """SMTP-сервер недоступен: не удаётся даже подключиться."""
+
+    def open(self):
+        raise ConnectionRefusedError("Connection refused")
+
+
+@override_settings(
+    EMAIL_OUTBOX_INLINE_SENDER=False,
+    EMAIL_OUTBOX_LEASE=300,
+    EMAIL_OUTBOX_RETRY_BASE=30,
+    EMAIL_OUTBOX_RETRY_MAX=3600,
+    EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+)
+class OutboxTests(CinemaDBTestCase):
+    required_tables = ("email_outbox",)
+
+    def setUp(self):
+        super().setUp()
+        self.subject = f"test-{uuid.uuid4().hex[:12]}"
+        self._cleanup.append(("DELETE FROM cinema.email_outbox WHERE subject = %s", [self.subject]))
+
+    def _enqueue(self, html=None):
+        return outbox.enqueue(self.subject, "Текст письма", "viewer@local.test", html=html)
+
+    def _row(self, outbox_id):
+        return self.sql("""
+            SELECT status, attempts, last_error,
+                   EXTRACT(EPOCH FROM next_attempt_at - now())::float
+            FROM cinema.email_outbox WHERE id = %s
+        """, [outbox_id])[0]
+
+    def _make_due(self, outbox_id):
+        self.sql("UPDATE cinema.email_outbox SET next_attempt_at = now() WHERE id = %s", [outbox_id])
+
+    def test_drain_sends_and_marks_sent(self):
+        outbox_id = self._enqueue(html="<p>Текст письма</p>")
+
+        sent, failed = outbox.drain(mail.get_connection("django.core.mail.backends.locmem.EmailBackend"))
+
+        self.assertEqual((sent, failed), (1, 0))
+        status, attempts, last_error, _ = self._row(outbox_id)
+        self.assertEqual((status, attempts, last_error), ("sent", 1, None))
+        message = next(m for m in mail.outbox if m.subject == self.subject)
+        self.assertEqual(message.to, ["viewer@local.test"])
+        self.assertEqual(message.alternatives, [("<p>Текст письма</p>", "text/html")])
+        # в отправленном письме тело не хранится
+        self.assertEqual(self.sql("""
+            SELECT body, html FROM cinema.email_outbox WHERE id = %s
+        """, [outbox_id]), [("", None)])
+
+    def test_claim_leases_rows(self):
+        outbox_id = self._enqueue()
+
+        with transaction.atomic(), connection.cursor() as cur:
+            first = [row[0] for row in outbox._claim(cur, 10)]
+        with transaction.atomic(), connection.cursor() as cur:
+            second = [row[0] for row in outbox._claim(cur, 10)]
+
+        self.assertIn(outbox_id, first)
+        self.assertNotIn(outbox_id, second)
+        status, attempts, _, delay = self._row(outbox_id)
+        self.assertEqual((status, attempts), ("pending", 1))
+        self.assertGreater(delay, 290)
+
+    def test_claim_skips_rows_locked_by_another_sender(self):
+        locked_id = self._enqueue()
+        free_id = self._enqueue()
+        claimed = []
+
+        def other_sender():
+            try:
+                with transaction.atomic(), connection.cursor() as cur:
+                    claimed.extend(row[0] for row in outbox._claim(cur, 10))
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            self.sql("SELECT id FROM cinema.email_outbox WHERE id = %s FOR UPDATE", [locked_id])
+            sender = threading.Thread(target=other_sender)
+            sender.start()
+            sender.join(10)
+            self.assertFalse(sender.is_alive(), "claim blocked on a locked row")
+
+        self.assertIn(free_id, claimed)
+        self.assertNotIn(locked_id, claimed)
+        self.assertEqual(self._row(locked_id)[1], 0)
+
+    def test_failed_send_is_retried_with_backoff(self):
+        outbox_id = self._enqueue()
+
+        self.assertEqual(outbox.drain(_FailingConnection()), (0, 1))
+        status, attempts, last_error, delay = self._row(outbox_id)
+        self.assertEqual((status, attempts), ("pending", 1))
+        self.assertIn("550", last_error)
+        self.assertAlmostEqual(delay, 30, delta=5)
+
+        # до истечения паузы письмо не забирается повторно
+        self.assertEqual(outbox.drain(_FailingConnection()), (0, 0))
+
+        self._make_due(outbox_id)
+        self.assertEqual(outbox.drain(_FailingConnection()), (0, 1))
+        _, attempts, _, delay = self._row(outbox_id)
+        self.assertEqual(attempts, 2)
+        self.assertAlmostEqual(delay, 60, delta=5)
+
+    def test_exhausted_attempts_move_to_dead_letters(self):
+        outbox_id = self._enqueue()
+        self.sql("UPDATE cinema.email_outbox SET attempts = 2 WHERE id = %s", [outbox_id])
+
+        self.assertEqual(outbox.drain(_FailingConnection()), (0, 1))
+
+        status, attempts, last_error, _ = self._row(outbox_id)
+        self.assertEqual((status, attempts), ("dead", 3))
+        self.assertIn("550", last_error)
+        self._make_due(outbox_id)
+        self.assertEqual(outbox.drain(_FailingConnection()), (0, 0))
+
+    def test_connection_failure_reschedules_whole_batch(self):
+        ids = [self._enqueue(), self._enqueue()]
+
+        self.assertEqual(outbox.drain(_DownConnection()), (0, 2))
+
+        for outbox_id in ids:
+            status, attempts, last_error, delay = self._row(outbox_id)
+            self.assertEqual((status, attempts), ("pending", 1))
+            self.assertIn("Connection refused", last_error)
+            self.assertAlmostEqual(delay, 30, delta=5)
+
+    def test_purge_deletes_only_old_finished_rows(self):
+        old_sent, old_dead, recent_sent, old_pending = [self._enqueue() for _ in range(4)]
+        self.sql("""
+            UPDATE cinema.email_outbox SET status = 'sent', sent_at = now() - interval '8 days'
+            WHERE id = %s
+        """, [old_sent])
+        self.sql("""
+            UPDATE cinema.email_outbox SET status = 'dead', created_at = now() - interval '8 days'
+            WHERE id = %s
+        """, [old_dead])
+        self.sql("UPDATE cinema.email_outbox SET status = 'sent', sent_at = now() WHERE id = %s", [recent_sent])
+        self.sql("""
+            UPDATE cinema.email_outbox SET created_at = now() - interval '8 days' WHERE id = %s
+        """, [old_pending])
+
+        self.assertEqual(outbox.purge(retention=7 * 24 * 3600), 2)
+
+        left = {row[0] for row in self.sql("""
+            SELECT id FROM cinema.email_outbox WHERE subject = %s
+        """, [self.subject])}
+        self.assertEqual(left, {recent_sent, old_pending})
@@ -0,0 +1,141 @@
+from decimal import Decimal
+from unittest import mock
+
+from cinemaapp import payments
+from cinemaapp.tests.base import CinemaDBTestCase
+
+CARD = {"card_number": "4242424242424242", "expiry_month": 12, "expiry_year": 30, "cvc": "123"}
+
+
+class _InlineExecutor:
+    """Воркер в том же потоке: _run выполняется прямо в submit()."""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class _DeadExecutor:
+    """Процесс «упал» до запуска воркера."""
+
+    def submit(self, fn, *args):
+        pass
+
+
+class PaymentFlowTests(CinemaDBTestCase):
+    required_tables = ("users", "content", "payments", "purchases")
+
+    def setUp(self):
+        super().setUp()
+        self.user_id = self.make_user()
+        self.content_id = self.make_content()
+        self._cleanup.append(("DELETE FROM cinema.purchases WHERE user_id = %s", [str(self.user_id)]))
+        self._cleanup.append(("DELETE FROM cinema.payments WHERE user_id = %s", [str(self.user_id)]))
+
+        self.bank = mock.patch("catalog.utils.bank_service.BankService").start()
+        self.bank.check_card.return_value = {"success": True}
+        self.bank.process_payment.return_value = {
+            "success": True, "transaction_id": "TXN0000TEST", "auth_code": "654321",
+        }
+        mock.patch.object(payments, "_send_receipt").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _submit(self, executor, key="key-1"):
+        job = payments.PaymentJob(self.user_id, Decimal("199.00"), CARD, content_id=self.content_id)
+        with mock.patch.object(payments, "_get_executor", return_value=executor):
+            return payments.submit(job, key)
+
+    def _row(self, payment_id):
+        return self.sql("""
+            SELECT status, auth_code, txn_uuid, purchase_id FROM cinema.payments WHERE id = %s
+        """, [str(payment_id)])[0]
+
+    def _expire_claim(self, payment_id):
+        self.sql("""
+            UPDATE cinema.payments
+            SET created_at = now() - interval '1 hour', claimed_at = now() - interval '1 hour'
+            WHERE id = %s
+        """, [str(payment_id)])
+
+    def test_charge_record_finalize(self):
+        payment_id, created = self._submit(_InlineExecutor())
+
+        self.assertTrue(created)
+        status, auth_code, txn_uuid, purchase_id = self._row(payment_id)
+        self.assertEqual((status, auth_code, txn_uuid), ("paid", "654321", "TXN0000TEST"))
+        self.assertIsNotNone(purchase_id)
+        self.assertEqual(self.sql("SELECT content_id FROM cinema.purchases WHERE id = %s",
+                                  [str(purchase_id)])[0][0], self.content_id)
+        payments._send_receipt.assert_called_once_with(payment_id)
+
+    def test_declined_card_is_not_charged(self):
+        self.bank.check_card.return_value = {"success": False, "error": "Карта просрочена"}
+
+        payment_id, _ = self._submit(_InlineExecutor())
+
+        status, auth_code, _, purchase_id = self._row(payment_id)
+        self.assertEqual(status, "failed")
+        self.assertIsNone(auth_code)
+        self.assertIsNone(purchase_id)
+        self.bank.process_payment.assert_not_called()
+
+    def test_same_idempotency_key_charges_once(self):
+        first, created = self._submit(_InlineExecutor())
+        second, created_again = self._submit(_InlineExecutor())
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first, second)
+        self.bank.process_payment.assert_called_once()
+
+    def test_recover_finalizes_charge_recorded_before_crash(self):
+        payment_id, _ = self._submit(_DeadExecutor())
+        payments._record_charge(payment_id, {"transaction_id": "TXN0000CRASH", "auth_code": "111111"})
+        self._expire_claim(payment_id)
+
+        self.assertEqual(payments.recover(), 1)
+
+        status, auth_code, _, purchase_id = self._row(payment_id)
+        self.assertEqual((status, auth_code), ("paid", "111111"))
+        self.assertIsNotNone(purchase_id)
+
+    def test_recover_fails_uncharged_payment_after_crash(self):
+        payment_id, _ = self._submit(_DeadExecutor())
+        self._expire_claim(payment_id)
+
+        self.assertEqual(payments.recover(payment_id), 1)
+        self.assertEqual(self._row(payment_id)[0], "failed")
+
+    def test_recover_skips_payment_claimed_by_live_worker(self):
+        payment_id, _ = self._submit(_DeadExecutor())
+        self.sql("UPDATE cinema.payments SET created_at = now() - interval '1 hour', "
+                 "claimed_by = 'other-host:1' WHERE id = %s", [str(payment_id)])
+
+        self.assertEqual(payments.recover(), 0)
+        self.assertEqual(self._row(payment_id)[0], "pending")
+
+        # воркер другого процесса дописывает списание — оно не теряется
+        payments._record_charge(payment_id, {"transaction_id": "TXN0000LATE", "auth_code": "222222"})
+        self.assertTrue(payments.finalize(payment_id))
+        self.assertEqual(self._row(payment_id)[0], "paid")
+
+    def test_charge_after_expired_claim_is_not_lost(self):
+        payment_id, _ = self._submit(_DeadExecutor())
+        self._expire_claim(payment_id)
+        payments.recover(payment_id)
+        self.assertEqual(self._row(payment_id)[0], "failed")
+
+        payments._record_charge(payment_id, {"transaction_id": "TXN0000SLOW", "auth_code": "333333"})
+        self.assertTrue(payments.finalize(payment_id))
+        self.assertEqual(self._row(payment_id)[:2], ("paid", "333333"))
+
+    def test_worker_does_not_charge_without_claim(self):
+        payment_id, _ = self._submit(_DeadExecutor())
+        self.sql("UPDATE cinema.payments SET claimed_by = 'other-host:1', claimed_at = now() "
+                 "WHERE id = %s", [str(payment_id)])
+
+        job = payments.PaymentJob(self.user_id, Decimal("199.00"), CARD, content_id=self.content_id)
+        payments._run(payment_id, job)
+
+        self.bank.check_card.assert_not_called()
+        self.bank.process_payment.assert_not_called()
+        self.assertEqual(self._row(payment_id)[0], "pending")
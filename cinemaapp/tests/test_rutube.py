@@ -0,0 +1,143 @@
+import threading
+from unittest import mock
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from cinemaapp import rutube
+
+VIDEO_ID = "0123456789abcdef0123456789abcdef"
+VIDEO_URL = f"https://rutube.ru/video/{VIDEO_ID}/"
+BASE = "http://rutube.test"
+
+
+class _Response:
+    def __init__(self, status_code=200, data=None, text=""):
+        self.status_code = status_code
+        self._data = data or {}
+        self.text = text
+
+    def json(self):
+        return self._data
+
+
+class _Transport:
+    """Заглушка requests.Session: ответы по URL, счётчик запросов, необязательный «шлагбаум»."""
+
+    def __init__(self, responses, gate=None):
+        self.responses = responses
+        self.gate = gate
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        self.calls.append(url)
+        if self.gate is not None:
+            self.gate.wait(5)
+        response = self.responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _api(video_id=VIDEO_ID):
+    return f"{BASE}/api/play/options/{video_id}/"
+
+
+@override_settings(RUTUBE_BASE_URL=BASE, RUTUBE_WAIT=2)
+class RutubeResolverTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        rutube._inflight.clear()
+        self.addCleanup(cache.clear)
+
+    def _use(self, transport):
+        patcher = mock.patch.object(rutube, "_get_session", return_value=transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return transport
+
+    def test_extract_video_id(self):
+        self.assertEqual(rutube.extract_video_id(VIDEO_URL), VIDEO_ID)
+        self.assertEqual(rutube.extract_video_id(f"https://rutube.ru/play/embed/{VIDEO_ID}"), VIDEO_ID)
+        self.assertIsNone(rutube.extract_video_id("https://example.com/video.mp4"))
+        self.assertIsNone(rutube.extract_video_id(None))
+
+    def test_resolves_once_then_serves_from_cache(self):
+        transport = self._use(_Transport({
+            _api(): _Response(data={"video_balancer": {"mp4": {"url": "https://cdn.test/a.mp4"}}}),
+        }))
+
+        self.assertEqual(rutube.resolve(VIDEO_URL), "https://cdn.test/a.mp4")
+        self.assertEqual(rutube.resolve(VIDEO_URL), "https://cdn.test/a.mp4")
+        self.assertEqual(len(transport.calls), 1)
+
+    def test_falls_back_to_page_data(self):
+        self._use(_Transport({
+            _api(): _Response(data={}),
+            f"{BASE}/video/{VIDEO_ID}/": _Response(
+                text='<script>window.__DATA__ = {"video": {"url": "https://cdn.test/b.mp4"}};</script>',
+            ),
+        }))
+
+        self.assertEqual(rutube.resolve(VIDEO_URL), "https://cdn.test/b.mp4")
+
+    def test_negative_result_is_cached(self):
+        transport = self._use(_Transport({_api(): _Response(status_code=404)}))
+
+        self.assertIsNone(rutube.resolve(VIDEO_URL))
+        self.assertIsNone(rutube.resolve(VIDEO_URL))
+        self.assertEqual(len(transport.calls), 1)
+        self.assertEqual(cache.get(rutube.CACHE_KEY.format(VIDEO_ID)), "")
+
+    def test_transport_error_resolves_to_none(self):
+        transport = self._use(_Transport({_api(): requests.ConnectionError("connection reset")}))
+
+        self.assertIsNone(rutube.resolve(VIDEO_URL))
+        self.assertEqual(len(transport.calls), 1)
+        self.assertNotIn(VIDEO_ID, rutube._inflight)
+
+    def test_slow_lookup_finishes_in_background(self):
+        gate = threading.Event()
+        transport = self._use(_Transport({
+            _api(): _Response(data={"video": {"url": "https://cdn.test/c.mp4"}}),
+        }, gate=gate))
+
+        self.assertIsNone(rutube.resolve(VIDEO_URL, wait=0.05))
+        future = rutube._inflight[VIDEO_ID]
+        gate.set()
+        self.assertEqual(future.result(timeout=5), "https://cdn.test/c.mp4")
+
+        self.assertEqual(rutube.resolve(VIDEO_URL, wait=0), "https://cdn.test/c.mp4")
+        self.assertEqual(len(transport.calls), 1)
+
+    def test_concurrent_requests_share_one_lookup(self):
+        gate = threading.Event()
+        transport = self._use(_Transport({
+            _api(): _Response(data={"video": {"url": "https://cdn.test/d.mp4"}}),
+        }, gate=gate))
+        results = []
+
+        def viewer():
+            results.append(rutube.resolve(VIDEO_URL, wait=5))
+
+        viewers = [threading.Thread(target=viewer) for _ in range(5)]
+        for thread in viewers:
+            thread.start()
+        gate.set()
+        for thread in viewers:
+            thread.join(5)
+
+        self.assertEqual(results, ["https://cdn.test/d.mp4"] * 5)
+        self.assertEqual(len(transport.calls), 1)
+
+    def test_invalidate_forces_new_lookup(self):
+        transport = self._use(_Transport({
+            _api(): _Response(data={"video": {"url": "https://cdn.test/e.mp4"}}),
+        }))
+
+        rutube.resolve(VIDEO_URL)
+        rutube.invalidate(VIDEO_URL)
+        rutube.resolve(VIDEO_URL)
+
+        self.assertEqual(len(transport.calls), 2)
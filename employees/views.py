@@ -1,10 +1,19 @@
 import logging
-from django.db import connection
+from django.db import connection, transaction
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.urls import reverse
+from cinemaapp import media as media_resolver
+from cinemaapp import rutube as rutube_resolver
+from cinemaapp import services
+from cinemaapp import search as content_search
+from cinemaapp import suggest as title_suggest
+from cinemaapp import identity
+from cinemaapp import analytics
+from cinemaapp import episodes as episode_index
+from cinemaapp import series as series_cache
 
 logger = logging.getLogger(__name__)
 
@@ -129,8 +138,9 @@ def admin_content_list(request):
     params = []
     
     if search_query:
-        where_clauses.append("(c.title ILIKE %s OR c.description ILIKE %s)")
-        params.extend([f'%{search_query}%', f'%{search_query}%'])
+        match_clause, match_params = content_search.match_sql("c", search_query)
+        where_clauses.append(match_clause)
+        params.extend(match_params)
     
     if content_type and content_type != 'all':
         where_clauses.append("c.type = %s")
@@ -309,6 +319,7 @@ def admin_content_add(request):
                         ON CONFLICT DO NOTHING
                     """, [content_id, genre_id])
                 
+                transaction.on_commit(title_suggest.refresh)
                 messages.success(request, f'Контент "{title}" успешно добавлен!')
                 return redirect('admin_content_list')
                 
@@ -371,7 +382,11 @@ def update_or_create_media(cursor, current_id, url, kind):
             RETURNING id
         """, [kind, mime_type, url])
         
-        return cursor.fetchone()[0]
+        media_id = cursor.fetchone()[0]
+        transaction.on_commit(lambda: media_resolver.invalidate(media_id))
+        if kind == 'video' and 'rutube' in url.lower():
+            transaction.on_commit(lambda: rutube_resolver.prefetch(url))
+        return media_id
     except Exception as e:
         logger.error(f"Error in update_or_create_media: {e}")
         
@@ -510,6 +525,7 @@ def admin_content_edit(request, content_id):
                         VALUES (%s, %s)
                     """, [content_id, genre_id])
                 
+                transaction.on_commit(title_suggest.refresh)
                 messages.success(request, f'Контент "{title}" успешно обновлен!')
                 return redirect('admin_content_list')
                 
@@ -592,6 +608,7 @@ def admin_content_delete(request, content_id):
                     content_title = result[0]
 
                     cursor.execute("DELETE FROM cinema.content WHERE id = %s", [content_id])
+                    transaction.on_commit(title_suggest.refresh)
                     
                     messages.success(request, f'Контент "{content_title}" успешно удален!')
                 else:
@@ -702,6 +719,32 @@ def admin_seasons_management(request):
         'employee_name': request.session.get('employee_name'),
     })
 
+def _series_changed(cursor, content_id=None, season_id=None):
+    """Сбросить кэши сериала после правки сезонов/серий"""
+    if content_id is None and season_id is not None:
+        cursor.execute("SELECT content_id FROM cinema.seasons WHERE id = %s", [season_id])
+        row = cursor.fetchone()
+        content_id = row[0] if row else None
+    if content_id is not None:
+        transaction.on_commit(lambda: episode_index.invalidate(content_id))
+        transaction.on_commit(lambda: series_cache.bump(content_id))
+
+def _media_changed(cursor, asset_id):
+    """
+    Сбросить после коммита кэши с URL медиа-актива: резолвер медиа и деревья
+    сериалов, серии которых ссылаются на этот актив. Вызывать до отвязки серий.
+    """
+    cursor.execute("""
+        SELECT DISTINCT s.content_id
+        FROM cinema.episodes e
+        JOIN cinema.seasons s ON s.id = e.season_id
+        WHERE e.video_id = %s
+    """, [asset_id])
+    content_ids = [row[0] for row in cursor.fetchall()]
+    transaction.on_commit(lambda: media_resolver.invalidate(asset_id))
+    for content_id in content_ids:
+        transaction.on_commit(lambda content_id=content_id: series_cache.bump(content_id))
+
 @employee_required
 @check_employee_role('ADMIN')
 def admin_season_add(request, series_id):
@@ -737,6 +780,7 @@ def admin_season_add(request, series_id):
                 """, [series_id, season_num])
                 
                 season_id = cursor.fetchone()[0]
+                _series_changed(cursor, content_id=series_id)
                 messages.success(request, f'Сезон {season_num} успешно добавлен!')
                 return redirect('admin_season_detail', season_id=season_id)
                 
@@ -824,6 +868,7 @@ def admin_episode_add(request, season_id):
                 """, [season_id, episode_num, title, description, duration_sec, video_id])
                 
                 episode_id = cursor.fetchone()[0]
+                _series_changed(cursor, season_id=season_id)
                 messages.success(request, f'Эпизод "{title}" успешно добавлен!')
                 return redirect('admin_season_detail', season_id=season_id)
                 
@@ -931,6 +976,7 @@ def admin_episode_edit(request, episode_id):
                         duration_sec = %s, video_id = %s
                     WHERE id = %s
                 """, [episode_num, title, description, duration_sec, video_id, episode_id])
+                _series_changed(cursor, season_id=season_id)
                 
                 messages.success(request, f'Эпизод "{title}" успешно обновлен!')
                 return redirect('admin_season_detail', season_id=season_id)
@@ -986,7 +1032,7 @@ def admin_season_delete(request, season_id):
             with connection.cursor() as cursor:
 
                 cursor.execute("""
-                    SELECT s.season_num, c.title 
+                    SELECT s.season_num, c.title, c.id
                     FROM cinema.seasons s
                     JOIN cinema.content c ON c.id = s.content_id
                     WHERE s.id = %s
@@ -994,10 +1040,11 @@ def admin_season_delete(request, season_id):
                 
                 result = cursor.fetchone()
                 if result:
-                    season_num, series_title = result
+                    season_num, series_title, content_id = result
                     
 
                     cursor.execute("DELETE FROM cinema.seasons WHERE id = %s", [season_id])
+                    _series_changed(cursor, content_id=content_id)
                     
                     messages.success(request, f'Сезон {season_num} сериала "{series_title}" успешно удален!')
                 else:
@@ -1019,7 +1066,7 @@ def admin_episode_delete(request, episode_id):
             with connection.cursor() as cursor:
 
                 cursor.execute("""
-                    SELECT e.title, s.season_num, c.title as series_title
+                    SELECT e.title, s.season_num, c.title as series_title, c.id
                     FROM cinema.episodes e
                     JOIN cinema.seasons s ON s.id = e.season_id
                     JOIN cinema.content c ON c.id = s.content_id
@@ -1028,10 +1075,11 @@ def admin_episode_delete(request, episode_id):
                 
                 result = cursor.fetchone()
                 if result:
-                    episode_title, season_num, series_title = result
+                    episode_title, season_num, series_title, content_id = result
                     
 
                     cursor.execute("DELETE FROM cinema.episodes WHERE id = %s", [episode_id])
+                    _series_changed(cursor, content_id=content_id)
                     
                     messages.success(request, f'Эпизод "{episode_title}" (сезон {season_num}) успешно удален!')
                 else:
@@ -1144,7 +1192,7 @@ def admin_media_assets(request):
                 elif not url.startswith(('http://', 'https://')):
                     messages.error(request, 'URL должен начинаться с http:// или https://')
                 else:
-                    with connection.cursor() as cursor:
+                    with transaction.atomic(), connection.cursor() as cursor:
 
                         if not mime_type:
                             mime_type = get_mime_type_by_url(url, kind)
@@ -1154,6 +1202,7 @@ def admin_media_assets(request):
                             SET url = %s, kind = %s, mime_type = %s
                             WHERE id = %s
                         """, [url, kind, mime_type, asset_id])
+                        _media_changed(cursor, asset_id)
                         
                         messages.success(request, 'Медиа-актив успешно обновлен')
                         
@@ -1162,7 +1211,7 @@ def admin_media_assets(request):
                 
         elif action == 'delete':
             try:
-                with connection.cursor() as cursor:
+                with transaction.atomic(), connection.cursor() as cursor:
 
                     cursor.execute("""
                         SELECT 
@@ -1177,6 +1226,7 @@ def admin_media_assets(request):
                     video_count, cover_count, trailer_count, wide_count, episode_count = result
                     
                     total_usage = (video_count or 0) + (cover_count or 0) + (trailer_count or 0) + (wide_count or 0) + (episode_count or 0)
+                    _media_changed(cursor, asset_id)
                     
                     if total_usage > 0:
 
@@ -1326,7 +1376,8 @@ def admin_panel(request):
 
         cursor.execute("""
             SELECT COUNT(*) FROM cinema.user_subscriptions 
-            WHERE status = 'active' AND expires_at > NOW()
+            WHERE effective_status IN ('pending', 'active')
+              AND status = 'active' AND expires_at > NOW()
         """)
         active_subscriptions = cursor.fetchone()[0]
         
@@ -1429,8 +1480,13 @@ def analytics_panel(request):
     end_date_display = (end_date - datetime.timedelta(days=1)).date()
 
 
-    start_date_sql = start_date.strftime('%Y-%m-%d %H:%M:%S')
     end_date_sql = end_date.strftime('%Y-%m-%d %H:%M:%S')
+
+    # дневные метрики читаются из витрин cinema.analytics_daily_* — стоимость не зависит от периода
+    rollup_warning = analytics.staleness()
+    if rollup_warning:
+        messages.warning(request, rollup_warning)
+    first_day, last_day = analytics.day_range(start_date, end_date)
     
 
     registrations = []
@@ -1456,73 +1512,65 @@ def analytics_panel(request):
     with connection.cursor() as cursor:
 
         cursor.execute("""
-            SELECT DATE(created_at) as date, COUNT(*) as count
-            FROM cinema.users
-            WHERE created_at BETWEEN %s AND %s
-            GROUP BY DATE(created_at)
-            ORDER BY date
-        """, [start_date_sql, end_date_sql])
+            SELECT day as date, registrations as count
+            FROM cinema.analytics_daily_registrations
+            WHERE day BETWEEN %s AND %s
+            ORDER BY day
+        """, [first_day, last_day])
         registrations = cursor.fetchall()
         
 
         cursor.execute("""
-            SELECT DATE(purchased_at) as date, COUNT(*) as count, 
-                   COALESCE(SUM(c.price), 0) as total_amount
-            FROM cinema.purchases p
-            JOIN cinema.content c ON c.id = p.content_id
-            WHERE p.purchased_at BETWEEN %s AND %s
-            GROUP BY DATE(purchased_at)
-            ORDER BY date
-        """, [start_date_sql, end_date_sql])
+            SELECT day as date, purchases as count, gross as total_amount
+            FROM cinema.analytics_daily_purchases
+            WHERE day BETWEEN %s AND %s
+            ORDER BY day
+        """, [first_day, last_day])
         purchases = cursor.fetchall()
         
         cursor.execute("""
-            SELECT DATE(paid_at) as date, COUNT(*) as count, 
-                   COALESCE(SUM(amount), 0) as total_amount
-            FROM cinema.payments
-            WHERE paid_at BETWEEN %s AND %s
-              AND subscription_id IS NOT NULL
-            GROUP BY DATE(paid_at)
-            ORDER BY date
-        """, [start_date_sql, end_date_sql])
+            SELECT day as date, SUM(payments) as count, SUM(amount) as total_amount
+            FROM cinema.analytics_daily_payments
+            WHERE day BETWEEN %s AND %s
+              AND kind = 'subscription'
+            GROUP BY day
+            ORDER BY day
+        """, [first_day, last_day])
         subscription_payments = cursor.fetchall()
         
 
         cursor.execute("""
             WITH all_revenue AS (
-                -- Выручка от подписок (оплаченные платежи)
+                -- Выручка от подписок (платежи по дню paid_at)
                 SELECT 
                     'subscription' as revenue_type,
-                    COUNT(*) as total_payments,
+                    COALESCE(SUM(payments), 0) as total_payments,
                     COALESCE(SUM(amount), 0) as total_revenue,
-                    COALESCE(SUM(CASE WHEN status = 'paid' THEN amount ELSE 0 END), 0) as paid_amount,
-                    COALESCE(SUM(CASE WHEN status = 'failed' THEN amount ELSE 0 END), 0) as failed_amount,
-                    COALESCE(SUM(CASE WHEN status = 'pending' THEN amount ELSE 0 END), 0) as pending_amount,
-                    COUNT(CASE WHEN status = 'paid' THEN 1 END) as paid_count,
-                    COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed_count,
-                    COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_count
-                FROM cinema.payments
-                WHERE paid_at BETWEEN %s AND %s
-                AND subscription_id IS NOT NULL
+                    COALESCE(SUM(amount) FILTER (WHERE status = 'paid'), 0) as paid_amount,
+                    COALESCE(SUM(amount) FILTER (WHERE status = 'failed'), 0) as failed_amount,
+                    COALESCE(SUM(amount) FILTER (WHERE status = 'pending'), 0) as pending_amount,
+                    COALESCE(SUM(payments) FILTER (WHERE status = 'paid'), 0) as paid_count,
+                    COALESCE(SUM(payments) FILTER (WHERE status = 'failed'), 0) as failed_count,
+                    COALESCE(SUM(payments) FILTER (WHERE status = 'pending'), 0) as pending_count
+                FROM cinema.analytics_daily_payments
+                WHERE day BETWEEN %s AND %s
+                AND kind = 'subscription'
                 
                 UNION ALL
                 
-                -- Выручка от покупок контента
+                -- Выручка от покупок платного контента (по дню покупки)
                 SELECT 
                     'purchase' as revenue_type,
-                    COUNT(pur.id) as total_payments,
-                    COALESCE(SUM(c.price), 0) as total_revenue,
-                    COALESCE(SUM(CASE WHEN p.status = 'paid' THEN p.amount ELSE 0 END), 0) as paid_amount,
-                    COALESCE(SUM(CASE WHEN p.status = 'failed' THEN p.amount ELSE 0 END), 0) as failed_amount,
-                    COALESCE(SUM(CASE WHEN p.status = 'pending' THEN p.amount ELSE 0 END), 0) as pending_amount,
-                    COUNT(CASE WHEN p.status = 'paid' THEN 1 END) as paid_count,
-                    COUNT(CASE WHEN p.status = 'failed' THEN 1 END) as failed_count,
-                    COUNT(CASE WHEN p.status = 'pending' THEN 1 END) as pending_count
-                FROM cinema.purchases pur
-                JOIN cinema.content c ON c.id = pur.content_id
-                LEFT JOIN cinema.payments p ON p.purchase_id = pur.id
-                WHERE pur.purchased_at BETWEEN %s AND %s
-                AND NOT c.is_free AND c.price > 0
+                    COALESCE(SUM(rows), 0) as total_payments,
+                    COALESCE(SUM(gross), 0) as total_revenue,
+                    COALESCE(SUM(amount) FILTER (WHERE payment_status = 'paid'), 0) as paid_amount,
+                    COALESCE(SUM(amount) FILTER (WHERE payment_status = 'failed'), 0) as failed_amount,
+                    COALESCE(SUM(amount) FILTER (WHERE payment_status = 'pending'), 0) as pending_amount,
+                    COALESCE(SUM(rows) FILTER (WHERE payment_status = 'paid'), 0) as paid_count,
+                    COALESCE(SUM(rows) FILTER (WHERE payment_status = 'failed'), 0) as failed_count,
+                    COALESCE(SUM(rows) FILTER (WHERE payment_status = 'pending'), 0) as pending_count
+                FROM cinema.analytics_daily_purchase_revenue
+                WHERE day BETWEEN %s AND %s
             )
             SELECT 
                 SUM(total_payments) as total_payments,
@@ -1544,127 +1592,97 @@ def analytics_panel(request):
                     ELSE 0 
                 END as avg_failed_amount
             FROM all_revenue
-        """, [start_date_sql, end_date_sql, start_date_sql, end_date_sql])
+        """, [first_day, last_day, first_day, last_day])
         financial_stats = cursor.fetchone()
 
         cursor.execute("""
             SELECT 
                 c.title as content_title,
                 c.type as content_type,
-                COUNT(p.id) as purchase_count,
-                COALESCE(SUM(c.price), 0) as total_revenue,
-                COALESCE(AVG(cr.rating), 0) as avg_rating
-            FROM cinema.purchases p
-            JOIN cinema.content c ON c.id = p.content_id
-            LEFT JOIN cinema.content_reviews cr ON cr.content_id = c.id
-            WHERE p.purchased_at BETWEEN %s AND %s
-            GROUP BY c.id, c.title, c.type
-            ORDER BY purchase_count DESC
-            LIMIT 10
-        """, [start_date_sql, end_date_sql])
+                s.purchase_count,
+                s.total_revenue,
+                COALESCE(crs.avg_rating, 0) as avg_rating
+            FROM (
+                SELECT content_id, SUM(purchases) as purchase_count, SUM(gross) as total_revenue
+                FROM cinema.analytics_daily_content_sales
+                WHERE day BETWEEN %s AND %s
+                GROUP BY content_id
+                ORDER BY purchase_count DESC
+                LIMIT 10
+            ) s
+            JOIN cinema.content c ON c.id = s.content_id
+            LEFT JOIN cinema.content_rating_stats crs ON crs.content_id = s.content_id
+            ORDER BY s.purchase_count DESC
+        """, [first_day, last_day])
         popular_content = cursor.fetchall()
 
         cursor.execute("""
             SELECT 
                 COUNT(DISTINCT user_id) as active_users,
                 COUNT(*) as total_sessions,
-                COALESCE(AVG(session_duration), 0) as avg_session_duration
-            FROM (
-                SELECT 
-                    user_id,
-                    session_start,
-                    EXTRACT(EPOCH FROM (session_end - session_start)) as session_duration
-                FROM (
-                    SELECT 
-                        user_id,
-                        MIN(watched_at) as session_start,
-                        MAX(watched_at) as session_end
-                    FROM cinema.watch_history
-                    WHERE watched_at BETWEEN %s AND %s
-                    GROUP BY user_id, DATE(watched_at)
-                ) sessions
-            ) user_sessions
-        """, [start_date, end_date])
+                COALESCE(AVG(EXTRACT(EPOCH FROM (last_watch - first_watch))), 0) as avg_session_duration
+            FROM cinema.analytics_daily_viewers
+            WHERE day BETWEEN %s AND %s
+        """, [first_day, last_day])
         user_activity = cursor.fetchone()
 
         cursor.execute("""
-            SELECT DATE(paid_at) as date, 
-                   COALESCE(SUM(amount), 0) as daily_revenue
-            FROM cinema.payments
-            WHERE paid_at BETWEEN %s AND %s
+            SELECT day as date, SUM(amount) as daily_revenue
+            FROM cinema.analytics_daily_payments
+            WHERE day BETWEEN %s AND %s
               AND status = 'paid'
-            GROUP BY DATE(paid_at)
-            ORDER BY date
-        """, [start_date_sql, end_date_sql])
+            GROUP BY day
+            ORDER BY day
+        """, [first_day, last_day])
         daily_revenue = cursor.fetchall()
 
-        try:
-            cursor.execute("""
-                SELECT 
-                    payment_method,
-                    COUNT(*) as count,
-                    COALESCE(SUM(amount), 0) as total_amount
-                FROM cinema.payments
-                WHERE paid_at BETWEEN %s AND %s
-                  AND payment_method IS NOT NULL
-                GROUP BY payment_method
-                ORDER BY total_amount DESC
-            """, [start_date, end_date])
-            payment_methods = cursor.fetchall()
-        except:
-            payment_methods = []
+        cursor.execute("""
+            SELECT 
+                payment_method,
+                SUM(payments) as count,
+                SUM(amount) as total_amount
+            FROM cinema.analytics_daily_payment_methods
+            WHERE day BETWEEN %s AND %s
+            GROUP BY payment_method
+            ORDER BY total_amount DESC
+        """, [first_day, last_day])
+        payment_methods = cursor.fetchall()
         
         cursor.execute("""
             SELECT 
                 g.name as genre_name,
-                COUNT(DISTINCT p.content_id) as content_count,
-                COUNT(p.id) as purchase_count,
-                COALESCE(SUM(c.price), 0) as total_revenue
-            FROM cinema.purchases p
-            JOIN cinema.content c ON c.id = p.content_id
-            JOIN cinema.content_genres cg ON cg.content_id = c.id
+                COUNT(DISTINCT s.content_id) as content_count,
+                SUM(s.purchases) as purchase_count,
+                SUM(s.gross) as total_revenue
+            FROM cinema.analytics_daily_content_sales s
+            JOIN cinema.content_genres cg ON cg.content_id = s.content_id
             JOIN cinema.genres g ON g.id = cg.genre_id
-            WHERE p.purchased_at BETWEEN %s AND %s
+            WHERE s.day BETWEEN %s AND %s
             GROUP BY g.id, g.name
             ORDER BY total_revenue DESC
             LIMIT 15
-        """, [start_date, end_date])
+        """, [first_day, last_day])
         genre_stats = cursor.fetchall()
         
         cursor.execute("""
-            WITH user_registrations AS (
-                SELECT u.id, u.created_at,
-                       EXISTS(SELECT 1 FROM cinema.purchases p WHERE p.user_id = u.id) as has_purchase,
-                       EXISTS(SELECT 1 FROM cinema.user_subscriptions us WHERE us.user_id = u.id) as has_subscription
-                FROM cinema.users u
-                WHERE u.created_at BETWEEN %s AND %s
-            )
             SELECT 
-                COUNT(*) as total_registered,
-                SUM(CASE WHEN has_purchase THEN 1 ELSE 0 END) as bought_content,
-                SUM(CASE WHEN has_subscription THEN 1 ELSE 0 END) as has_subscription,
-                ROUND(100.0 * SUM(CASE WHEN has_purchase OR has_subscription THEN 1 ELSE 0 END) / COUNT(*), 2) as conversion_rate
-            FROM user_registrations
-        """, [start_date, end_date])
+                COALESCE(SUM(registered), 0) as total_registered,
+                SUM(bought_content) as bought_content,
+                SUM(subscribed) as has_subscription,
+                ROUND(100.0 * SUM(converted) / NULLIF(SUM(registered), 0), 2) as conversion_rate
+            FROM cinema.analytics_daily_conversion
+            WHERE day BETWEEN %s AND %s
+        """, [first_day, last_day])
         conversion_stats = cursor.fetchone()
         
         cursor.execute("""
             WITH user_revenue AS (
                 SELECT 
-                    p.user_id,
-                    COALESCE(SUM(p2.amount), 0) as total_spent
-                FROM cinema.purchases p
-                LEFT JOIN cinema.payments p2 ON p2.purchase_id = p.id
-                WHERE p.purchased_at BETWEEN %s AND %s
-                GROUP BY p.user_id
-                UNION ALL
-                SELECT 
-                    us.user_id,
-                    COALESCE(SUM(p.amount), 0) as total_spent
-                FROM cinema.user_subscriptions us
-                LEFT JOIN cinema.payments p ON p.subscription_id = us.id
-                WHERE us.started_at BETWEEN %s AND %s
-                GROUP BY us.user_id
+                    user_id,
+                    SUM(amount) as total_spent
+                FROM cinema.analytics_daily_user_revenue
+                WHERE day BETWEEN %s AND %s
+                GROUP BY user_id, kind
             )
             SELECT 
                 COUNT(DISTINCT user_id) as paying_users,
@@ -1675,97 +1693,90 @@ def analytics_panel(request):
                     ELSE 0 
                 END as arpu
             FROM user_revenue
-            WHERE total_spent > 0
-        """, [start_date, end_date, start_date, end_date])
+        """, [first_day, last_day])
         arpu_stats = cursor.fetchone()
 
+        # когорты — недели регистрации (последние 8); активность берётся из витрины зрителей
+        # за 4 недели от начала каждой когорты, а не из всей истории просмотров
+        cohort_first = first_day - datetime.timedelta(days=30)
         cursor.execute("""
-            WITH cohort_users AS (
-                SELECT u.id, DATE_TRUNC('week', u.created_at) as cohort_week
-                FROM cinema.users u
-                WHERE u.created_at BETWEEN %s AND %s
+            WITH cohorts AS (
+                SELECT DATE_TRUNC('week', day)::date as cohort_week,
+                       SUM(registrations) as cohort_size
+                FROM cinema.analytics_daily_registrations
+                WHERE day BETWEEN %s AND %s
+                GROUP BY 1
+                ORDER BY 1 DESC
+                LIMIT 8
             ),
-            weekly_activity AS (
+            activity AS (
                 SELECT 
-                    cu.cohort_week,
-                    DATE_TRUNC('week', wh.watched_at) as activity_week,
-                    COUNT(DISTINCT wh.user_id) as active_users
-                FROM cohort_users cu
-                JOIN cinema.watch_history wh ON wh.user_id = cu.id
-                WHERE wh.watched_at BETWEEN %s AND %s
-                GROUP BY cu.cohort_week, DATE_TRUNC('week', wh.watched_at)
+                    c.cohort_week,
+                    (DATE_TRUNC('week', v.day)::date - c.cohort_week) / 7 as week,
+                    COUNT(DISTINCT v.user_id) as active_users
+                FROM cohorts c
+                JOIN cinema.users u ON u.created_at >= GREATEST(c.cohort_week, %s::date)
+                                   AND u.created_at < LEAST(c.cohort_week + 7, %s::date + 1)
+                JOIN cinema.analytics_daily_viewers v ON v.user_id = u.id
+                                                     AND v.day >= c.cohort_week
+                                                     AND v.day < c.cohort_week + 28
+                GROUP BY 1, 2
             )
             SELECT 
-                TO_CHAR(cohort_week, 'YYYY-MM-DD') as cohort,
-                COUNT(DISTINCT cu.id) as cohort_size,
-                ROUND(100.0 * COUNT(DISTINCT CASE 
-                    WHEN DATE_TRUNC('week', wh.watched_at) = cohort_week THEN wh.user_id 
-                END) / COUNT(DISTINCT cu.id), 2) as week_0,
-                ROUND(100.0 * COUNT(DISTINCT CASE 
-                    WHEN DATE_TRUNC('week', wh.watched_at) = cohort_week + INTERVAL '1 week' THEN wh.user_id 
-                END) / COUNT(DISTINCT cu.id), 2) as week_1,
-                ROUND(100.0 * COUNT(DISTINCT CASE 
-                    WHEN DATE_TRUNC('week', wh.watched_at) = cohort_week + INTERVAL '2 weeks' THEN wh.user_id 
-                END) / COUNT(DISTINCT cu.id), 2) as week_2,
-                ROUND(100.0 * COUNT(DISTINCT CASE 
-                    WHEN DATE_TRUNC('week', wh.watched_at) = cohort_week + INTERVAL '3 weeks' THEN wh.user_id 
-                END) / COUNT(DISTINCT cu.id), 2) as week_3
-            FROM cohort_users cu
-            LEFT JOIN cinema.watch_history wh ON wh.user_id = cu.id
-            GROUP BY cohort_week
-            ORDER BY cohort_week DESC
-            LIMIT 8
-        """, [start_date - datetime.timedelta(days=30), end_date, start_date - datetime.timedelta(days=30), end_date])
+                TO_CHAR(c.cohort_week, 'YYYY-MM-DD') as cohort,
+                c.cohort_size,
+                ROUND(100.0 * COALESCE(SUM(a.active_users) FILTER (WHERE a.week = 0), 0) / c.cohort_size, 2) as week_0,
+                ROUND(100.0 * COALESCE(SUM(a.active_users) FILTER (WHERE a.week = 1), 0) / c.cohort_size, 2) as week_1,
+                ROUND(100.0 * COALESCE(SUM(a.active_users) FILTER (WHERE a.week = 2), 0) / c.cohort_size, 2) as week_2,
+                ROUND(100.0 * COALESCE(SUM(a.active_users) FILTER (WHERE a.week = 3), 0) / c.cohort_size, 2) as week_3
+            FROM cohorts c
+            LEFT JOIN activity a ON a.cohort_week = c.cohort_week
+            GROUP BY c.cohort_week, c.cohort_size
+            ORDER BY c.cohort_week DESC
+        """, [cohort_first, last_day, cohort_first, last_day])
         retention_stats = cursor.fetchall()
         
-        try:
-            cursor.execute("""
-                SELECT 
-                    country,
-                    city,
-                    COUNT(*) as user_count,
-                    COALESCE(SUM(
-                        CASE WHEN EXISTS(
-                            SELECT 1 FROM cinema.purchases p WHERE p.user_id = u.id
-                        ) THEN 1 ELSE 0 END
-                    ), 0) as paying_users
-                FROM cinema.users u
-                WHERE u.created_at BETWEEN %s AND %s
-                  AND country IS NOT NULL
-                GROUP BY country, city
-                ORDER BY user_count DESC
-                LIMIT 20
-            """, [start_date, end_date])
-            geography_stats = cursor.fetchall()
-        except:
-            geography_stats = []
+        cursor.execute("""
+            SELECT 
+                country,
+                NULLIF(city, '') as city,
+                SUM(users) as user_count,
+                SUM(paying_users) as paying_users
+            FROM cinema.analytics_daily_geography
+            WHERE day BETWEEN %s AND %s
+            GROUP BY country, city
+            ORDER BY user_count DESC
+            LIMIT 20
+        """, [first_day, last_day])
+        geography_stats = cursor.fetchall()
 
         try:
             cursor.execute("""
-                SELECT COUNT(*) FROM cinema.payments 
-                WHERE status IN ('failed', 'pending')
-                AND paid_at BETWEEN %s AND %s
-            """, [start_date, end_date])
-            has_payment_issues = cursor.fetchone()[0] > 0
+                SELECT EXISTS(
+                    SELECT 1 FROM cinema.analytics_daily_payments
+                    WHERE status IN ('failed', 'pending')
+                    AND day BETWEEN %s AND %s
+                )
+            """, [first_day, last_day])
+            has_payment_issues = cursor.fetchone()[0]
         except Exception as e:
             print(f"DEBUG: Error checking payment issues: {e}")
             has_payment_issues = False
 
         cursor.execute("""
             WITH subscription_payments_period AS (
-                -- Платежи за выбранный период
+                -- Продажи подписок за выбранный период (витрина по дню paid_at)
                 SELECT 
-                    us.plan_id,
-                    COUNT(DISTINCT p.id) as payment_count,
-                    COUNT(DISTINCT us.id) as subscription_count,
-                    COALESCE(SUM(p.amount), 0) as total_revenue,
-                    COUNT(DISTINCT CASE WHEN p.status = 'paid' THEN us.id END) as paid_subscriptions,
-                    COALESCE(SUM(CASE WHEN p.status = 'paid' THEN p.amount ELSE 0 END), 0) as paid_revenue
-                FROM cinema.payments p
-                JOIN cinema.user_subscriptions us ON us.id = p.subscription_id
-                WHERE p.paid_at BETWEEN %s AND %s
-                AND p.status IN ('paid', 'pending')
-                GROUP BY us.plan_id
+                    plan_id,
+                    SUM(payments) as payment_count,
+                    SUM(subscriptions) as subscription_count,
+                    SUM(amount) as total_revenue,
+                    COALESCE(SUM(subscriptions) FILTER (WHERE status = 'paid'), 0) as paid_subscriptions,
+                    COALESCE(SUM(amount) FILTER (WHERE status = 'paid'), 0) as paid_revenue
+                FROM cinema.analytics_daily_subscription_sales
+                WHERE day BETWEEN %s AND %s
+                AND status IN ('paid', 'pending')
+                GROUP BY plan_id
             ),
             active_subscriptions_count AS (
                 -- Активные подписки на текущий момент
@@ -1798,24 +1809,23 @@ def analytics_panel(request):
             LEFT JOIN active_subscriptions_count ascount ON ascount.plan_id = sp.id
             WHERE sp.code != 'ADMIN_ACCESS'
             ORDER BY COALESCE(spp.total_revenue, 0) DESC
-        """, [start_date_sql, end_date_sql, end_date_sql])
+        """, [first_day, last_day, end_date_sql])
         subscription_types_data = cursor.fetchall()
 
         cursor.execute("""
             SELECT 
-                DATE_TRUNC('month', p.paid_at) as month,
+                DATE_TRUNC('month', s.day)::date as month,
                 sp.name as plan_name,
-                COUNT(DISTINCT p.subscription_id) as sales_count,
-                COALESCE(SUM(p.amount), 0) as monthly_revenue
-            FROM cinema.payments p
-            JOIN cinema.user_subscriptions us ON us.id = p.subscription_id
-            JOIN cinema.subscription_plans sp ON sp.id = us.plan_id
-            WHERE p.status = 'paid'
+                SUM(s.subscriptions) as sales_count,
+                SUM(s.amount) as monthly_revenue
+            FROM cinema.analytics_daily_subscription_sales s
+            JOIN cinema.subscription_plans sp ON sp.id = s.plan_id
+            WHERE s.status = 'paid'
             AND sp.code != 'ADMIN_ACCESS'
-            AND p.paid_at BETWEEN %s AND %s
-            GROUP BY DATE_TRUNC('month', p.paid_at), sp.id, sp.name
+            AND s.day BETWEEN %s AND %s
+            GROUP BY DATE_TRUNC('month', s.day), sp.id, sp.name
             ORDER BY month, monthly_revenue DESC
-        """, [start_date_sql, end_date_sql])
+        """, [first_day, last_day])
         subscription_dynamics = cursor.fetchall()
 
 
@@ -2166,29 +2176,31 @@ def export_analytics(request):
         start_date = datetime.datetime(2020, 1, 1)
     else:
         start_date = end_date - datetime.timedelta(days=7)
+
+    analytics.staleness()
+    first_day, last_day = analytics.day_range(start_date, end_date)
     
     with connection.cursor() as cursor:
 
 
         cursor.execute("""
-            SELECT DATE(created_at) as date, COUNT(*) as count
-            FROM cinema.users
-            WHERE created_at BETWEEN %s AND %s
-            GROUP BY DATE(created_at)
-            ORDER BY date
-        """, [start_date, end_date])
+            SELECT day as date, registrations as count
+            FROM cinema.analytics_daily_registrations
+            WHERE day BETWEEN %s AND %s
+            ORDER BY day
+        """, [first_day, last_day])
         registrations = cursor.fetchall()
 
         cursor.execute("""
-            SELECT DATE(paid_at) as date, 
-                   COUNT(*) as count, 
-                   COALESCE(SUM(amount), 0) as amount,
+            SELECT day as date, 
+                   SUM(payments) as count, 
+                   SUM(amount) as amount,
                    status
-            FROM cinema.payments
-            WHERE paid_at BETWEEN %s AND %s
-            GROUP BY DATE(paid_at), status
-            ORDER BY date, status
-        """, [start_date, end_date])
+            FROM cinema.analytics_daily_payments
+            WHERE day BETWEEN %s AND %s
+            GROUP BY day, status
+            ORDER BY day, status
+        """, [first_day, last_day])
         payments = cursor.fetchall()
         
 
@@ -2239,21 +2251,12 @@ def export_analytics(request):
         user_activity = cursor.fetchall()
         
 
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_payments,
-                COALESCE(SUM(CASE WHEN status = 'paid' THEN amount ELSE 0 END), 0) as total_revenue
-            FROM cinema.payments
-            WHERE paid_at BETWEEN %s AND %s
-        """, [start_date, end_date])
-        payment_stats = cursor.fetchone()
-        
-        cursor.execute("""
-            SELECT COUNT(*) as total_users
-            FROM cinema.users
-            WHERE created_at BETWEEN %s AND %s
-        """, [start_date, end_date])
-        user_stats = cursor.fetchone()
+        # итоги считаются по уже выбранным дневным строкам витрин
+        payment_stats = (
+            sum(int(row[1]) for row in payments),
+            sum((row[2] for row in payments if row[3] == 'paid'), 0),
+        )
+        user_stats = (sum(row[1] for row in registrations),)
 
     if format_type == 'csv':
 
@@ -2394,7 +2397,8 @@ def support_panel(request):
             FROM cinema.user_subscriptions us
             JOIN cinema.users u ON u.id = us.user_id
             JOIN cinema.subscription_plans sp ON sp.id = us.plan_id
-            WHERE us.status = 'active' 
+            WHERE us.effective_status IN ('pending', 'active')
+            AND us.status = 'active' 
             AND us.expires_at BETWEEN NOW() AND NOW() + INTERVAL '7 days'
             ORDER BY us.expires_at
         """)
@@ -3752,6 +3756,7 @@ def admin_user_delete(request, user_id):
                             """, [user_id])
                             cursor.execute("DELETE FROM cinema.playlists WHERE user_id = %s", [user_id])
                             
+                            services._remove_user_ratings(cursor, user_id)
                             cursor.execute("DELETE FROM cinema.content_reviews WHERE user_id = %s", [user_id])
                             
                             cursor.execute("DELETE FROM cinema.watchlist WHERE user_id = %s", [user_id])
@@ -3772,6 +3777,7 @@ def admin_user_delete(request, user_id):
                                 from django.contrib.auth.models import User
                                 django_user = User.objects.filter(email=user_email).first()
                                 if django_user:
+                                    identity.invalidate(django_user)
                                     django_user.delete()
                             except Exception as e:
                                 logger.error(f"Error deleting Django user {user_email}: {e}")
@@ -3816,6 +3822,7 @@ def admin_user_delete(request, user_id):
                                 from django.contrib.auth.models import User
                                 django_user = User.objects.filter(email=user_email).first()
                                 if django_user:
+                                    identity.invalidate(django_user)
                                     django_user.delete()
                             except Exception as e:
                                 logger.error(f"Error deleting Django user {user_email}: {e}")
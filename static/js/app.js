@@ -22,6 +22,22 @@
   }
 })();
 
+// Очереди прогресса просмотра (content_detail.js) принадлежат пользователю:
+// при выходе и на страницах без входа они удаляются, чтобы не уйти под другим аккаунтом.
+(function(){
+  function clearProgressQueues(){
+    try{
+      Object.keys(localStorage)
+        .filter(k => k === 'progressQueue' || k.startsWith('progressQueue:'))
+        .forEach(k => localStorage.removeItem(k));
+    }catch{}
+  }
+  if (window.IS_AUTH !== true) clearProgressQueues();
+  document.querySelectorAll('form[action="/logout/"]').forEach(form => {
+    form.addEventListener('submit', clearProgressQueues);
+  });
+})();
+
 document.addEventListener("DOMContentLoaded", () => {
   const userMenu = document.querySelector(".user-menu");
   if (!userMenu) return;
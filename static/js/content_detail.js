@@ -118,17 +118,81 @@
     return data;
   }
 
+  // Прогресс копится в очереди (переживает офлайн и перезагрузку через localStorage)
+  // и отправляется пачкой раз в PROGRESS_FLUSH_MS или через sendBeacon при уходе со страницы.
+  // Очередь своя у каждого пользователя; при выходе она очищается (app.js).
+  // В одном запросе не больше PROGRESS_BATCH_MAX событий (лимит сервера).
+  const PROGRESS_URL = '/api/v1/progress/batch/';
+  const PROGRESS_KEY = `progressQueue:${window.USER_ID || ''}`;
+  const PROGRESS_FLUSH_MS = 60000;
+  const PROGRESS_BATCH_MAX = 200;
+  let progressTimer = null;
+  try{ localStorage.removeItem('progressQueue'); }catch{}  // старая очередь без привязки к пользователю
+
+  function loadProgressQueue(){
+    try{ return JSON.parse(localStorage.getItem(PROGRESS_KEY) || '{}') || {}; }catch{ return {}; }
+  }
+  function saveProgressQueue(q){
+    try{ localStorage.setItem(PROGRESS_KEY, JSON.stringify(q)); }catch{}
+  }
+
+  function forgetSent(events){
+    const rest = loadProgressQueue();
+    events.forEach(ev => {
+      const k = `${ev.content_id}:${ev.sn}:${ev.en}`;
+      if (rest[k] && rest[k].ts === ev.ts) delete rest[k];
+    });
+    saveProgressQueue(rest);
+  }
+
+  async function flushProgress(){
+    if (progressTimer){ clearTimeout(progressTimer); progressTimer = null; }
+    const events = Object.values(loadProgressQueue());
+    if (!events.length || navigator.onLine === false) return;
+    for (let i = 0; i < events.length; i += PROGRESS_BATCH_MAX){
+      const chunk = events.slice(i, i + PROGRESS_BATCH_MAX);
+      try{
+        await apiJson(PROGRESS_URL, {
+          method:'POST',
+          headers:{
+            'Content-Type':'application/json',
+            'X-CSRFToken': getCookie('csrftoken')
+          },
+          body: JSON.stringify({ events: chunk })
+        });
+        forgetSent(chunk);
+      }catch(_e){ return; }
+    }
+  }
+
+  function beaconProgress(){
+    const events = Object.values(loadProgressQueue());
+    if (!events.length || !navigator.sendBeacon) return;
+    for (let i = 0; i < events.length; i += PROGRESS_BATCH_MAX){
+      const chunk = events.slice(i, i + PROGRESS_BATCH_MAX);
+      const fd = new FormData();
+      fd.append('csrfmiddlewaretoken', getCookie('csrftoken'));
+      fd.append('events', JSON.stringify(chunk));
+      if (!navigator.sendBeacon(PROGRESS_URL, fd)) return;
+      forgetSent(chunk);
+    }
+  }
+
   async function postProgress(contentId, position=0, duration=null, sn=0, en=0, completed=false){
-    try{
-      await apiJson(`/api/v1/content/${contentId}/progress/`, {
-        method:'POST',
-        headers:{
-          'Content-Type':'application/json',
-          'X-CSRFToken': getCookie('csrftoken')
-        },
-        body: JSON.stringify({ position, duration, sn, en, completed })
-      });
-    }catch(_e){}
+    const q = loadProgressQueue();
+    q[`${contentId}:${sn}:${en}`] = { content_id: contentId, position, duration, sn, en, completed, ts: Date.now() };
+    saveProgressQueue(q);
+    if (completed) return flushProgress();
+    if (!progressTimer) progressTimer = setTimeout(flushProgress, PROGRESS_FLUSH_MS);
+  }
+
+  if (IS_AUTH){
+    window.addEventListener('online', flushProgress);
+    window.addEventListener('pagehide', beaconProgress);
+    document.addEventListener('visibilitychange', () => {
+      if (document.visibilityState === 'hidden') beaconProgress();
+    });
+    flushProgress();
   }
 
   function ensurePlayerIframe(){
@@ -309,7 +373,7 @@
     }
     const close = wrap.querySelector('.overlay__close');
     const esc = (e)=>{ if(e.key==='Escape'){ wrap.remove(); document.removeEventListener('keydown', esc);} };
-    close.addEventListener('click', ()=>{ wrap.remove(); document.removeEventListener('keydown', esc); });
+    close.addEventListener('click', ()=>{ wrap.remove(); document.removeEventListener('keydown', esc); flushProgress(); });
     document.addEventListener('keydown', esc);
   }
 
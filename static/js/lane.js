@@ -55,7 +55,36 @@
     updateNav();
   }
 
+  function getCookie(name){
+    const m = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]+)'));
+    return m ? decodeURIComponent(m[1]) : '';
+  }
+
+  async function markLocked(){
+    const cards = $$('.lane [data-content-id]');
+    const ids = [...new Set(cards.map(el => el.dataset.contentId))];
+    if(!ids.length) return;
+    try{
+      const resp = await fetch('/api/v1/content/can-watch/', {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: { 'Content-Type': 'application/json', 'X-CSRFToken': getCookie('csrftoken') },
+        body: JSON.stringify({ ids: ids.slice(0, 500) })
+      });
+      if(!resp.ok) return;
+      const data = await resp.json();
+      const items = data.items || {};
+      cards.forEach(el => {
+        const it = items[el.dataset.contentId];
+        if(!it) return;
+        el.classList.toggle('is-locked', !it.can_watch);
+        el.dataset.accessMode = it.access_mode;
+      });
+    }catch(_e){}
+  }
+
   document.addEventListener('DOMContentLoaded', () => {
     $$('.lane').forEach(setupLane);
+    markLocked();
   });
 })();
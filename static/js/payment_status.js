@@ -0,0 +1,27 @@
+(() => {
+  const script = document.currentScript;
+  const statusUrl = script && script.dataset.statusUrl;
+  if (!statusUrl) return;
+
+  // long-poll: сервер держит запрос до 10 с или до завершения платежа,
+  // после чего страница перезагружается и показывает результат
+  async function poll() {
+    try {
+      const res = await fetch(`${statusUrl}?wait=10`, { credentials: 'same-origin' });
+      if (res.ok) {
+        const data = await res.json();
+        if (data.status !== 'pending') {
+          window.location.reload();
+          return;
+        }
+        poll();
+        return;
+      }
+    } catch (e) {
+      // сеть пропала — пробуем ещё раз чуть позже
+    }
+    setTimeout(poll, 2000);
+  }
+
+  poll();
+})();
@@ -180,6 +180,9 @@ document.addEventListener('DOMContentLoaded', () => {
   form.addEventListener('submit', e => {
     e.preventDefault();
 
+    // повторная отправка уйдёт с тем же idempotency_key, но лишний POST не нужен
+    if (form.dataset.submitting) return;
+
     if (!validateCard()) {
       card.focus();
       return;
@@ -233,6 +236,7 @@ document.addEventListener('DOMContentLoaded', () => {
       btn.innerHTML = '⏳ Обработка...';
     }
 
+    form.dataset.submitting = '1';
     setTimeout(() => form.submit(), 0);
   });
 });
\ No newline at end of file